@@ -0,0 +1,238 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from utils import console
+from metrics import metrics
+from model_registry import MODEL_SIZE_ESTIMATES, get_registry
+from transcription import TARGET_SAMPLE_RATE
+from language_id import language_probs
+
+# Models from fastest to most accurate, per language
+MODEL_LADDERS = {
+    "en": ["tiny.en", "base.en", "small.en", "medium"],
+    "de": ["tiny", "base", "small", "medium"],
+}
+
+# Decisions and per-decode measurements are appended here
+ADAPTIVE_LOG_PATH = "./cache/adaptive_log.jsonl"
+
+
+def model_ladder(language_config):
+    """
+    Returns the models to choose from, up to the configured one.
+
+    Args:
+        language_config (dict): Configuration with language code and model
+
+    Returns:
+        list: Model names from fastest to the configured (preferred) one
+    """
+    ladder = list(MODEL_LADDERS.get(language_config["code"], MODEL_LADDERS["de"]))
+    preferred = language_config["model"]
+    if preferred in ladder:
+        return ladder[:ladder.index(preferred) + 1]
+    return ladder + [preferred]
+
+
+class AdaptiveModel:
+    """
+    Picks the model size per decode so transcription keeps up with the audio.
+
+    Stands in for a loaded Whisper model. Every transcribe() call is timed
+    and feeds an exponentially weighted real-time factor for the model that
+    ran it. Callers report how much audio is waiting with report_backlog().
+    The model steps down the ladder when its RTF passes `max_rtf` or the
+    backlog passes `max_backlog`, and back up when the larger model's
+    (measured or size-scaled) RTF fits under `target_rtf` with no backlog.
+    At most one step is taken every `cooldown` decodes.
+
+    Audio decoded below the preferred model can be queued with
+    schedule_redecode(); a background thread decodes it again with the
+    preferred model once nothing else has been decoded for `idle_seconds`.
+
+    Decodes are serialized, so one instance can be shared by several threads.
+
+    Args:
+        language_config (dict): Configuration with language code and preferred model
+        registry (ModelRegistry, optional): Registry to fetch the models from
+        target_rtf (float): RTF a larger model must fit under to step up
+        max_rtf (float): RTF above which the model steps down
+        max_backlog (float): Seconds of waiting audio above which the model steps down
+        cooldown (int): Decodes between two switches
+        idle_seconds (float): Quiet time before re-decoding starts
+        max_redecode_seconds (float): Audio kept for re-decoding, the oldest is dropped
+    """
+
+    # Results depend on the model that ran, they must not go into the result cache
+    cacheable = False
+
+    def __init__(self, language_config, registry=None, target_rtf=0.5, max_rtf=0.9, max_backlog=30.0,
+                 cooldown=3, idle_seconds=5.0, max_redecode_seconds=600.0, smoothing=0.3):
+        self.language_config = language_config
+        self.registry = registry or get_registry()
+        self.ladder = model_ladder(language_config)
+        self.preferred = self.ladder[-1]
+        self.target_rtf = target_rtf
+        self.max_rtf = max_rtf
+        self.max_backlog = max_backlog
+        self.cooldown = cooldown
+        self.idle_seconds = idle_seconds
+        self.max_redecode_seconds = max_redecode_seconds
+        self.smoothing = smoothing
+        self.rung = len(self.ladder) - 1
+        self.rtf = {}
+        self._since_switch = cooldown
+        self._backlogs = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_decode = time.monotonic()
+        self._redecodes = deque()
+        self._redecode_seconds = 0.0
+        self._wake = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._redecode_loop, daemon=True)
+        self._thread.start()
+
+    @property
+    def current(self):
+        """Returns the name of the model used for the next decode."""
+        return self.ladder[self.rung]
+
+    @property
+    def backlog(self):
+        """Returns the seconds of audio reported waiting, over all sources."""
+        return sum(self._backlogs.values())
+
+    def report_backlog(self, seconds, source=None):
+        """
+        Tells the scheduler how much audio is waiting to be decoded.
+
+        Args:
+            seconds (float): Waiting audio
+            source: Identifies the reporter when several share the model
+        """
+        self._backlogs[source] = seconds
+
+    def transcribe(self, audio, **options):
+        """Decodes with the currently chosen model, see the model's transcribe()."""
+        with self._lock:
+            name = self.current
+            model = self.registry.get(name)
+            start = time.perf_counter()
+            result = model.transcribe(audio, **options)
+            elapsed = time.perf_counter() - start
+            self._last_decode = time.monotonic()
+            self._local.model = name
+            self._measure(name, len(audio) / TARGET_SAMPLE_RATE, elapsed)
+            self._decide()
+        return result
+
+    def language_probs(self, audio_np):
+        """Detects the language of a clip with the currently chosen model."""
+        with self._lock:
+            return language_probs(self.registry.get(self.current), audio_np)
+
+    def downgraded(self):
+        """Returns whether this thread's last decode ran below the preferred model."""
+        return getattr(self._local, "model", self.preferred) != self.preferred
+
+    def schedule_redecode(self, seconds, job):
+        """
+        Queues work for the preferred model once the machine is idle.
+
+        Args:
+            seconds (float): Length of the audio the job decodes, for the bound
+            job (callable): Called with the preferred model loaded
+        """
+        with self._wake:
+            self._redecodes.append((seconds, job))
+            self._redecode_seconds += seconds
+            while self._redecode_seconds > self.max_redecode_seconds and len(self._redecodes) > 1:
+                dropped, _ = self._redecodes.popleft()
+                self._redecode_seconds -= dropped
+                metrics.inc("adaptive_redecodes_dropped_total")
+            metrics.set_gauge("adaptive_redecode_backlog_seconds", self._redecode_seconds)
+            self._wake.notify()
+
+    def close(self):
+        """Stops the re-decode thread, dropping queued work."""
+        with self._wake:
+            self._closed = True
+            self._wake.notify()
+        self._thread.join()
+
+    def _measure(self, name, audio_seconds, elapsed):
+        if audio_seconds <= 0:
+            return
+        rtf = elapsed / audio_seconds
+        previous = self.rtf.get(name)
+        self.rtf[name] = rtf if previous is None else (1 - self.smoothing) * previous + self.smoothing * rtf
+        self._since_switch += 1
+        metrics.observe("adaptive_rtf", rtf, model=name)
+        self._log({"event": "decode", "model": name, "audio_seconds": round(audio_seconds, 3),
+                   "decode_seconds": round(elapsed, 3), "rtf": round(rtf, 3),
+                   "rtf_avg": round(self.rtf[name], 3), "backlog_seconds": round(self.backlog, 2)})
+
+    def _estimated_rtf(self, rung):
+        name = self.ladder[rung]
+        if name in self.rtf:
+            return self.rtf[name]
+        # Never measured, scale the current model's RTF by the model sizes
+        current = self.current
+        scale = MODEL_SIZE_ESTIMATES.get(name, 0) / max(1, MODEL_SIZE_ESTIMATES.get(current, 0))
+        return self.rtf.get(current, 0.0) * (scale or 2.0)
+
+    def _decide(self):
+        if self._since_switch < self.cooldown:
+            return
+        rtf = self.rtf.get(self.current, 0.0)
+        backlog = self.backlog
+        if (rtf > self.max_rtf or backlog > self.max_backlog) and self.rung > 0:
+            reason = f"RTF {rtf:.2f}" if rtf > self.max_rtf else f"backlog {backlog:.1f}s"
+            self._switch(self.rung - 1, reason)
+        elif (self.rung < len(self.ladder) - 1 and backlog < 1.0
+              and self._estimated_rtf(self.rung + 1) < self.target_rtf):
+            self._switch(self.rung + 1, f"{self.ladder[self.rung + 1]} RTF ~{self._estimated_rtf(self.rung + 1):.2f}")
+
+    def _switch(self, rung, reason):
+        previous, self.rung = self.current, rung
+        self._since_switch = 0
+        console.print(f"[magenta]Adaptive model: {previous} -> {self.current} ({reason})")
+        metrics.inc("adaptive_switches_total", source=previous, target=self.current)
+        metrics.set_gauge("adaptive_model_rung", rung)
+        self._log({"event": "switch", "from": previous, "to": self.current, "reason": reason,
+                   "backlog_seconds": round(self.backlog, 2)})
+
+    def _log(self, entry):
+        entry = {"time": datetime.now().isoformat(timespec="milliseconds"), **entry}
+        os.makedirs(os.path.dirname(ADAPTIVE_LOG_PATH), exist_ok=True)
+        with open(ADAPTIVE_LOG_PATH, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def _idle(self):
+        return self.backlog <= 0 and time.monotonic() - self._last_decode >= self.idle_seconds
+
+    def _redecode_loop(self):
+        while True:
+            with self._wake:
+                while not self._closed and not (self._redecodes and self._idle()):
+                    # Re-check idleness periodically, decodes do not notify
+                    self._wake.wait(self.idle_seconds if self._redecodes else None)
+                if self._closed:
+                    return
+                seconds, job = self._redecodes.popleft()
+                self._redecode_seconds -= seconds
+            with self._lock:
+                model = self.registry.get(self.preferred)
+                start = time.perf_counter()
+                try:
+                    job(model)
+                except Exception as e:
+                    console.print(f"[red]Re-decode failed: {e}")
+                self._last_decode = time.monotonic() - self.idle_seconds
+            metrics.inc("adaptive_redecodes_total")
+            self._log({"event": "redecode", "model": self.preferred, "audio_seconds": round(seconds, 3),
+                       "decode_seconds": round(time.perf_counter() - start, 3)})
@@ -1,9 +1,5 @@
-import threading
-import numpy as np
-import whisper
-import subprocess
 import os
-from queue import Queue
+from collections import deque
 from datetime import datetime
 
 # Import from our modules
@@ -12,10 +8,25 @@ from audio_devices import (
     select_language, 
     select_microphone, 
     select_audio_output,
-    select_recording_mode
+    select_recording_mode,
+    select_live_mode,
+    negotiate_sample_rate,
+    check_tools,
+    prefetch_devices
 )
-from audio_recorder import record_audio
-from transcription import transcribe, save_transcription
+from audio_recorder import Recorder, MultiRecorder, CaptureSource
+from model_registry import get_registry
+from metrics import metrics
+from live_transcription import LiveTranscriber
+from warmup import start_warmup, SpeculativeTranscriber
+from multi_source import MultiSourceTranscriber
+from transcript_writers import TranscriptStream
+from adaptive import AdaptiveModel
+from language_id import AUTO, get_language_identifier
+from archive import get_archive
+from pipeline import BoundedQueue
+from audio_source import WavFileSource
+from long_form import transcribe_long_segments
 
 # Create cache directory for transcription files
 os.makedirs("./cache", exist_ok=True)
@@ -24,37 +35,157 @@ os.makedirs("./cache", exist_ok=True)
 selected_mic = None
 mic_sample_rate = None
 selected_output = None
+output_sample_rate = None
 selected_language = None
+# Key of the source whose detected language is archived with the transcripts
+language_source = None
 recording_mode = "microphone" 
-stt = None  
+live_mode = False
+# Transcriptions shown in the history, the session file keeps all of them
+HISTORY_SIZE = 10
+transcription_count = 0
+# A recording with more audio than this left to decode when it stops is
+# finished from its WAV file in batches
+LONG_FORM_SECONDS = 120
+
+
+def append_session_text(filename, number, text):
+    """
+    Appends one transcription to the session text file and flushes it.
+
+    Args:
+        filename (str): The session file, created with a header if missing
+        number (int): Position of the transcription in the session
+        text (str): The transcribed text
+    """
+    new = not os.path.exists(filename)
+    with open(filename, 'a') as f:
+        if new:
+            f.write(f"# Transcription Session: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        f.write(f"{number}. {text}\n\n")
+
+
+def finish_long_form(live, registry, on_segment=None):
+    """
+    Decodes the part of a recording the speculative transcriber has not reached.
+
+    The WAV file is memory-mapped and the rest of it is split into segments
+    that transcribe_long_segments() decodes in batches with the model that
+    is already loaded, instead of one clip after another.
+
+    Args:
+        live (SpeculativeTranscriber): Transcriber of the stopped recording
+        registry (ModelRegistry): Registry holding the loaded model
+        on_segment (callable, optional): Called with every new TranscriptSegment
+
+    Returns:
+        str: The full transcription
+    """
+    undecoded_from = live.hand_off()
+    if undecoded_from is None or not live.file_path:
+        return live.text
+    with WavFileSource(live.file_path) as source:
+        start = int(undecoded_from * source.sample_rate)
+        console.print(f"[blue]Decoding the last {source.duration - undecoded_from:.0f}s in batches")
+        rest = transcribe_long_segments(source[start:], source.sample_rate, selected_language, registry=registry,
+                                        offset=live.offset + undecoded_from, source=language_source)
+    for piece in rest:
+        live.segments.append(piece)
+        if on_segment:
+            on_segment(piece)
+    return live.text
+
+
+def handle_transcription(text, file_paths, transcriptions):
+    """
+    Prints, records and archives a finished transcription.
+    
+    Args:
+        text (str): The transcribed text
+        file_paths (list): Paths to the source recordings, the transcript
+            is linked to the first one
+        transcriptions (deque): Recent session history to append to
+    """
+    global transcription_count
+    metrics.export()
+    archive = get_archive()
+    # The WAVs are compressed in the background and removed afterwards
+    recording_ids = [archive.add_recording(path) for path in file_paths]
+    recording_id = recording_ids[0] if recording_ids else None
+    if text.strip():
+        console.print(f"[green]Transcription: [white]{text}")
+        transcriptions.append(text)
+        transcription_count += 1
+        append_session_text(session_text_file, transcription_count, text)
+        language = selected_language["code"]
+        if language == AUTO:
+            language = get_language_identifier().language(language_source) or AUTO
+        transcript_id = archive.add_transcript(text, recording_id, language, selected_language["model"])
+        console.print(f"[green]Transcription archived as #{transcript_id}")
+        if len(transcriptions) > 1:
+            console.print("\n[yellow]Session transcription history:")
+            first = transcription_count - len(transcriptions) + 1
+            for i, t in enumerate(transcriptions, first):
+                console.print(f"[blue]{i}. [white]{t}")
+            console.print("\n")
+    else:
+        console.print("[yellow]No speech detected in the transcription. Please try again and speak clearly.")
 
 
 if __name__ == "__main__":
     console.print("[cyan]Transcription Tool started! Press Ctrl+C to exit.")
-    try:
-        subprocess.run(['parec', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        subprocess.run(['sox', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        console.print("[green]Required tools (parec, sox) are available")
-    except FileNotFoundError:
-        console.print("[red]Warning: Missing required tools. Please install:")
+    missing = check_tools(("parec", "sox"))
+    if missing:
+        console.print(f"[red]Warning: Missing required tools ({', '.join(missing)}). Please install:")
         console.print("[yellow]sudo apt-get install pulseaudio-utils sox")
+    else:
+        console.print("[green]Required tools (parec, sox) are available")
 
     recording_mode = select_recording_mode()
+    # List the devices while the remaining questions are answered
+    prefetch_devices({"microphone": ("alsa",), "output": ("pulse",)}.get(recording_mode, ("alsa", "pulse")))
     selected_language = select_language()
+    # Calls are transcribed per speaker in windows, not word by word
+    live_mode = select_live_mode() if recording_mode != "both" else False
 
-    console.print(f"[yellow]Loading Whisper model '{selected_language['model']}'...")
-    stt = whisper.load_model(selected_language["model"])
-    console.print(f"[green]Whisper model loaded!")
+    # Load the model and run a first decode while the devices are chosen
+    registry = get_registry()
+    start_warmup(selected_language, registry)
+    # Steps between model sizes to keep up, None decodes with the selected model
+    model = AdaptiveModel(selected_language, registry) if selected_language.get("adaptive") else None
 
-    if recording_mode == "microphone":
+    if recording_mode in ("microphone", "both"):
         selected_mic, mic_sample_rate = select_microphone()
         console.print(f"[green]Microphone selected: {selected_mic} at {mic_sample_rate}Hz")
-    else:
-        mic_sample_rate = 44100
+    if recording_mode in ("output", "both"):
         selected_output = select_audio_output()
-        console.print(f"[green]Audio output monitor selected: {selected_output} at {mic_sample_rate}Hz")
+        output_sample_rate = negotiate_sample_rate(selected_output)
+        console.print(f"[green]Audio output monitor selected: {selected_output} at {output_sample_rate}Hz")
 
-    transcriptions = []
+    transcriptions = deque(maxlen=HISTORY_SIZE)
+    # Everything is appended as it is transcribed, so a crash loses nothing
+    # and the files can be followed while the session runs
+    session_name = f"./cache/session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    session_text_file = f"{session_name}.txt"
+    transcript_stream = TranscriptStream(session_name)
+    console.print(f"[blue]Session transcript: {', '.join(transcript_stream.paths.values())}")
+
+    # One capture process per source serves every recording of the session
+    if recording_mode == "both":
+        speakers = ["You", "Remote"]
+        language_source = speakers[0]
+        recorder = MultiRecorder([
+            CaptureSource(speakers[0], "microphone", selected_mic, mic_sample_rate),
+            CaptureSource(speakers[1], "output", selected_output, output_sample_rate),
+        ])
+    else:
+        # The language stays detected across the recordings of the session
+        language_source = recording_mode
+        if recording_mode == "microphone":
+            recorder = Recorder(recording_mode, selected_mic, mic_sample_rate)
+        else:
+            recorder = Recorder(recording_mode, None, output_sample_rate, selected_output)
+    recorder.open()
 
     try:
         while True:
@@ -65,82 +196,52 @@ if __name__ == "__main__":
             
             input()  # Wait for first Enter press to start recording
             
-            data_queue = Queue()
-            stop_event = threading.Event()
-            recording_thread = threading.Thread(
-                target=record_audio,
-                args=(
-                    stop_event, 
-                    data_queue, 
-                    recording_mode,
-                    selected_mic,
-                    mic_sample_rate,
-                    selected_output
-                ),
-            )
-            recording_thread.start()
+            # Bound to this recording, late revisions keep its timeline
+            write_segment = transcript_stream.begin_recording()
+            # Capture is negotiated at 16kHz, this only resamples if the device refused
+            if recording_mode == "both":
+                live = MultiSourceTranscriber(speakers, selected_language, registry=registry,
+                                              on_segment=write_segment, model=model)
+                recorder.start(live.queues, target_sample_rate=16000)
+                live.start()
+            else:
+                # Bounded, a capture that outruns the decoder spills or drops per TRANSCRIBE_QUEUE_POLICY
+                data_queue = BoundedQueue("capture")
+                recorder.start(data_queue, target_sample_rate=16000)
+                if live_mode:
+                    live = LiveTranscriber(data_queue, selected_language, model=model, registry=registry,
+                                           on_segment=write_segment, source=language_source).start()
+                else:
+                    # Complete 30 second windows are decoded while the recording goes on
+                    live = SpeculativeTranscriber(data_queue, selected_language, model=model, registry=registry,
+                                                  on_segment=write_segment,
+                                                  source=language_source).start()
             
             # Wait for second Enter press
             input()
             console.print("[yellow]Stopping recording...")
-            stop_event.set()
-            recording_thread.join()
-
-            audio_chunks = []
-            sample_rate = 16000  # Default for Whisper
-            file_path = None
-
-            for item in list(data_queue.queue):
-                if isinstance(item, tuple):
-                    if item[0] == 'sample_rate':
-                        sample_rate = item[1]
-                    elif item[0] == 'audio_chunk':
-                        audio_chunks.append(item[1])
-                    elif item[0] == 'file_path':
-                        file_path = item[1]
-
-            if audio_chunks:
-                audio_np = np.concatenate(audio_chunks, axis=0)
-                # Convert to float normalized between -1 and 1
-                audio_float = audio_np.astype(np.float32) / 32768.0
-                console.print(f"[blue]Audio shape: {audio_np.shape}")
-                console.print(f"[blue]Audio stats - min: {np.min(audio_np)}, max: {np.max(audio_np)}, mean: {np.mean(np.abs(audio_np)):.2f}")
-                
-                if audio_float.size > 100 and np.abs(audio_float).mean() > 0.001:
-                    with console.status("Transcribing...", spinner="earth"):
-                        text = transcribe(audio_float, sample_rate, selected_language)
-                    
-                    if text.strip():
-                        console.print(f"[green]Transcription: [white]{text}")
-                        transcriptions.append(text)
-                        save_transcription(text, file_path)
-                        if len(transcriptions) > 1:
-                            console.print("\n[yellow]Session transcription history:")
-                            for i, t in enumerate(transcriptions):
-                                console.print(f"[blue]{i+1}. [white]{t}")
-                            console.print("\n")
+            recorder.stop()
+
+            with console.status("Finishing transcription...", spinner="earth"):
+                with metrics.timer("stop_to_text_seconds", live=str(live_mode).lower()):
+                    if isinstance(live, SpeculativeTranscriber) and live.backlog > LONG_FORM_SECONDS:
+                        text = finish_long_form(live, registry, write_segment)
                     else:
-                        console.print("[yellow]No speech detected in the transcription. Please try again and speak clearly.")
-                else:
-                    console.print(
-                        "[red]Audio level too low. Please speak louder or check your microphone settings."
-                    )
-            else:
-                console.print(
-                    "[red]No audio chunks were recorded. Please check your microphone."
-                )
+                        text = live.join()
+            file_paths = live.file_paths if recording_mode == "both" else [p for p in [live.file_path] if p]
+            if not file_paths:
+                console.print("[red]No audio was recorded. Please check your microphone.")
+                continue
+            handle_transcription(text, file_paths, transcriptions)
 
     except KeyboardInterrupt:
         console.print("\n[red]Exiting...")
+        recorder.close()
+        get_archive().close()
+        if model is not None:
+            model.close()
+        transcript_stream.close()
         if transcriptions:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"./cache/session_transcription_{timestamp}.txt"
-            
-            with open(filename, 'w') as f:
-                f.write(f"# Transcription Session: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                for i, text in enumerate(transcriptions):
-                    f.write(f"{i+1}. {text}\n\n")
-            
-            console.print(f"[green]All session transcriptions saved to {filename}")
+            console.print(f"[green]All session transcriptions saved to {session_text_file}")
 
     console.print("[blue]Transcription session ended.")
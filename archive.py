@@ -0,0 +1,389 @@
+"""
+Compressed, size- and age-bounded archive of recordings and transcripts.
+
+Usage:
+    python archive.py --import-legacy
+    python archive.py --list 20
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+import wave
+from datetime import datetime
+from queue import Queue
+from utils import console
+from metrics import metrics
+
+ARCHIVE_DIR = "./cache/archive"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    source TEXT,
+    path TEXT,
+    codec TEXT,
+    sample_rate INTEGER,
+    duration REAL,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS recordings_created ON recordings (created);
+CREATE INDEX IF NOT EXISTS recordings_status ON recordings (status);
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    recording_id INTEGER REFERENCES recordings (id),
+    language TEXT,
+    model TEXT,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcripts_created ON transcripts (created);
+CREATE INDEX IF NOT EXISTS transcripts_recording ON transcripts (recording_id);
+"""
+
+
+def encode_command(source, destination, codec="flac", sample_rate=16000):
+    """
+    Builds the command that compresses a WAV file to 16kHz mono.
+
+    Args:
+        source (str): Input WAV file
+        destination (str): Output file
+        codec (str): 'flac' (sox) or 'opus' (ffmpeg)
+        sample_rate (int): Output sample rate
+
+    Returns:
+        list: The command, or None if the needed tool is not installed
+    """
+    if codec == "flac" and shutil.which("sox"):
+        return ["sox", "-q", source, "-c", "1", "-r", str(sample_rate), "-b", "16", destination]
+    if codec == "opus" and shutil.which("ffmpeg"):
+        return ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", source,
+                "-ac", "1", "-ar", str(sample_rate), "-c:a", "libopus", "-b:a", "24k", destination]
+    return None
+
+
+def write_wav16(source, destination, sample_rate=16000, chunk_seconds=60):
+    """
+    Downsamples a WAV file to 16-bit mono at `sample_rate`, chunk by chunk.
+
+    Fallback when no encoder is installed.
+    """
+    import numpy as np
+    from audio_format import pcm_to_float32
+    from audio_source import WavFileSource
+    from resampler import StreamingResampler
+
+    with WavFileSource(source) as audio, wave.open(destination, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        resampler = StreamingResampler(audio.sample_rate, sample_rate) if audio.sample_rate != sample_rate else None
+
+        def write(samples):
+            out.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+
+        for _, window in audio.windows(chunk_seconds):
+            samples = pcm_to_float32(window)
+            write(resampler.process(samples) if resampler else samples)
+        if resampler:
+            write(resampler.flush())
+
+
+def _wav_info(path):
+    try:
+        with wave.open(path, "rb") as w:
+            return w.getframerate(), w.getnframes() / w.getframerate()
+    except (wave.Error, EOFError, OSError, ZeroDivisionError):
+        return None, None
+
+
+class Archive:
+    """
+    Keeps recordings compressed in date-sharded directories and transcripts
+    in one SQLite database.
+
+    Recordings are handed over as WAV files and compressed to 16kHz mono
+    FLAC (or Opus) on a background thread, after which the WAV is deleted.
+    Transcripts are only ever appended. After every archived recording the
+    oldest audio is deleted until the archive is within `max_bytes` and no
+    recording is older than `max_age_days`; transcripts are kept.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIR, max_bytes=2 * 1024 ** 3, max_age_days=30, codec="flac",
+                 keep_source=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.codec = codec
+        self.keep_source = keep_source
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "archive.db"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._queue = Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        # Pick up recordings left unencoded by a previous run
+        for recording_id, source in self._query("SELECT id, source FROM recordings WHERE status = 'pending'"):
+            self._queue.put((recording_id, source))
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def _execute(self, sql, args=()):
+        with self._lock, self._db:
+            return self._db.execute(sql, args).lastrowid
+
+    def add_recording(self, source, created=None):
+        """
+        Queues a WAV recording for compression.
+
+        Args:
+            source (str): Path to the WAV file
+            created (float, optional): Recording time, defaults to the file's mtime
+
+        Returns:
+            int: Recording id
+        """
+        source = os.path.abspath(source)
+        sample_rate, duration = _wav_info(source)
+        created = created or os.path.getmtime(source)
+        recording_id = self._execute(
+            "INSERT INTO recordings (created, source, sample_rate, duration, status) VALUES (?, ?, ?, ?, 'pending')",
+            (created, source, sample_rate, duration),
+        )
+        self._queue.put((recording_id, source))
+        return recording_id
+
+    def add_transcript(self, text, recording_id=None, language=None, model=None, created=None):
+        """
+        Appends a transcript.
+
+        Args:
+            text (str): The transcribed text
+            recording_id (int, optional): Recording it came from
+            language (str, optional): Language code
+            model (str, optional): Model name
+
+        Returns:
+            int: Transcript id
+        """
+        return self._execute(
+            "INSERT INTO transcripts (created, recording_id, language, model, text) VALUES (?, ?, ?, ?, ?)",
+            (created or time.time(), recording_id, language, model, text),
+        )
+
+    def transcript(self, transcript_id):
+        """Returns one transcript as a dict, or None."""
+        rows = self._query(
+            "SELECT t.id, t.created, t.recording_id, t.language, t.model, t.text, r.path "
+            "FROM transcripts t LEFT JOIN recordings r ON r.id = t.recording_id WHERE t.id = ?",
+            (transcript_id,),
+        )
+        if not rows:
+            return None
+        keys = ("id", "created", "recording_id", "language", "model", "text", "audio_path")
+        return dict(zip(keys, rows[0]))
+
+    def transcripts(self, limit=20, since=None):
+        """
+        Returns the latest transcripts, newest first.
+
+        Args:
+            limit (int): Most transcripts returned
+            since (float, optional): Only transcripts created after this time
+
+        Returns:
+            list: Transcript dicts
+        """
+        rows = self._query(
+            "SELECT id FROM transcripts WHERE created > ? ORDER BY created DESC LIMIT ?",
+            (since or 0, limit),
+        )
+        return [self.transcript(row[0]) for row in rows]
+
+    def total_bytes(self):
+        """Returns the size of the archived audio."""
+        return self._query("SELECT COALESCE(SUM(bytes), 0) FROM recordings WHERE status = 'archived'")[0][0]
+
+    def _shard(self, created):
+        day = datetime.fromtimestamp(created)
+        directory = os.path.join(self.directory, day.strftime("%Y"), day.strftime("%m"), day.strftime("%d"))
+        os.makedirs(directory, exist_ok=True)
+        return directory, day.strftime("%H%M%S")
+
+    def _encode(self, recording_id, source):
+        created = self._query("SELECT created FROM recordings WHERE id = ?", (recording_id,))[0][0]
+        directory, stamp = self._shard(created)
+        cmd = None
+        for codec in (self.codec, "flac"):
+            extension = "opus" if codec == "opus" else "flac"
+            destination = os.path.join(directory, f"{stamp}_{recording_id}.{extension}")
+            cmd = encode_command(source, destination, codec)
+            if cmd:
+                break
+        if cmd is None:
+            codec, destination = "wav", os.path.join(directory, f"{stamp}_{recording_id}.wav")
+
+        tmp = f"{destination}.tmp{os.path.splitext(destination)[1]}"
+        with metrics.timer("archive_encode_seconds", codec=codec):
+            if cmd:
+                cmd[-1] = tmp
+                subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            else:
+                write_wav16(source, tmp)
+        os.replace(tmp, destination)
+        size = os.path.getsize(destination)
+        self._execute(
+            "UPDATE recordings SET path = ?, codec = ?, bytes = ?, status = 'archived' WHERE id = ?",
+            (destination, codec, size, recording_id),
+        )
+        if not self.keep_source:
+            os.remove(source)
+        metrics.inc("archive_bytes_written_total", size, codec=codec)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            recording_id, source = item
+            try:
+                self._encode(recording_id, source)
+                self.enforce_retention()
+            except FileNotFoundError:
+                self._execute("UPDATE recordings SET status = 'missing' WHERE id = ?", (recording_id,))
+            except Exception as e:
+                console.print(f"[red]Could not archive {source}: {e}")
+                self._execute("UPDATE recordings SET status = 'failed' WHERE id = ?", (recording_id,))
+            finally:
+                self._queue.task_done()
+
+    def enforce_retention(self):
+        """
+        Deletes archived audio beyond the age and size limits, oldest first.
+
+        Returns:
+            int: Number of recordings deleted
+        """
+        expired = []
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            expired += self._query(
+                "SELECT id, path, bytes FROM recordings WHERE status = 'archived' AND created < ?", (cutoff,))
+        if self.max_bytes is not None:
+            excess = self.total_bytes() - sum(size for _, _, size in expired) - self.max_bytes
+            if excess > 0:
+                seen = {row[0] for row in expired}
+                for row in self._query(
+                        "SELECT id, path, bytes FROM recordings WHERE status = 'archived' ORDER BY created"):
+                    if excess <= 0:
+                        break
+                    if row[0] not in seen:
+                        expired.append(row)
+                        excess -= row[2]
+        for recording_id, path, _ in expired:
+            try:
+                os.remove(path)
+                # Drop the day, month and year directories once they are empty
+                os.removedirs(os.path.dirname(path))
+            except OSError:
+                pass
+            self._execute("UPDATE recordings SET status = 'expired', bytes = 0 WHERE id = ?", (recording_id,))
+        metrics.set_gauge("archive_bytes", self.total_bytes())
+        return len(expired)
+
+    def import_legacy(self, directory="./cache"):
+        """
+        Moves loose recording_*.wav and transcription_*.txt files into the archive.
+
+        Returns:
+            tuple: (recordings queued, transcripts imported)
+        """
+        recordings = transcripts = 0
+        for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+            if not entry.is_file():
+                continue
+            if entry.name.startswith("recording_") and entry.name.endswith(".wav"):
+                self.add_recording(entry.path)
+                recordings += 1
+            elif entry.name.startswith("transcription_") and entry.name.endswith(".txt"):
+                with open(entry.path) as f:
+                    text = f.read()
+                if text.startswith("Source audio: "):
+                    text = text.split("\n\n", 1)[-1]
+                self.add_transcript(text, created=entry.stat().st_mtime)
+                os.remove(entry.path)
+                transcripts += 1
+        return recordings, transcripts
+
+    def flush(self):
+        """Waits until every queued recording is archived."""
+        self._queue.join()
+
+    def close(self):
+        """Finishes the queued recordings and closes the database."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        with self._lock:
+            self._db.close()
+
+
+_default_archive = None
+_default_lock = threading.Lock()
+
+
+def get_archive():
+    """
+    Returns the shared archive under ./cache/archive, creating it on first use.
+
+    Returns:
+        Archive: The shared archive
+    """
+    global _default_archive
+    with _default_lock:
+        if _default_archive is None:
+            _default_archive = Archive()
+        return _default_archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the recording and transcript archive.")
+    parser.add_argument("--import-legacy", action="store_true",
+                        help="Archive loose recording_*.wav and transcription_*.txt files in ./cache")
+    parser.add_argument("--list", type=int, metavar="N", help="Print the latest N transcripts")
+    parser.add_argument("--max-gb", type=float, default=2.0, help="Audio kept in the archive")
+    parser.add_argument("--max-days", type=float, default=30, help="Age after which audio is deleted")
+    parser.add_argument("--codec", choices=("flac", "opus"), default="flac")
+    args = parser.parse_args()
+
+    archive = Archive(max_bytes=int(args.max_gb * 1024 ** 3), max_age_days=args.max_days, codec=args.codec)
+    if args.import_legacy:
+        recordings, transcripts = archive.import_legacy()
+        with console.status(f"Archiving {recordings} recording(s)...", spinner="earth"):
+            archive.flush()
+        console.print(f"[green]Imported {recordings} recording(s) and {transcripts} transcript(s)")
+    removed = archive.enforce_retention()
+    if removed:
+        console.print(f"[yellow]Deleted {removed} recording(s) past the retention limits")
+    if args.list:
+        for t in reversed(archive.transcripts(args.list)):
+            when = datetime.fromtimestamp(t["created"]).strftime("%Y-%m-%d %H:%M:%S")
+            console.print(f"[blue]#{t['id']} {when} [white]{t['text']}")
+    console.print(f"[blue]Archive: {archive.total_bytes() / 1024 ** 2:.1f} MB of audio")
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
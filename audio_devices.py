@@ -1,6 +1,150 @@
+import json
+import os
 import re
+import shutil
 import subprocess
+import threading
+import time
 from utils import console
+from audio_format import CAPTURE_SAMPLE_RATE
+
+# Parsed device lists are kept here between runs
+DEVICE_CACHE_PATH = "./cache/devices.json"
+
+# Longest a cached device list is trusted. ALSA lists are also dropped as
+# soon as /proc/asound changes, PulseAudio sources only expire.
+DEVICE_CACHE_TTL = {"alsa": 24 * 3600, "pulse": 60}
+
+_device_cache_lock = threading.Lock()
+_probe_locks = {"alsa": threading.Lock(), "pulse": threading.Lock()}
+
+
+def check_tools(tools=("parec", "sox")):
+    """
+    Looks the external tools up on the PATH without running them.
+
+    Args:
+        tools (tuple): Executable names
+
+    Returns:
+        list: The tools that are missing
+    """
+    return [tool for tool in tools if shutil.which(tool) is None]
+
+
+def _alsa_signature():
+    # Changes whenever a card is plugged in or removed
+    try:
+        with open("/proc/asound/cards") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _probe_alsa():
+    result = subprocess.run(['arecord', '-l'], capture_output=True, text=True, timeout=5)
+    devices = []
+    pattern = re.compile(r'card (\d+): (\w+) \[(.*?)\], device (\d+): (.*)')
+    for line in result.stdout.split('\n'):
+        match = pattern.search(line)
+        if match:
+            card_num, card_id, card_name, device_num, device_name = match.groups()
+            devices.append({
+                'card_num': card_num,
+                'device_num': device_num,
+                'name': f"{card_name}: {device_name}",
+                'id': f"hw:{card_num},{device_num}"
+            })
+    return devices
+
+
+def _probe_pulse():
+    result = subprocess.run(['pactl', 'list', 'sources'], capture_output=True, text=True, timeout=5)
+    sources = []
+    current_source = {}
+    for line in result.stdout.split('\n'):
+        if line.startswith('Source #'):
+            if current_source and 'index' in current_source and 'name' in current_source:
+                sources.append(current_source)
+            current_source = {'index': line.split('#')[1].strip()}
+        elif 'Name:' in line and current_source:
+            current_source['name'] = line.split('Name:')[1].strip()
+        elif 'Description:' in line and current_source:
+            current_source['description'] = line.split('Description:')[1].strip()
+
+    # Add the last source
+    if current_source and 'index' in current_source and 'name' in current_source:
+        sources.append(current_source)
+    return sources
+
+
+_PROBES = {"alsa": (_probe_alsa, _alsa_signature), "pulse": (_probe_pulse, lambda: None)}
+
+
+def _read_device_cache():
+    try:
+        with open(DEVICE_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def list_devices(kind, refresh=False, quiet=False):
+    """
+    Returns the parsed ALSA capture devices or PulseAudio sources.
+
+    Lists are cached in DEVICE_CACHE_PATH and reused until they are older
+    than DEVICE_CACHE_TTL or, for ALSA, the sound cards change.
+
+    Args:
+        kind (str): 'alsa' or 'pulse'
+        refresh (bool): Probe again even if the cached list is still valid
+        quiet (bool): Do not report a failed probe
+
+    Returns:
+        list: Device dicts, empty if the probe failed
+    """
+    probe, signature = _PROBES[kind]
+    # A prefetch already probing this kind finishes first, then we read its result
+    with _probe_locks[kind]:
+        current = signature()
+        with _device_cache_lock:
+            entry = _read_device_cache().get(kind)
+        if (not refresh and entry and time.time() - entry["time"] < DEVICE_CACHE_TTL[kind]
+                and entry["signature"] == current):
+            return entry["devices"]
+
+        try:
+            devices = probe()
+        except Exception as e:
+            if not quiet:
+                console.print(f"[red]Could not list {kind} devices: {e}")
+            return []
+        with _device_cache_lock:
+            cache = _read_device_cache()
+            cache[kind] = {"time": time.time(), "signature": current, "devices": devices}
+            os.makedirs(os.path.dirname(DEVICE_CACHE_PATH), exist_ok=True)
+            tmp_path = DEVICE_CACHE_PATH + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, DEVICE_CACHE_PATH)
+        return devices
+
+
+def prefetch_devices(kinds=("alsa", "pulse")):
+    """
+    Refreshes the device lists on background threads.
+
+    Called at startup so the probes run while the user answers the first
+    prompts; the select functions then wait for them instead of probing
+    again.
+
+    Args:
+        kinds (tuple): Device kinds to probe, see list_devices()
+    """
+    for kind in kinds:
+        threading.Thread(target=list_devices, args=(kind,), kwargs={"quiet": True}, daemon=True).start()
+
 
 def select_language():
     """
@@ -14,10 +158,16 @@ def select_language():
     console.print("[cyan]2: English (accurate)")
     console.print("[cyan]3: German (fast)")
     console.print("[cyan]4: German (accurate)")
+    console.print("[cyan]5: English (adaptive, as accurate as the CPU keeps up with)")
+    console.print("[cyan]6: German (adaptive, as accurate as the CPU keeps up with)")
+    console.print("[cyan]7: Detect automatically (per source, on the first seconds of speech), the default")
     
     try:
-        selection = input("Select language option (1-4) > ")
-        if selection.strip() == "2":
+        selection = input("Select language option (1-7, Enter to detect) > ")
+        if selection.strip() in ("", "7"):
+            console.print("[green]Selected language: detected automatically")
+            return {"code": "auto", "model": "small"}
+        elif selection.strip() == "2":
             console.print("[green]Selected language: English (accurate)")
             return {"code": "en", "model": "medium"}
         elif selection.strip() == "3":
@@ -26,6 +176,10 @@ def select_language():
         elif selection.strip() == "4":
             console.print("[green]Selected language: German (accurate)")
             return {"code": "de", "model": "medium"}
+        elif selection.strip() in ("5", "6"):
+            code = "en" if selection.strip() == "5" else "de"
+            console.print(f"[green]Selected language: {'English' if code == 'en' else 'German'} (adaptive)")
+            return {"code": code, "model": "medium", "adaptive": True}
         else:
             console.print("[green]Selected language: English (fast)")
             return {"code": "en", "model": "base.en"}
@@ -33,6 +187,55 @@ def select_language():
         console.print("[yellow]Invalid input, using English (fast) as default")
         return {"code": "en", "model": "base.en"}
 
+def _parse_rates(dump):
+    """
+    Parses the RATE line of `arecord --dump-hw-params`.
+
+    Returns:
+        tuple: (min_rate, max_rate) or None if not found
+    """
+    match = re.search(r'RATE:\s*\[?(\d+)(?:\s+(\d+))?\]?', dump)
+    if not match:
+        return None
+    low = int(match.group(1))
+    return low, int(match.group(2) or low)
+
+
+def negotiate_sample_rate(device="default", preferred_rate=CAPTURE_SAMPLE_RATE):
+    """
+    Picks the capture rate closest to what Whisper needs.
+
+    PulseAudio/PipeWire devices (including 'default' and monitor sources)
+    convert in the sound server, so they can always deliver the preferred
+    rate. Raw ALSA hw devices are asked for their supported rate range.
+
+    Args:
+        device (str): ALSA device or PulseAudio source name
+        preferred_rate (int): Sample rate we would like to capture at
+
+    Returns:
+        int: Sample rate to record at
+    """
+    if not device.startswith("hw:"):
+        return preferred_rate
+    try:
+        result = subprocess.run(
+            ['arecord', '-D', device, '--dump-hw-params', '-f', 'S16_LE', '-c', '1', '-d', '1', '/dev/null'],
+            capture_output=True, text=True, timeout=3
+        )
+        rates = _parse_rates(result.stdout + result.stderr)
+    except Exception as e:
+        console.print(f"[red]Could not query {device} rates: {e}")
+        rates = None
+    if rates is None:
+        return preferred_rate
+    low, high = rates
+    if low <= preferred_rate <= high:
+        return preferred_rate
+    # Prefer capturing above the target and downsampling
+    return low if low > preferred_rate else high
+
+
 def select_microphone():
     """
     Selects a microphone using ALSA directly.
@@ -40,27 +243,11 @@ def select_microphone():
     Returns:
         tuple: (device_id, sample_rate) for recording
     """
-    # First get ALSA devices directly
     try:
-        result = subprocess.run(['arecord', '-l'], capture_output=True, text=True)
-        console.print("[magenta]ALSA devices from arecord -l:")
-        console.print(result.stdout)
-        
-        # Parse output to find microphones
-        devices = []
-        pattern = re.compile(r'card (\d+): (\w+) \[(.*?)\], device (\d+): (.*)')
-        
-        for line in result.stdout.split('\n'):
-            match = pattern.search(line)
-            if match:
-                card_num, card_id, card_name, device_num, device_name = match.groups()
-                device_id = f"hw:{card_num},{device_num}"
-                devices.append({
-                    'card_num': card_num,
-                    'device_num': device_num,
-                    'name': f"{card_name}: {device_name}",
-                    'id': device_id
-                })
+        devices = list_devices("alsa")
+        console.print("[magenta]ALSA capture devices:")
+        for device in devices:
+            console.print(f"{device['id']}: {device['name']}")
         
         if devices:
             # Look for Trust microphone first
@@ -68,7 +255,7 @@ def select_microphone():
                 if "Trust" in device['name'] or "GXT" in device['name'] or "Microphone" in device['name']:
                     console.print(f"[green]Found Trust microphone: {device['name']}")
                     # For PipeWire systems, use "default" instead of "hw:"
-                    return "default", 44100  # Use the default device which should map to the right one in PipeWire
+                    return "default", negotiate_sample_rate("default")  # Use the default device which should map to the right one in PipeWire
             
             # If no Trust mic found, let user select
             console.print("[yellow]Please select a microphone:")
@@ -80,10 +267,10 @@ def select_microphone():
                 if 0 <= selection < len(devices):
                     device = devices[selection]
                     console.print(f"[green]Selected: {device['name']}")
-                    return "default", 44100  # Use default for PipeWire compatibility
+                    return "default", negotiate_sample_rate("default")  # Use default for PipeWire compatibility
             except ValueError:
                 console.print("[red]Invalid input, using default device")
-                return "default", 44100
+                return "default", negotiate_sample_rate("default")
         else:
             console.print("[red]No ALSA devices found!")
     
@@ -92,7 +279,7 @@ def select_microphone():
     
     # Fallback
     console.print("[yellow]Using default audio device")
-    return "default", 44100
+    return "default", negotiate_sample_rate("default")
 
 def select_audio_output():
     """
@@ -103,28 +290,10 @@ def select_audio_output():
     """
     # Try to get PulseAudio/PipeWire monitor sources
     try:
-        result = subprocess.run(['pactl', 'list', 'sources'], capture_output=True, text=True)
+        sources = list_devices("pulse")
         console.print("[magenta]PulseAudio/PipeWire sources:")
-        
-        # Parse output to find monitor sources
-        sources = []
-        current_source = {}
         monitor_pattern = re.compile(r'monitor.*of.*')
         
-        for line in result.stdout.split('\n'):
-            if line.startswith('Source #'):
-                if current_source and 'index' in current_source and 'name' in current_source:
-                    sources.append(current_source)
-                current_source = {'index': line.split('#')[1].strip()}
-            elif 'Name:' in line and current_source:
-                current_source['name'] = line.split('Name:')[1].strip()
-            elif 'Description:' in line and current_source:
-                current_source['description'] = line.split('Description:')[1].strip()
-        
-        # Add the last source
-        if current_source and 'index' in current_source and 'name' in current_source:
-            sources.append(current_source)
-        
         # Filter to find monitor sources
         monitor_sources = []
         for source in sources:
@@ -196,20 +365,38 @@ def select_recording_mode():
     Allows the user to select whether to record from microphone or system audio output.
     
     Returns:
-        str: Recording mode ('microphone' or 'output')
+        str: Recording mode ('microphone', 'output' or 'both')
     """
     console.print("[yellow]Select recording source:")
     console.print("[cyan]1: Microphone (record your voice)")
     console.print("[cyan]2: System Audio (record computer sound output)")
+    console.print("[cyan]3: Both (record a call, labelled by speaker)")
     
     try:
-        selection = input("Select recording source (1-2) > ")
+        selection = input("Select recording source (1-3) > ")
         if selection.strip() == "2":
             console.print("[green]Selected recording source: System Audio Output")
             return "output"
+        elif selection.strip() == "3":
+            console.print("[green]Selected recording source: Microphone and System Audio")
+            return "both"
         else:
             console.print("[green]Selected recording source: Microphone")
             return "microphone"
     except ValueError:
         console.print("[yellow]Invalid input, using Microphone as default")
-        return "microphone" 
\ No newline at end of file
+        return "microphone" 
+
+def select_live_mode():
+    """
+    Asks whether to transcribe while recording.
+    
+    Returns:
+        bool: True for live transcription
+    """
+    selection = input("Transcribe live while recording? (y/N) > ")
+    if selection.strip().lower() in ("y", "yes"):
+        console.print("[green]Live transcription enabled")
+        return True
+    console.print("[green]Transcribing after each recording")
+    return False
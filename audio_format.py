@@ -0,0 +1,59 @@
+import numpy as np
+
+# Whisper expects 16kHz mono float32
+CAPTURE_SAMPLE_RATE = 16000
+
+_PCM_SCALE = {
+    np.dtype(np.int16): np.float32(1.0 / 32768.0),
+    np.dtype(np.int32): np.float32(1.0 / 2147483648.0),
+}
+
+
+def pcm_to_float32(audio_np, out=None):
+    """
+    Converts PCM samples to float32 in [-1, 1] in a single pass.
+
+    Float input is returned as float32 without scaling and, if it already
+    is float32, without a copy.
+
+    Args:
+        audio_np (numpy.ndarray): int16, int32 or float samples
+        out (numpy.ndarray, optional): Preallocated float32 buffer of the same length
+
+    Returns:
+        numpy.ndarray: float32 samples
+    """
+    scale = _PCM_SCALE.get(audio_np.dtype)
+    if scale is None:
+        if out is None:
+            return np.asarray(audio_np, dtype=np.float32)
+        out[...] = audio_np
+        return out
+    if out is None:
+        out = np.empty(audio_np.shape, dtype=np.float32)
+    np.multiply(audio_np, scale, out=out, casting='unsafe')
+    return out
+
+
+def normalize_peak(audio_np, in_place=False):
+    """
+    Scales float audio so its peak is at full range.
+
+    Args:
+        audio_np (numpy.ndarray): float32 samples
+        in_place (bool): Scale the given buffer instead of a copy
+
+    Returns:
+        numpy.ndarray: The normalized samples
+    """
+    if not len(audio_np):
+        return audio_np
+    # max/min avoid allocating an abs() temporary of the whole recording
+    peak = max(float(audio_np.max()), -float(audio_np.min()))
+    if peak <= 0:
+        return audio_np
+    scale = np.float32(1.0 / peak)
+    if in_place:
+        audio_np *= scale
+        return audio_np
+    return audio_np * scale
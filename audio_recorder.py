@@ -1,180 +1,539 @@
 import os
 import time
+import wave
+import threading
+import selectors
+from typing import NamedTuple
 import numpy as np
 import subprocess
+from queue import Queue
 from datetime import datetime
-from scipy.io import wavfile
 from utils import console
+from metrics import metrics
+from resampler import StreamingResampler
+from audio_format import CAPTURE_SAMPLE_RATE, pcm_to_float32
 
-def record_audio(stop_event, data_queue, recording_mode, selected_mic=None, mic_sample_rate=44100, selected_output=None):
+
+def stop_process(process, timeout=1):
+    """
+    Terminates a recording subprocess by its PID, killing it if it hangs.
+
+    Args:
+        process: The recording subprocess
+        timeout: Seconds to wait after SIGTERM
+    """
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        console.print("[red]Process did not terminate gracefully, killing it")
+        process.kill()
+        process.wait()
+
+
+class RingBuffer:
+    """
+    Fixed-size circular buffer of audio samples.
+
+    Capture writes raw frames into it as they arrive and reads them back out
+    in fixed-size blocks, so no allocation grows with the recording length.
+    A float32 buffer converts int16 frames to [-1, 1] while storing them.
+    """
+
+    def __init__(self, capacity, dtype=np.float32):
+        self._buffer = np.zeros(capacity, dtype=dtype)
+        self.capacity = capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def free(self):
+        """Returns the number of samples that can be written without overflow."""
+        return self.capacity - self._size
+
+    def write(self, samples):
+        """
+        Appends samples to the buffer.
+
+        Args:
+            samples (numpy.ndarray): Samples to append, at most free() of them
+        """
+        n = len(samples)
+        if n > self.free():
+            raise ValueError(f"Ring buffer overflow: {n} samples, {self.free()} free")
+        end = (self._start + self._size) % self.capacity
+        first = min(n, self.capacity - end)
+        self._store(samples[:first], self._buffer[end:end + first])
+        self._store(samples[first:], self._buffer[:n - first])
+        self._size += n
+
+    def _store(self, samples, target):
+        if target.dtype == np.float32:
+            pcm_to_float32(samples, out=target)
+        else:
+            target[...] = samples
+
+    def read(self, n):
+        """
+        Removes and returns the oldest samples.
+
+        Args:
+            n (int): Number of samples to read, at most len(self)
+
+        Returns:
+            numpy.ndarray: A new array with the samples
+        """
+        n = min(n, self._size)
+        first = min(n, self.capacity - self._start)
+        out = np.empty(n, dtype=self._buffer.dtype)
+        out[:first] = self._buffer[self._start:self._start + first]
+        out[first:] = self._buffer[:n - first]
+        self._start = (self._start + n) % self.capacity
+        self._size -= n
+        return out
+
+
+class WavWriter:
     """
-    Records audio from either microphone or system output
-    
+    Writes 16-bit mono PCM to a WAV file on a background thread.
+    """
+
+    def __init__(self, path, sample_rate):
+        self.path = path
+        self._queue = Queue()
+        self._wav = wave.open(path, 'wb')
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(sample_rate)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frames = self._queue.get()
+            if frames is None:
+                break
+            self._wav.writeframes(frames)
+        self._wav.close()
+
+    def write(self, frames):
+        """Queues raw little-endian 16-bit frames for writing."""
+        self._queue.put(frames)
+
+    def close(self):
+        """Flushes the pending frames and closes the file."""
+        self._queue.put(None)
+        self._thread.join()
+
+
+def capture_command(recording_mode, selected_mic=None, mic_sample_rate=CAPTURE_SAMPLE_RATE, selected_output=None):
+    """
+    Builds the command that writes raw S16_LE mono frames to stdout.
+
     Args:
-        stop_event: Threading event to signal recording to stop
-        data_queue: Queue to put recorded audio data
-        recording_mode: 'microphone' or 'output' 
+        recording_mode: 'microphone' or 'output'
         selected_mic: Selected microphone device
         mic_sample_rate: Sample rate to record at
         selected_output: Selected output monitor for system audio
+
+    Returns:
+        list: The command line
     """
-    console.print(f"[green]Recording... {'Speak now' if recording_mode == 'microphone' else 'Playing audio'} and press Enter when finished.")
-    
-    # Create recording file with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = f"./cache/recording_{timestamp}.wav"
-    if recording_mode != "microphone":
-        cmd = [
-            'parec', 
-            f'--device={selected_output}', 
-            '--file-format=wav', 
-            '--channels=1', 
-            f'--rate={mic_sample_rate}', 
-            output_file
-        ]
-        
-        console.print(f"[blue]Executing command: {' '.join(cmd)}")
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        # Wait for stop_event to be set (Enter is pressed again)
-        while not stop_event.is_set() and process.poll() is None:
-            time.sleep(0.1)
-        
-        # Kill the process if it's still running
-        if process.poll() is None:
-            console.print("[yellow]Stopping recording...")
-            process.terminate()
-            try:
-                process.wait(timeout=1)
-            except subprocess.TimeoutExpired:
-                process.kill()
-                
-        # Additional cleanup to make sure no processes are left hanging
-        try:
-            subprocess.run(['pkill', '-f', f"parec.*{selected_output}"], 
-                          stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-        except:
-            pass
-        
-        if os.path.exists(output_file) and os.path.getsize(output_file) > 44:
-            try:
-                sr, audio_data = wavfile.read(output_file)
-                if len(audio_data) > 0:
-                    console.print(f"[green]Recording successful: {len(audio_data)} samples")
-                    console.print(f"[blue]Audio stats - min: {np.min(audio_data)}, max: {np.max(audio_data)}, mean: {np.mean(np.abs(audio_data)):.2f}")
-                    
-                    data_queue.put(('audio_chunk', audio_data))
-                    data_queue.put(('sample_rate', sr))
-                    data_queue.put(('file_path', output_file))
-                    return
-                else:
-                    console.print("[red]Recording file is empty (has header but no audio data)")
-            except Exception as e:
-                console.print(f"[red]Error reading WAV file: {e}")
-        else:
-            console.print(f"[red]Recording failed or file is empty. File size: {os.path.getsize(output_file) if os.path.exists(output_file) else 'File not found'}")
-            
-            # Try fallback approaches
-            try:
-                console.print("[yellow]Trying alternative recording method...")
-                os.system(f"timeout 5s parecord '{output_file}' --device='{selected_output}'")
-                
-                if os.path.exists(output_file) and os.path.getsize(output_file) > 44:
-                    sr, audio_data = wavfile.read(output_file)
-                    console.print(f"[green]Alternative recording worked: {len(audio_data)} samples")
-                    
-                    data_queue.put(('audio_chunk', audio_data))
-                    data_queue.put(('sample_rate', sr))
-                    data_queue.put(('file_path', output_file))
-                    return
-            except Exception as e2:
-                console.print(f"[red]Alternative recording method failed: {e2}")
-        
-        return  
-    
-    try:
-        # Use arecord with default device for microphone (works well with PipeWire)
-        process = subprocess.Popen([
+    if recording_mode == "microphone":
+        return [
             'arecord',
-            '--device=default',
+            f'--device={selected_mic or "default"}',
             '-f', 'S16_LE',
             '-c', '1',
             '-r', str(mic_sample_rate),
-            '-t', 'wav',
-            output_file
-        ])
-        
-        # Wait until stop_event is set (user presses Enter again)
-        while not stop_event.is_set() and process.poll() is None:
-            time.sleep(0.1)
-        
-        console.print("[yellow]Stopping recording...")
-        if process.poll() is None:
-            process.terminate()
-            try:
-                process.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                console.print("[red]Process did not terminate gracefully, killing it")
-                process.kill()
-        
-        if os.path.exists(output_file) and os.path.getsize(output_file) > 44:
-            try:
-                sr, audio_data = wavfile.read(output_file)
-                if len(audio_data) > 0:
-                    console.print(f"[green]Recording successful: {len(audio_data)} samples")
-                    console.print(f"[blue]Audio stats - min: {np.min(audio_data)}, max: {np.max(audio_data)}, mean: {np.mean(np.abs(audio_data)):.2f}")
-                    
-                    data_queue.put(('audio_chunk', audio_data))
-                    data_queue.put(('sample_rate', sr))
-                    data_queue.put(('file_path', output_file))
-                    return
-                else:
-                    console.print("[red]Recording file is empty (has header but no audio data)")
-            except Exception as e:
-                console.print(f"[red]Error reading WAV file: {e}")
-        else:
-            console.print(f"[red]Recording failed or file is empty. File size: {os.path.getsize(output_file) if os.path.exists(output_file) else 'File not found'}")
-    except Exception as e:
-        console.print(f"[red]Error with recording: {e}")
-        
-        # Simple fallback for microphone recording
-        if recording_mode == "microphone":
-            try:
-                console.print("[yellow]Trying fallback recording (5 seconds)...")
-                os.system(f"arecord -d 5 -f cd -t wav {output_file}")
-                
-                if os.path.exists(output_file) and os.path.getsize(output_file) > 44:
-                    sr, audio_data = wavfile.read(output_file)
-                    console.print(f"[green]Fallback recording worked: {len(audio_data)} samples")
-                    
-                    data_queue.put(('audio_chunk', audio_data))
-                    data_queue.put(('sample_rate', sr))
-                    data_queue.put(('file_path', output_file))
-            except Exception as e2:
-                console.print(f"[red]Fallback recording also failed: {e2}")
-        # Fallback for system audio recording
+            '-t', 'raw',
+            '-q'
+        ]
+    return [
+        'parec',
+        f'--device={selected_output}',
+        '--format=s16le',
+        '--channels=1',
+        f'--rate={mic_sample_rate}',
+        '--raw'
+    ]
+
+
+class CaptureSession:
+    """
+    One recording: turns raw frames from the capture process into queued chunks.
+
+    Frames are converted to float32 in [-1, 1] while being copied into a
+    preallocated ring buffer and pushed as fixed-duration
+    ('audio_chunk', ...) blocks. The WAV copy, if requested, is written in
+    the background. With `queue_audio` off only the WAV file is written and
+    the queue just gets the sample rate, file path and end of stream.
+
+    With `start_time` (a time.monotonic() value) the first chunk is preceded
+    by ('stream_offset', seconds): when the first captured sample was
+    recorded, relative to that time. Sessions started together for several
+    sources use it to line their streams up.
+    """
+
+    def __init__(self, data_queue, recording_mode, sample_rate, chunk_seconds=1.0, save_wav=True,
+                 target_sample_rate=None, queue_audio=True, label=None, start_time=None):
+        self.data_queue = data_queue
+        self.queue_audio = queue_audio
+        self.recording_mode = recording_mode
+        self.sample_rate = sample_rate
+        self.label = label
+        self.start_time = start_time
+        self.total = 0
+        self._pending = b""
+        self._chunk_samples = max(1, int(chunk_seconds * sample_rate))
+        self._ring = RingBuffer(self._chunk_samples * 4)
+
+        self._resampler = None
+        if target_sample_rate and target_sample_rate != sample_rate:
+            self._resampler = StreamingResampler(sample_rate, target_sample_rate)
+
+        self._writer = None
+        if save_wav:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            suffix = f"_{label}" if label else ""
+            self._writer = WavWriter(f"./cache/recording_{timestamp}{suffix}.wav", sample_rate)
+
+        data_queue.put(('sample_rate', target_sample_rate if self._resampler else sample_rate))
+
+    def _emit(self, chunk):
+        if self._resampler:
+            with metrics.timer("resample_seconds", stage="capture"):
+                chunk = self._resampler.process(chunk)
+        if len(chunk):
+            self.data_queue.put(('audio_chunk', chunk))
+            metrics.inc("capture_chunks_total", mode=self.recording_mode)
+            metrics.set_gauge("data_queue_backlog", self.data_queue.qsize())
+
+    def feed(self, data):
+        """
+        Consumes raw little-endian 16-bit frames.
+
+        Args:
+            data (bytes): Bytes read from the capture process
+        """
+        if self.start_time is not None and not self.total:
+            # The data just read was recorded over the last len(data) / 2 samples
+            offset = time.monotonic() - self.start_time - len(data) / 2 / self.sample_rate
+            self.data_queue.put(('stream_offset', max(0.0, offset)))
+        if self._writer:
+            self._writer.write(data)
+        if not self.queue_audio:
+            self.total += len(data) // 2
+            return
+        if self._pending:
+            data = self._pending + data
+        usable = len(data) - (len(data) % 2)
+        self._pending = data[usable:]
+        samples = np.frombuffer(data, dtype='<i2', count=usable // 2)
+        self.total += len(samples)
+
+        ring = self._ring
+        while len(samples):
+            n = min(len(samples), ring.free())
+            ring.write(samples[:n])
+            samples = samples[n:]
+            while len(ring) >= self._chunk_samples:
+                self._emit(ring.read(self._chunk_samples))
+
+    def finish(self, error=None):
+        """
+        Flushes the remaining audio and ends the stream on the queue.
+
+        Args:
+            error (str, optional): Why the capture ended early
+        """
+        if len(self._ring):
+            self._emit(self._ring.read(len(self._ring)))
+        if self._resampler:
+            tail = self._resampler.flush()
+            if len(tail):
+                self.data_queue.put(('audio_chunk', tail))
+        if self._writer:
+            self._writer.close()
+
+        metrics.inc("capture_samples_total", self.total, mode=self.recording_mode)
+        metrics.observe("capture_audio_seconds", self.total / self.sample_rate, mode=self.recording_mode)
+        name = f"{self.label} recording" if self.label else "Recording"
+        if self.total:
+            console.print(f"[green]{name} successful: {self.total} samples")
+            if self._writer:
+                self.data_queue.put(('file_path', self._writer.path))
         else:
-            try:
-                console.print("[yellow]Trying alternative system audio recording approach (5 seconds)...")
-                os.system(f"timeout 5s parec --device='{selected_output}' --file-format=wav --channels=1 --rate={mic_sample_rate} '{output_file}'")
-                
-                if os.path.exists(output_file) and os.path.getsize(output_file) > 44:
-                    sr, audio_data = wavfile.read(output_file)
-                    console.print(f"[green]Alternative recording worked: {len(audio_data)} samples")
-                    
-                    data_queue.put(('audio_chunk', audio_data))
-                    data_queue.put(('sample_rate', sr))
-                    data_queue.put(('file_path', output_file))
-                else:
-                    console.print("[yellow]Trying final fallback recording...")
-                    os.system(f"timeout 5s parecord '{output_file}' --device='{selected_output}'")
-                    
-                    if os.path.exists(output_file) and os.path.getsize(output_file) > 44:
-                        sr, audio_data = wavfile.read(output_file)
-                        console.print(f"[green]Final fallback recording worked: {len(audio_data)} samples")
-                        
-                        data_queue.put(('audio_chunk', audio_data))
-                        data_queue.put(('sample_rate', sr))
-                        data_queue.put(('file_path', output_file))
-            except Exception as e2:
-                console.print(f"[red]All system audio recording attempts failed: {e2}") 
\ No newline at end of file
+            console.print(f"[red]{name} failed, no audio received. {error or ''}")
+        self.data_queue.put(('stream_end', None))
+
+
+class Recorder:
+    """
+    Keeps one capture process running across recordings.
+
+    A reader thread waits on the process pipes with a selector and routes
+    frames to the active CaptureSession, or drops them between recordings.
+    Starting and stopping a recording only swaps the session under a lock,
+    so neither has to wait for a process to start or exit. close() stops
+    exactly the process this recorder started.
+    """
+
+    def __init__(self, recording_mode, selected_mic=None, mic_sample_rate=CAPTURE_SAMPLE_RATE,
+                 selected_output=None, chunk_seconds=1.0):
+        self.recording_mode = recording_mode
+        self.mic_sample_rate = mic_sample_rate
+        self.chunk_seconds = chunk_seconds
+        self.cmd = capture_command(recording_mode, selected_mic, mic_sample_rate, selected_output)
+        self.process = None
+        self._session = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._wake_r = self._wake_w = None
+        self._stderr = b""
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def open(self):
+        """Starts the capture process and the reader thread if they are not running."""
+        if self.running:
+            return
+        self._join_reader()
+        console.print(f"[blue]Executing command: {' '.join(self.cmd)}")
+        self.process = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._stderr = b""
+        self._wake_r, self._wake_w = os.pipe()
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._thread.start()
+
+    def start(self, data_queue, save_wav=True, target_sample_rate=None, queue_audio=True):
+        """
+        Begins routing audio to the queue.
+
+        Args:
+            data_queue: Queue to put recorded audio data
+            save_wav: Also write the recording to ./cache
+            target_sample_rate: If set and different from the capture rate,
+                chunks are resampled to this rate as they arrive
+            queue_audio: Put audio chunks on the queue. Off, the recording
+                only goes to the WAV file, to be read back from disk
+        """
+        self.open()
+        session = CaptureSession(data_queue, self.recording_mode, self.mic_sample_rate,
+                                 self.chunk_seconds, save_wav, target_sample_rate, queue_audio)
+        with self._lock:
+            previous, self._session = self._session, session
+        if previous:
+            previous.finish()
+        console.print(f"[green]Recording... {'Speak now' if self.recording_mode == 'microphone' else 'Playing audio'} and press Enter when finished.")
+
+    def stop(self):
+        """Ends the current recording and flushes its audio onto its queue."""
+        with self._lock:
+            session, self._session = self._session, None
+        if session:
+            session.finish()
+
+    def close(self):
+        """Ends any recording and stops the capture process."""
+        self.stop()
+        if self._wake_w is not None:
+            os.write(self._wake_w, b"x")
+        process = self.process
+        if process and process.poll() is None:
+            stop_process(process, timeout=1)
+        self._join_reader()
+        self.process = None
+
+    def _join_reader(self):
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._wake_r, self._wake_w):
+            if fd is not None:
+                os.close(fd)
+        self._wake_r = self._wake_w = None
+
+    def _read_loop(self):
+        stdout = self.process.stdout.fileno()
+        stderr = self.process.stderr.fileno()
+        with selectors.DefaultSelector() as selector:
+            selector.register(stdout, selectors.EVENT_READ)
+            selector.register(stderr, selectors.EVENT_READ)
+            selector.register(self._wake_r, selectors.EVENT_READ)
+            open_pipes = 2
+            while open_pipes:
+                for key, _ in selector.select():
+                    if key.fd == self._wake_r:
+                        return
+                    data = os.read(key.fd, 65536)
+                    if not data:
+                        selector.unregister(key.fd)
+                        open_pipes -= 1
+                    elif key.fd == stderr:
+                        self._stderr = (self._stderr + data)[-4096:]
+                    else:
+                        with self._lock:
+                            if self._session:
+                                self._session.feed(data)
+
+        # The capture process died on its own
+        with self._lock:
+            session, self._session = self._session, None
+        if session:
+            session.finish(error=self._stderr.decode(errors='replace').strip())
+
+
+
+class CaptureSource(NamedTuple):
+    """One input of a MultiRecorder."""
+    label: str
+    recording_mode: str
+    device: str = "default"
+    sample_rate: int = CAPTURE_SAMPLE_RATE
+
+
+class MultiRecorder:
+    """
+    Records several sources at once, e.g. the microphone and a monitor of the speakers.
+
+    Every source keeps its own capture process running across recordings,
+    and a single reader thread waits on all of their pipes with one
+    selector, so an extra source costs a process and a few reads per
+    second, not a thread. Each source feeds its own CaptureSession and
+    queue; all sessions of a recording share a start time, so every queue
+    gets a ('stream_offset', ...) item that lines the streams up.
+    """
+
+    def __init__(self, sources, chunk_seconds=1.0):
+        self.sources = list(sources)
+        self.chunk_seconds = chunk_seconds
+        self.cmds = {
+            source.label: capture_command(source.recording_mode, source.device, source.sample_rate, source.device)
+            for source in self.sources
+        }
+        self.processes = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._wake_r = self._wake_w = None
+        self._stderr = {}
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @property
+    def running(self):
+        return bool(self.processes) and all(p.poll() is None for p in self.processes.values())
+
+    def open(self):
+        """Starts the capture processes and the reader thread if they are not running."""
+        if self.running:
+            return
+        self.close()
+        for source in self.sources:
+            cmd = self.cmds[source.label]
+            console.print(f"[blue]Executing command for {source.label}: {' '.join(cmd)}")
+            self.processes[source.label] = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            self._stderr[source.label] = b""
+        self._wake_r, self._wake_w = os.pipe()
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._thread.start()
+
+    def start(self, data_queues, save_wav=True, target_sample_rate=None):
+        """
+        Begins routing the audio of every source to its queue.
+
+        Args:
+            data_queues (dict): Source label -> Queue for its audio data
+            save_wav: Also write each source's recording to ./cache
+            target_sample_rate: If set, chunks are resampled to this rate
+                as they arrive
+        """
+        self.open()
+        start_time = time.monotonic()
+        sessions = {
+            source.label: CaptureSession(data_queues[source.label], source.recording_mode, source.sample_rate,
+                                         self.chunk_seconds, save_wav, target_sample_rate,
+                                         label=source.label, start_time=start_time)
+            for source in self.sources
+        }
+        with self._lock:
+            previous, self._sessions = self._sessions, sessions
+        for session in previous.values():
+            session.finish()
+        console.print(f"[green]Recording {', '.join(sessions)}... press Enter when finished.")
+
+    def stop(self):
+        """Ends the current recording and flushes every source onto its queue."""
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.finish()
+
+    def close(self):
+        """Ends any recording and stops all capture processes."""
+        self.stop()
+        if self._wake_w is not None:
+            os.write(self._wake_w, b"x")
+        for process in self.processes.values():
+            if process.poll() is None:
+                stop_process(process, timeout=1)
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._wake_r, self._wake_w):
+            if fd is not None:
+                os.close(fd)
+        self._wake_r = self._wake_w = None
+        self.processes = {}
+
+    def _read_loop(self):
+        with selectors.DefaultSelector() as selector:
+            for label, process in self.processes.items():
+                selector.register(process.stdout.fileno(), selectors.EVENT_READ, (label, "audio"))
+                selector.register(process.stderr.fileno(), selectors.EVENT_READ, (label, "stderr"))
+            selector.register(self._wake_r, selectors.EVENT_READ, None)
+            open_pipes = 2 * len(self.processes)
+            while open_pipes:
+                for key, _ in selector.select():
+                    if key.data is None:
+                        return
+                    label, stream = key.data
+                    data = os.read(key.fd, 65536)
+                    if not data:
+                        selector.unregister(key.fd)
+                        open_pipes -= 1
+                        if stream == "audio":
+                            self._source_ended(label)
+                    elif stream == "stderr":
+                        self._stderr[label] = (self._stderr[label] + data)[-4096:]
+                    else:
+                        with self._lock:
+                            session = self._sessions.get(label)
+                            if session:
+                                session.feed(data)
+
+    def _source_ended(self, label):
+        # One capture process died on its own, the other sources keep recording
+        with self._lock:
+            session = self._sessions.pop(label, None)
+        if session:
+            session.finish(error=self._stderr[label].decode(errors='replace').strip())
@@ -0,0 +1,239 @@
+import mmap
+import os
+import struct
+import numpy as np
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioSource:
+    """
+    Random access to mono samples without loading them all.
+
+    Sources behave like a read-only 1-D array for the operations the
+    pipeline uses (len(), dtype and slicing), so they can be passed to VAD
+    and transcribe_long() directly. Slices are views where possible;
+    multi-channel audio is mixed down one window at a time.
+    """
+
+    sample_rate = None
+    dtype = None
+    channels = 1
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def window(self, start, stop):
+        """
+        Returns the mono samples in [start, stop).
+
+        Args:
+            start (int): First sample
+            stop (int): One past the last sample
+
+        Returns:
+            numpy.ndarray: The samples, a view for mono sources
+        """
+        raise NotImplementedError
+
+    @property
+    def duration(self):
+        """Length in seconds."""
+        return len(self) / self.sample_rate
+
+    @property
+    def ndim(self):
+        return 1
+
+    @property
+    def shape(self):
+        return (len(self),)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("Audio sources only support contiguous slices")
+        start, stop, _ = key.indices(len(self))
+        return self.window(start, max(start, stop))
+
+    def __array__(self, dtype=None, copy=None):
+        # Always a private copy, callers may scale it in place
+        return np.array(self.window(0, len(self)), dtype=dtype)
+
+    def windows(self, seconds, overlap_seconds=0.0):
+        """
+        Yields consecutive windows.
+
+        Args:
+            seconds (float): Window length
+            overlap_seconds (float): How much each window repeats of the last one
+
+        Yields:
+            tuple: (first sample, samples)
+        """
+        size = max(1, int(seconds * self.sample_rate))
+        step = max(1, size - int(overlap_seconds * self.sample_rate))
+        for start in range(0, len(self), step):
+            yield start, self.window(start, min(start + size, len(self)))
+            if start + size >= len(self):
+                break
+
+
+def _mix_down(frames):
+    """Averages the channels of a (samples, channels) window, keeping the dtype."""
+    if frames.dtype.kind == "f":
+        return frames.mean(axis=1, dtype=np.float32)
+    return frames.mean(axis=1).astype(frames.dtype)
+
+
+class ArraySource(AudioSource):
+    """
+    Source over samples already in memory.
+
+    Args:
+        audio_np (numpy.ndarray): (samples,) or (samples, channels)
+        sample_rate (int): Sample rate of the audio
+    """
+
+    def __init__(self, audio_np, sample_rate):
+        self._audio = audio_np
+        self.sample_rate = sample_rate
+        self.dtype = audio_np.dtype
+        self.channels = 1 if audio_np.ndim == 1 else audio_np.shape[1]
+
+    def __len__(self):
+        return len(self._audio)
+
+    def window(self, start, stop):
+        frames = self._audio[start:stop]
+        return frames if self.channels == 1 else _mix_down(frames)
+
+
+def _parse_wav_header(f, file_size):
+    """
+    Finds the format and the sample data of a RIFF/WAVE file.
+
+    A data chunk that claims more bytes than the file has, as left behind by
+    a capture that was killed before the header was finalized, is cut to
+    what is there.
+
+    Returns:
+        tuple: (sample_rate, channels, dtype, data offset, data bytes)
+    """
+    riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+    if riff != b"RIFF" or wave != b"WAVE":
+        raise ValueError("Not a RIFF/WAVE file")
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("WAV file has no data chunk")
+        chunk_id, size = struct.unpack("<4sI", header)
+        if chunk_id == b"fmt ":
+            fmt = f.read(size)
+            f.seek(size % 2, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data chunk before format chunk")
+            offset = f.tell()
+            size = min(size, file_size - offset)
+            break
+        else:
+            f.seek(size + size % 2, os.SEEK_CUR)
+
+    tag, channels, sample_rate, _, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if tag == _WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        tag = struct.unpack("<H", fmt[24:26])[0]
+    if tag == _WAVE_FORMAT_PCM and bits in (8, 16, 32):
+        dtype = np.dtype({8: "u1", 16: "<i2", 32: "<i4"}[bits])
+    elif tag == _WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        dtype = np.dtype({32: "<f4", 64: "<f8"}[bits])
+    else:
+        raise ValueError(f"Unsupported WAV format {tag} with {bits} bits per sample")
+    return sample_rate, channels, dtype, offset, size - size % block_align
+
+
+class WavFileSource(AudioSource):
+    """
+    Source over a memory-mapped WAV file.
+
+    Nothing is read up front and windows are views into the mapping. While
+    the file is read front to back, pages that are already behind the
+    reader are handed back to the kernel, so resident memory stays at a
+    few windows however long the recording is.
+
+    Args:
+        path (str): Path to the WAV file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            self.sample_rate, self.channels, self.dtype, offset, size = _parse_wav_header(f, file_size)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._offset = offset
+        self._frame_bytes = self.dtype.itemsize * self.channels
+        self._frames = size // self._frame_bytes
+        if self._mmap is None:
+            self._data = np.zeros((0, self.channels), dtype=self.dtype)
+        else:
+            self._data = np.frombuffer(self._mmap, dtype=self.dtype, count=self._frames * self.channels,
+                                       offset=offset).reshape(self._frames, self.channels)
+        self._last_start = 0
+
+    def __len__(self):
+        return self._frames
+
+    def window(self, start, stop):
+        self._release_before(start)
+        frames = self._data[start:stop]
+        return frames[:, 0] if self.channels == 1 else _mix_down(frames)
+
+    def _release_before(self, start):
+        # Moving forward, drop the pages between the last window and this one.
+        # Moving back just faults the pages in again from the page cache.
+        previous, self._last_start = self._last_start, start
+        if self._mmap is None or start <= previous or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        page = mmap.PAGESIZE
+        first = (self._offset + previous * self._frame_bytes) // page * page
+        last = (self._offset + start * self._frame_bytes) // page * page - page
+        if last > first:
+            self._mmap.madvise(mmap.MADV_DONTNEED, first, last - first)
+
+    def close(self):
+        """Unmaps the file, if no views into it are left."""
+        self._data = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # Still referenced by a window, closed when that goes away
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def open_source(path):
+    """
+    Opens an audio file as a source.
+
+    WAV files are memory-mapped, anything else is decoded to 16kHz with
+    Whisper's ffmpeg loader.
+
+    Args:
+        path (str): Path to the audio file
+
+    Returns:
+        AudioSource: The source
+    """
+    if path.lower().endswith(".wav"):
+        return WavFileSource(path)
+    from whisper.audio import load_audio
+    return ArraySource(load_audio(path), 16000)
@@ -0,0 +1,183 @@
+import os
+from functools import partial
+
+# Backend used when none is given, see BACKENDS
+DEFAULT_BACKEND = os.environ.get("TRANSCRIBE_BACKEND", "whisper")
+
+
+def default_threads():
+    """Returns the inference thread count from TRANSCRIBE_THREADS, None for the library default."""
+    threads = os.environ.get("TRANSCRIBE_THREADS")
+    return int(threads) if threads else None
+
+
+def _set_torch_threads(threads):
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+
+
+def load_whisper_model(name, device="cpu", dtype="float32", threads=None):
+    """
+    Loads a Whisper model from disk.
+
+    Args:
+        name (str): Whisper model name (e.g. 'base.en', 'small', 'medium')
+        device (str): Torch device to load the model on
+        dtype (str): 'float32' or 'float16'
+        threads (int, optional): Torch intra-op threads
+
+    Returns:
+        The loaded Whisper model
+    """
+    import whisper
+
+    _set_torch_threads(threads)
+    model = whisper.load_model(name, device=device)
+    if dtype == "float16":
+        model = model.half()
+    # Read by the result cache, results of different backends differ slightly
+    model.backend = "whisper"
+    return model
+
+
+def load_int8_model(name, device="cpu", dtype="float32", threads=None):
+    """
+    Loads a Whisper model with int8 dynamically quantized linear layers.
+
+    Weights of every linear layer are stored as int8 and activations are
+    quantized on the fly, which shrinks the model about 2-3x and speeds up
+    CPU decoding. Convolutions and embeddings stay in float32. The result is
+    a regular Whisper model, so transcribe(), decode() and batching work
+    unchanged.
+
+    Args:
+        name (str): Whisper model name
+        device (str): Must be 'cpu', quantized kernels only run there
+        dtype (str): Ignored, activations are always float32
+        threads (int, optional): Torch intra-op threads
+
+    Returns:
+        The quantized Whisper model
+    """
+    import torch
+
+    if device != "cpu":
+        raise ValueError("The whisper-int8 backend only runs on the CPU")
+    model = load_whisper_model(name, device="cpu", threads=threads)
+    # Whisper wraps nn.Linear in a subclass that quantize_dynamic() does not
+    # recognize, the plain class computes the same thing in float32
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear):
+            module.__class__ = torch.nn.Linear
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    model.backend = "whisper-int8"
+    return model
+
+
+class FasterWhisperModel:
+    """
+    Adapts a faster-whisper (CTranslate2) model to Whisper's transcribe() interface.
+
+    Results are returned as Whisper-style dicts with "text", "segments"
+    (including "words" when word timestamps are requested) and "language".
+    Options faster-whisper does not know, like fp16, are dropped.
+    """
+
+    backend = "faster-whisper"
+
+    _OPTIONS = {"language", "task", "beam_size", "best_of", "temperature", "initial_prompt",
+                "condition_on_previous_text", "word_timestamps", "no_speech_threshold",
+                "compression_ratio_threshold", "log_prob_threshold", "without_timestamps"}
+
+    def __init__(self, model, name, compute_type):
+        self.model = model
+        self.name = name
+        self.compute_type = compute_type
+
+    def transcribe(self, audio, **options):
+        if "logprob_threshold" in options:
+            options["log_prob_threshold"] = options.pop("logprob_threshold")
+        options = {k: v for k, v in options.items() if k in self._OPTIONS}
+        options.setdefault("beam_size", 1)
+        segments, info = self.model.transcribe(audio, **options)
+        results = []
+        for segment in segments:
+            result = {
+                "id": segment.id,
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "avg_logprob": segment.avg_logprob,
+                "compression_ratio": segment.compression_ratio,
+                "no_speech_prob": segment.no_speech_prob,
+            }
+            if segment.words is not None:
+                result["words"] = [
+                    {"word": w.word, "start": w.start, "end": w.end, "probability": w.probability}
+                    for w in segment.words
+                ]
+            results.append(result)
+        return {"text": "".join(s["text"] for s in results), "segments": results, "language": info.language}
+
+    def language_probs(self, audio):
+        # Detection runs inside transcribe(), the segments are decoded lazily and never touched here
+        _, info = self.model.transcribe(audio, beam_size=1)
+        if info.all_language_probs:
+            return dict(info.all_language_probs)
+        return {info.language: info.language_probability}
+
+    def decode_batch(self, audios, language=None):
+        # CTranslate2 batches inside one call already, clips go through one by one
+        return [self.transcribe(audio, language=language, without_timestamps=True) for audio in audios]
+
+
+def load_faster_whisper_model(name, device="cpu", dtype="float32", threads=None, compute_type="int8"):
+    """
+    Loads a model with faster-whisper, the CTranslate2 reimplementation of Whisper.
+
+    Needs `pip install faster-whisper`. The converted checkpoint is
+    downloaded on first use.
+
+    Args:
+        name (str): Whisper model name
+        device (str): 'cpu' or 'cuda'
+        dtype (str): Ignored, the precision is set by `compute_type`
+        threads (int, optional): CPU threads, 0 lets CTranslate2 decide
+        compute_type (str): CTranslate2 compute type such as 'int8' or 'float32'
+
+    Returns:
+        FasterWhisperModel: The adapted model
+    """
+    try:
+        from faster_whisper import WhisperModel
+    except ImportError:
+        raise ImportError("The faster-whisper backend needs 'pip install faster-whisper'") from None
+
+    model = WhisperModel(name, device=device, compute_type=compute_type, cpu_threads=threads or 0)
+    return FasterWhisperModel(model, name, compute_type)
+
+
+BACKENDS = {
+    "whisper": load_whisper_model,
+    "whisper-int8": load_int8_model,
+    "faster-whisper": load_faster_whisper_model,
+}
+
+
+def get_loader(backend=None, threads=None):
+    """
+    Returns the model loader of a backend, for ModelRegistry.
+
+    Args:
+        backend (str, optional): One of BACKENDS, defaults to TRANSCRIBE_BACKEND
+        threads (int, optional): Inference threads, defaults to TRANSCRIBE_THREADS
+
+    Returns:
+        callable: loader(name, device=..., dtype=...)
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', choose from {', '.join(sorted(BACKENDS))}")
+    return partial(BACKENDS[backend], threads=threads if threads is not None else default_threads())
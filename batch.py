@@ -0,0 +1,384 @@
+"""
+Non-interactive batch transcription of audio files.
+
+Usage:
+    python batch.py ./cache/*.wav "recordings/**/*.wav" --jobs 4 --resume
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from queue import Queue
+import numpy as np
+from utils import console
+from audio_source import open_source
+from metrics import metrics
+from model_registry import ModelRegistry, get_registry
+from backends import BACKENDS, DEFAULT_BACKEND
+from transcription import TARGET_SAMPLE_RATE, DEFAULT_MODELS, preprocess_audio, transcribe, save_transcription
+from batching import BatchScheduler
+from language_id import get_language_identifier
+from features import HOP_LENGTH, features_path, load_features, model_n_mels, transcribe_features
+
+_DONE = object()
+
+
+def expand_inputs(patterns):
+    """
+    Expands files and glob patterns into a sorted list of files.
+
+    Args:
+        patterns (list): File paths or glob patterns
+
+    Returns:
+        list: Absolute paths of the matching files
+    """
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isfile(path):
+                paths.add(os.path.abspath(path))
+            elif not glob.has_magic(pattern):
+                console.print(f"[red]Not a file: {path}")
+    return sorted(paths)
+
+
+def load_audio_file(path):
+    """
+    Opens an audio file as mono samples.
+
+    WAV files are memory-mapped, anything else goes through Whisper's
+    ffmpeg loader.
+
+    Args:
+        path (str): Path to the audio file
+
+    Returns:
+        tuple: (AudioSource, sample_rate)
+    """
+    with metrics.timer("file_read_seconds"):
+        source = open_source(path)
+    return source, source.sample_rate
+
+
+def decode_file(path, n_mels=None):
+    """
+    Loads and resamples one file. Runs in a worker process.
+
+    Args:
+        path (str): Path to the audio file
+        n_mels (int, optional): Compute or reuse the file's log-mel features
+            instead, for a model with this many mel bands
+
+    Returns:
+        tuple: (path, float32 audio at 16kHz or the features file, duration in seconds)
+    """
+    if n_mels:
+        frames = load_features(path, n_mels)
+        return path, features_path(path, n_mels), len(frames) * HOP_LENGTH / TARGET_SAMPLE_RATE
+    audio, sample_rate = load_audio_file(path)
+    audio = preprocess_audio(audio, sample_rate, normalize=False)
+    return path, audio, len(audio) / TARGET_SAMPLE_RATE
+
+
+def output_paths(paths, output_dir):
+    """
+    Assigns a transcript file to every input file.
+
+    Files with the same name in different directories get a short hash of
+    their path appended.
+
+    Returns:
+        dict: input path -> transcript path
+    """
+    stems = {}
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        stems.setdefault(stem, []).append(path)
+    outputs = {}
+    for stem, group in stems.items():
+        for path in group:
+            name = stem
+            if len(group) > 1:
+                name = f"{stem}_{hashlib.sha1(path.encode()).hexdigest()[:8]}"
+            outputs[path] = os.path.join(output_dir, f"{name}.txt")
+    return outputs
+
+
+class Manifest:
+    """
+    Append-only JSON lines record of finished files, used to resume runs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Truncated last line of an interrupted run
+                    self.entries[entry["source"]] = entry
+
+    def is_done(self, path):
+        """Returns True if the file was transcribed and has not changed since."""
+        entry = self.entries.get(path)
+        if not entry or not os.path.exists(entry["transcript"]):
+            return False
+        stat = os.stat(path)
+        return entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
+
+    def add(self, path, transcript, audio_seconds):
+        stat = os.stat(path)
+        entry = {
+            "source": path,
+            "transcript": transcript,
+            "audio_seconds": audio_seconds,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+        }
+        with self._lock:
+            self.entries[path] = entry
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+def run_long_form(paths, language_config, outputs, manifest, workers=None, threads=None,
+                  batch_size=1, batch_wait=0.05, registry=None):
+    """
+    Transcribes files one after another, each split across worker processes
+    or, with `batch_size` above 1, decoded in batches of segments.
+
+    The workers load models for the backend of `registry`; the batched path
+    takes its model from `registry` itself.
+
+    Returns:
+        dict: Summary with counts and audio seconds
+    """
+    from long_form import transcribe_long
+
+    stats = {"done": 0, "failed": 0, "audio_seconds": 0.0}
+    for path in paths:
+        try:
+            audio, sample_rate = load_audio_file(path)
+            text = transcribe_long(audio, sample_rate, language_config, workers=workers, threads=threads,
+                                   batch_size=batch_size, batch_wait=batch_wait, source=path, registry=registry)
+            duration = len(audio) / sample_rate
+            manifest.add(path, save_transcription(text, path, outputs[path]), duration)
+            stats["done"] += 1
+            stats["audio_seconds"] += duration
+        except Exception as e:
+            console.print(f"[red]Transcription failed for {path}: {e}")
+            stats["failed"] += 1
+        finally:
+            # The file is done, its detected language and speech probe can go
+            get_language_identifier().forget(path)
+    return stats
+
+
+def run_batch(paths, language_config, output_dir="./cache/batch", jobs=None, model_workers=1,
+              queue_size=4, resume=False, registry=None, long_form=False, threads=None,
+              batch_size=1, batch_wait=0.05, use_features=False):
+    """
+    Transcribes many files with a decode process pool feeding model workers.
+
+    Files are loaded and resampled in `jobs` worker processes. Their audio
+    goes through a bounded queue to `model_workers` threads, each with its
+    own model instance. With `batch_size` above 1 there is a single model
+    instead, and files of up to 30 seconds from different workers are
+    decoded together in batches.
+
+    Args:
+        paths (list): Audio files to transcribe
+        language_config (dict): Configuration with language code and model
+        output_dir (str): Directory for transcripts and the run manifest
+        jobs (int): Decode worker processes, defaults to the CPU count
+        model_workers (int): Threads running the model
+        queue_size (int): Decoded files allowed to wait for a model worker
+        resume (bool): Skip files already finished by an earlier run
+        registry (ModelRegistry, optional): Registry to fetch the model from
+        long_form (bool): Split each WAV file into segments decoded by `jobs`
+            worker processes instead of decoding whole files
+        threads (int): Torch threads per long-form worker
+        batch_size (int): Clips decoded per batched forward pass
+        batch_wait (float): Longest a clip waits for its batch to fill
+        use_features (bool): Decode from log-mel features kept next to the
+            files, computed on first use, with `batch_size` windows per
+            forward pass. Re-running with another model skips the audio
+            front end entirely
+
+    Returns:
+        dict: Summary with counts, audio seconds and wall seconds
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    registry = registry or get_registry()
+    manifest = Manifest(os.path.join(output_dir, "batch_manifest.jsonl"))
+    outputs = output_paths(paths, output_dir)
+
+    todo = [p for p in paths if not (resume and manifest.is_done(p))]
+    skipped = len(paths) - len(todo)
+    if skipped:
+        console.print(f"[blue]Resuming: {skipped} file(s) already done")
+
+    if long_form:
+        start = time.perf_counter()
+        stats = run_long_form(todo, language_config, outputs, manifest, workers=jobs, threads=threads,
+                              batch_size=batch_size, batch_wait=batch_wait, registry=registry)
+        stats["skipped"] = skipped
+        stats["wall_seconds"] = time.perf_counter() - start
+        return stats
+
+    scheduler = None
+    n_mels = model_n_mels(registry.get(language_config["model"])) if use_features else None
+    if batch_size > 1 and not use_features:
+        # One model, fed by enough worker threads to fill a batch
+        scheduler = BatchScheduler(registry.get(language_config["model"]), batch_size, batch_wait,
+                                   name=language_config["model"])
+        models = [scheduler] * max(model_workers, batch_size)
+    else:
+        # Worker threads share the registry model only when there is one of them,
+        # Whisper's decoder keeps per-call state on the module
+        models = [registry.get(language_config["model"])]
+        for _ in range(model_workers - 1):
+            models.append(registry.loader(language_config["model"]))
+
+    work = Queue(maxsize=queue_size)
+    stats = {"done": 0, "failed": 0, "skipped": skipped, "audio_seconds": 0.0}
+    stats_lock = threading.Lock()
+
+    def producer():
+        limit = (jobs or os.cpu_count() or 1) + queue_size
+        pending = deque()
+
+        def hand_over(path, future):
+            try:
+                work.put(future.result())
+            except Exception as e:
+                console.print(f"[red]Could not read {path}: {e}")
+                with stats_lock:
+                    stats["failed"] += 1
+
+        # At most `limit` files are decoded ahead of the model workers
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for path in todo:
+                while len(pending) >= limit:
+                    hand_over(*pending.popleft())
+                pending.append((path, pool.submit(decode_file, path, n_mels)))
+            while pending:
+                hand_over(*pending.popleft())
+        for _ in models:
+            work.put(_DONE)
+
+    def model_worker(model):
+        while True:
+            item = work.get()
+            if item is _DONE:
+                return
+            path, audio, duration = item
+            metrics.set_gauge("batch_queue_backlog", work.qsize())
+            try:
+                if n_mels:
+                    frames = np.load(audio, mmap_mode="r")
+                    text = transcribe_features(frames, language_config, model=model, batch_size=batch_size)["text"]
+                else:
+                    text = transcribe(audio, TARGET_SAMPLE_RATE, language_config, model=model, source=path)
+                transcript = save_transcription(text, path, outputs[path])
+                manifest.add(path, transcript, duration)
+                with stats_lock:
+                    stats["done"] += 1
+                    stats["audio_seconds"] += duration
+            except Exception as e:
+                console.print(f"[red]Transcription failed for {path}: {e}")
+                with stats_lock:
+                    stats["failed"] += 1
+            finally:
+                get_language_identifier().forget(path)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=producer, daemon=True)]
+    threads += [threading.Thread(target=model_worker, args=(m,), daemon=True) for m in models]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if scheduler is not None:
+        scheduler.close()
+
+    stats["wall_seconds"] = time.perf_counter() - start
+    return stats
+
+
+def print_summary(stats):
+    """Prints the throughput summary of a batch run."""
+    wall = stats["wall_seconds"]
+    speed = stats["audio_seconds"] / wall if wall > 0 else 0.0
+    console.print(f"[green]Done: {stats['done']}  [yellow]Skipped: {stats['skipped']}  [red]Failed: {stats['failed']}")
+    console.print(f"[blue]Audio: {stats['audio_seconds']:.1f}s in {wall:.1f}s wall time "
+                  f"({speed:.2f} audio-seconds per wall-second)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe audio files in batch.")
+    parser.add_argument("inputs", nargs="+", help="Audio files or glob patterns")
+    parser.add_argument("--language", default="en", choices=sorted(DEFAULT_MODELS), help="Language code")
+    parser.add_argument("--model", help="Whisper model, defaults depend on the language")
+    parser.add_argument("--jobs", type=int, default=None, help="Decode worker processes")
+    parser.add_argument("--model-workers", type=int, default=1, help="Model instances running in parallel")
+    parser.add_argument("--queue-size", type=int, default=4, help="Decoded files waiting for a model worker")
+    parser.add_argument("--output-dir", default="./cache/batch", help="Where transcripts are written")
+    parser.add_argument("--resume", action="store_true", help="Skip files finished by an earlier run")
+    parser.add_argument("--long-form", action="store_true",
+                        help="Split long WAV files into segments decoded by --jobs processes")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Inference threads per model, or per long-form worker")
+    parser.add_argument("--backend", default=None, choices=sorted(BACKENDS),
+                        help="Inference backend, defaults to $TRANSCRIBE_BACKEND or whisper")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Clips of up to 30s decoded per forward pass, with a single model")
+    parser.add_argument("--features", action="store_true",
+                        help="Decode from cached log-mel features, computing them on first use")
+    parser.add_argument("--batch-wait-ms", type=float, default=50,
+                        help="Longest a clip waits for its batch to fill")
+    args = parser.parse_args()
+    if args.features and (args.backend or DEFAULT_BACKEND) == "faster-whisper":
+        # CTranslate2 computes its own features, precomputed ones cannot be fed to it
+        parser.error("--features needs a torch backend (whisper or whisper-int8)")
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        console.print("[red]No input files found")
+        return
+    language_config = {"code": args.language, "model": args.model or DEFAULT_MODELS[args.language]}
+    registry = ModelRegistry(backend=args.backend, threads=args.threads)
+    console.print(f"[cyan]Transcribing {len(paths)} file(s) with '{language_config['model']}' ({registry.backend})")
+
+    stats = run_batch(
+        paths,
+        language_config,
+        output_dir=args.output_dir,
+        jobs=args.jobs,
+        model_workers=max(1, args.model_workers),
+        queue_size=max(1, args.queue_size),
+        resume=args.resume,
+        registry=registry,
+        long_form=args.long_form,
+        threads=args.threads,
+        batch_size=max(1, args.batch_size),
+        batch_wait=args.batch_wait_ms / 1000,
+        use_features=args.features,
+    )
+    print_summary(stats)
+    metrics.export()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+from utils import console
+from metrics import metrics
+from language_id import language_probs
+
+# Whisper decodes fixed 30 second windows of 16kHz audio
+SAMPLE_RATE = 16000
+WINDOW_SAMPLES = 30 * SAMPLE_RATE
+
+# Decode options the batched path can honour, anything else falls back to
+# the model's own transcribe()
+BATCHABLE_OPTIONS = {"fp16", "language"}
+
+
+def result_from_decoding(decoding, num_samples):
+    """
+    Turns a whisper DecodingResult into a transcribe()-style result.
+
+    Args:
+        decoding: whisper.DecodingResult of one window
+        num_samples (int): Length of the audio that was decoded
+
+    Returns:
+        dict: {"text", "segments", "language"}
+    """
+    text = decoding.text
+    return {
+        "text": text,
+        "segments": [{
+            "id": 0,
+            "seek": 0,
+            "start": 0.0,
+            "end": num_samples / SAMPLE_RATE,
+            "text": text,
+            "tokens": list(decoding.tokens),
+            "temperature": decoding.temperature,
+            "avg_logprob": decoding.avg_logprob,
+            "compression_ratio": decoding.compression_ratio,
+            "no_speech_prob": decoding.no_speech_prob,
+        }] if text.strip() else [],
+        "language": decoding.language,
+    }
+
+
+def decoding_language(model, language):
+    """
+    Returns the language to decode a batch with.
+
+    English-only models have no language tokens, so detection would raise;
+    they always decode English.
+
+    Args:
+        model: Loaded Whisper model
+        language (str, optional): Requested language code, None to detect
+
+    Returns:
+        str: Language code, None to detect it per window
+    """
+    if language is None and not model.is_multilingual:
+        return "en"
+    return language
+
+
+def decode_batch(model, audios, language=None):
+    """
+    Runs the encoder and greedy decoding over several windows at once.
+
+    Every clip is padded to a 30 second log-mel window and the windows are
+    stacked into one batch. Unlike transcribe(), there is no temperature
+    fallback and no timestamp prediction, so this is meant for clips that
+    already fit in one window.
+
+    Args:
+        model: Loaded Whisper model, or any object with its own decode_batch()
+        audios (list): float32 clips at 16kHz, each at most 30 seconds
+        language (str, optional): Language code, detected per clip if None
+
+    Returns:
+        list: transcribe()-style results in input order
+    """
+    if hasattr(model, "decode_batch"):
+        return model.decode_batch(audios, language=language)
+
+    import torch
+    import whisper
+
+    n_mels = getattr(model.dims, "n_mels", 80)
+    mel = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=n_mels)
+        for audio in audios
+    ]).to(model.device)
+    options = whisper.DecodingOptions(language=decoding_language(model, language), fp16=False,
+                                      without_timestamps=True)
+    with torch.no_grad():
+        decodings = model.decode(mel, options)
+    return [result_from_decoding(d, len(a)) for d, a in zip(decodings, audios)]
+
+
+class _Request:
+    __slots__ = ("audio", "language", "future", "arrival")
+
+    def __init__(self, audio, language):
+        self.audio = audio
+        self.language = language
+        self.future = Future()
+        self.arrival = time.perf_counter()
+
+
+class BatchScheduler:
+    """
+    Collects concurrent decode requests for one model into batched calls.
+
+    Callers block in transcribe() while a background thread gathers the
+    pending clips until `max_batch_size` are waiting or the oldest one has
+    waited `max_wait` seconds, decodes them in one forward pass and hands
+    every caller its own result. Requests with different languages go into
+    separate batches.
+
+    The scheduler can be passed as `model` wherever a loaded Whisper model
+    is expected. Clips longer than one window, calls with options the
+    batched path does not support and every call with `max_batch_size` 1
+    go to the model's own transcribe(), which keeps timestamps and the
+    temperature fallback. All access to the model is serialized, so it is
+    never used by two threads at once. After close() late callers are
+    served the same way instead of failing.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_wait=0.05, name="model"):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self._requests = Queue()
+        self._model_lock = threading.Lock()
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, audio_np, language=None):
+        """
+        Queues a clip for the next batch.
+
+        Args:
+            audio_np (numpy.ndarray): float32 audio at 16kHz, at most 30 seconds
+            language (str, optional): Language code
+
+        Returns:
+            concurrent.futures.Future: Resolves to a transcribe()-style result
+        """
+        future = self._enqueue(audio_np, language)
+        if future is None:
+            raise RuntimeError("BatchScheduler is closed")
+        return future
+
+    def _enqueue(self, audio_np, language):
+        # Under the lock, so no request lands behind the stop marker
+        with self._submit_lock:
+            if self._closed:
+                return None
+            request = _Request(audio_np, language)
+            self._requests.put(request)
+            return request.future
+
+    def decode_mode(self, audio_np, options):
+        """
+        Returns how a transcribe() call with these arguments is decoded.
+
+        Batched results have no temperature fallback and one segment per
+        clip, so the result cache keeps them apart from full decodes.
+
+        Returns:
+            str: "batched" or "full"
+        """
+        if self.max_batch_size > 1 and len(audio_np) <= WINDOW_SAMPLES and set(options) <= BATCHABLE_OPTIONS:
+            return "batched"
+        return "full"
+
+    def transcribe(self, audio_np, **options):
+        """Drop-in for the model's transcribe(), batching where possible."""
+        if self.decode_mode(audio_np, options) == "batched":
+            future = self._enqueue(audio_np, options.get("language"))
+            if future is not None:
+                return future.result()
+        with self._model_lock:
+            return self.model.transcribe(audio_np, **options)
+
+    def language_probs(self, audio_np):
+        """Detects the language of a clip, between batches."""
+        with self._model_lock:
+            return language_probs(self.model, audio_np)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def close(self):
+        """Stops the scheduler thread after the queued requests are served."""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._requests.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        first = self._requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first.arrival + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = self._requests.get(timeout=timeout) if timeout > 0 else self._requests.get_nowait()
+            except Empty:
+                break
+            if request is None:
+                # Serve what we have, then stop
+                self._requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.language, []).append(request)
+            for language, requests in groups.items():
+                self._decode(language, requests)
+
+    def _decode(self, language, requests):
+        metrics.observe("batch_size", len(requests), buckets=(1, 2, 4, 8, 16, 32), model=self.name)
+        now = time.perf_counter()
+        for request in requests:
+            metrics.observe("batch_wait_seconds", now - request.arrival, model=self.name)
+        try:
+            with self._model_lock, metrics.timer("batch_decode_seconds", model=self.name):
+                results = decode_batch(self.model, [r.audio for r in requests], language)
+        except Exception as e:
+            console.print(f"[red]Batched decode of {len(requests)} clip(s) failed: {e}")
+            for request in requests:
+                request.future.set_exception(e)
+            return
+        for request, result in zip(requests, results):
+            request.future.set_result(result)
@@ -0,0 +1,134 @@
+"""
+Compares inference backends on the same recordings.
+
+Every backend transcribes every file; the report shows load time, real-time
+factor and peak memory per backend, and the word error rate of each
+backend's output against the first (reference) backend.
+
+Usage:
+    python -m benchmarks.backend_benchmark recording.wav --model base.en
+    python -m benchmarks.backend_benchmark *.wav --backends whisper whisper-int8 faster-whisper --threads 4
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import time
+from audio_source import open_source
+from backends import BACKENDS
+from model_registry import ModelRegistry
+from transcription import TARGET_SAMPLE_RATE, preprocess_audio, run_model
+from benchmarks.pipeline_benchmark import peak_rss_mb, reset_peak_rss
+
+
+def words(text):
+    """Splits text into lowercase words without punctuation."""
+    return re.findall(r"[\w']+", text.lower())
+
+
+def word_error_rate(reference, hypothesis):
+    """
+    Word-level edit distance divided by the reference length.
+
+    Args:
+        reference (list): Reference words
+        hypothesis (list): Words to score
+
+    Returns:
+        float: Word error rate, 0.0 for identical outputs
+    """
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / max(1, len(reference))
+
+
+def run_backend(backend, model_name, audios, language_config, threads, repeats):
+    """
+    Loads one backend and transcribes every recording with it.
+
+    Returns:
+        dict: Load time, per-file texts and timings
+    """
+    reset_peak_rss()
+    registry = ModelRegistry(max_models=1, backend=backend, threads=threads)
+    start = time.perf_counter()
+    model = registry.get(model_name)
+    load_seconds = time.perf_counter() - start
+    # The first decode pays for lazy initialization, keep it out of the timings
+    run_model(audios[0][1][:TARGET_SAMPLE_RATE], language_config, model=model, registry=registry, cache=False)
+
+    files = {}
+    for name, audio in audios:
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = run_model(audio, language_config, model=model, registry=registry, cache=False)
+            times.append(time.perf_counter() - start)
+        duration = len(audio) / TARGET_SAMPLE_RATE
+        files[name] = {"text": result["text"].strip(), "seconds": min(times), "rtf": min(times) / duration}
+    return {"load_seconds": load_seconds, "peak_rss_mb": peak_rss_mb(), "files": files}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inference backends on real recordings.")
+    parser.add_argument("files", nargs="+", help="Audio files to transcribe")
+    parser.add_argument("--model", default="base.en", help="Whisper model name")
+    parser.add_argument("--language", default="en", help="Language code")
+    parser.add_argument("--backends", nargs="+", default=["whisper", "whisper-int8"], choices=sorted(BACKENDS),
+                        help="Backends to compare, the first one is the reference")
+    parser.add_argument("--threads", type=int, default=None, help="Inference threads")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    language_config = {"code": args.language, "model": args.model}
+    audios = []
+    for path in args.files:
+        source = open_source(path)
+        audios.append((os.path.basename(path), preprocess_audio(source, source.sample_rate)))
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "threads": args.threads,
+        "model": args.model,
+        "backends": {},
+    }
+    for backend in args.backends:
+        print(f"\nRunning {backend}...")
+        try:
+            report["backends"][backend] = run_backend(backend, args.model, audios, language_config,
+                                                      args.threads, args.repeats)
+        except ImportError as e:
+            print(f"Skipping {backend}: {e}")
+
+    ran = list(report["backends"])
+    if not ran:
+        return
+    reference = report["backends"][ran[0]]["files"]
+    print(f"\n{'backend':>15} {'load s':>7} {'RTF':>7} {'WER vs ' + ran[0]:>22} {'peak RSS MB':>12}")
+    for backend in ran:
+        stats = report["backends"][backend]
+        files = stats["files"]
+        rtf = sum(f["seconds"] for f in files.values()) / sum(len(a) / TARGET_SAMPLE_RATE for _, a in audios)
+        ref_words = [w for name in files for w in words(reference[name]["text"])]
+        hyp_words = [w for name in files for w in words(files[name]["text"])]
+        stats["rtf"] = rtf
+        stats["wer"] = word_error_rate(ref_words, hyp_words)
+        print(f"{backend:>15} {stats['load_seconds']:>7.1f} {rtf:>7.3f} {stats['wer']:>22.1%} "
+              f"{stats['peak_rss_mb']:>12.0f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Benchmarks the recording -> transcription pipeline stage by stage on CPU.
+
+Runs offline against synthetic (or given) WAV files and a stub model, and
+reports latency, real-time factor and peak memory per stage.
+
+Usage:
+    python -m benchmarks.pipeline_benchmark --seconds 60 600
+    python -m benchmarks.pipeline_benchmark --save-baseline benchmarks/baseline.json
+    python -m benchmarks.pipeline_benchmark --baseline benchmarks/baseline.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from scipy.io import wavfile
+from audio_format import pcm_to_float32, normalize_peak
+from result_cache import ResultCache, cache_key
+from transcription import TARGET_SAMPLE_RATE, resample_audio, run_model
+from vad import detect_speech, merge_segments
+from benchmarks.stub_model import StubModel
+
+
+def make_fixture(path, seconds, sample_rate=44100, speech_ratio=0.5, seed=0):
+    """
+    Writes a synthetic int16 WAV with alternating "speech" and silence.
+
+    Speech is approximated by amplitude-modulated harmonics plus noise
+    bursts, silence by low-level noise.
+
+    Args:
+        path (str): Output path
+        seconds (float): Duration
+        sample_rate (int): Sample rate
+        speech_ratio (float): Fraction of the file that is speech
+        seed (int): Random seed
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    audio = rng.normal(0, 0.002, n).astype(np.float32)
+    block = int(2.0 * sample_rate)
+    t = np.arange(block, dtype=np.float32) / sample_rate
+    for start in range(0, n, block):
+        if rng.random() >= speech_ratio:
+            continue
+        f0 = rng.uniform(100, 220)
+        voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6)).astype(np.float32)
+        envelope = (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)).astype(np.float32)
+        piece = 0.2 * voiced * envelope + rng.normal(0, 0.02, block).astype(np.float32)
+        end = min(start + block, n)
+        audio[start:end] += piece[:end - start]
+    wavfile.write(path, sample_rate, (np.clip(audio, -1, 1) * 32767).astype(np.int16))
+
+
+def reset_peak_rss():
+    """Resets the kernel's peak-RSS counter for this process, if supported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 ** 2 if sys.platform == "darwin" else maxrss / 1024
+
+
+def measure(func, repeats):
+    """
+    Times a stage.
+
+    Returns:
+        dict: median and min latency, peak traced allocations and peak RSS
+    """
+    times = []
+    alloc_peak = 0
+    for _ in range(repeats):
+        reset_peak_rss()
+        tracemalloc.start()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+        alloc_peak = max(alloc_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {
+        "latency_s": statistics.median(times),
+        "latency_min_s": min(times),
+        "alloc_peak_mb": alloc_peak / 1024 ** 2,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_stages(path, repeats, model):
+    """
+    Benchmarks every stage on one fixture.
+
+    Each stage gets the output of the previous one as input, computed
+    outside the timed region.
+
+    Returns:
+        dict: stage name -> measurements
+    """
+    sample_rate, pcm = wavfile.read(path)
+    duration = len(pcm) / sample_rate
+    audio = pcm_to_float32(pcm)
+    resampled = resample_audio(audio, sample_rate)
+    normalized = normalize_peak(resampled)
+    segments = merge_segments(detect_speech(normalized, TARGET_SAMPLE_RATE))
+    language_config = {"code": "en", "model": "stub"}
+    cache_dir = tempfile.mkdtemp(prefix="bench_cache_")
+
+    try:
+        cache = ResultCache(cache_dir)
+        key = cache_key(normalized, "stub", "en")
+        result = model.transcribe(normalized[:TARGET_SAMPLE_RATE])
+        cache.put(key, result)
+
+        def cache_round_trip():
+            k = cache_key(normalized, "stub", "en")
+            cache.put(k, result)
+            cache.get(k)
+
+        def model_on_speech():
+            for s in segments:
+                run_model(normalized[s.start:s.end], language_config, model=model, cache=False)
+
+        stages = {
+            "file_read": lambda: wavfile.read(path),
+            "convert": lambda: pcm_to_float32(pcm),
+            "resample": lambda: resample_audio(audio, sample_rate),
+            "normalize": lambda: normalize_peak(resampled),
+            "vad": lambda: detect_speech(normalized, TARGET_SAMPLE_RATE),
+            "cache": cache_round_trip,
+            "cache_hit": lambda: cache.get(key),
+            "model": model_on_speech,
+            "model_no_vad": lambda: run_model(normalized, language_config, model=model, cache=False),
+        }
+        results = {}
+        for name, func in stages.items():
+            stats = measure(func, repeats)
+            stats["rtf"] = stats["latency_s"] / duration
+            results[name] = stats
+        return results, duration
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def compare(current, baseline, max_regression):
+    """
+    Diffs a run against a stored baseline.
+
+    Returns:
+        list: (fixture, stage, baseline latency, current latency, change) for
+            every stage that got slower by more than `max_regression`
+    """
+    regressions = []
+    print(f"\n{'fixture':>10} {'stage':>14} {'baseline s':>11} {'current s':>10} {'change':>8}")
+    for fixture, stages in current["fixtures"].items():
+        base_stages = baseline.get("fixtures", {}).get(fixture, {}).get("stages", {})
+        for stage, stats in stages["stages"].items():
+            base = base_stages.get(stage)
+            if not base or base["latency_s"] <= 0:
+                continue
+            change = stats["latency_s"] / base["latency_s"] - 1.0
+            flag = " !" if change > max_regression else ""
+            print(f"{fixture:>10} {stage:>14} {base['latency_s']:>11.4f} {stats['latency_s']:>10.4f} {change:>+8.0%}{flag}")
+            if change > max_regression:
+                regressions.append((fixture, stage, base["latency_s"], stats["latency_s"], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the transcription pipeline with a stub model.")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[30, 300], help="Synthetic fixture lengths")
+    parser.add_argument("--wav", nargs="*", default=[], help="Use these WAV files as well")
+    parser.add_argument("--rate", type=int, default=44100, help="Sample rate of synthetic fixtures")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--model-speed", type=float, default=0.05,
+                        help="Stub model cost in CPU seconds per audio second")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--save-baseline", help="Write results to this baseline file")
+    parser.add_argument("--baseline", help="Compare against this baseline file")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed slowdown per stage before the run fails")
+    args = parser.parse_args()
+
+    model = StubModel(seconds_per_audio_second=args.model_speed)
+    fixture_dir = tempfile.mkdtemp(prefix="bench_fixtures_")
+    fixtures = {}
+    try:
+        for seconds in args.seconds:
+            path = os.path.join(fixture_dir, f"synthetic_{seconds:g}s.wav")
+            make_fixture(path, seconds, args.rate)
+            fixtures[f"{seconds:g}s"] = path
+        for path in args.wav:
+            fixtures[os.path.basename(path)] = path
+
+        report = {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "fixtures": {},
+        }
+        for name, path in fixtures.items():
+            stages, duration = run_stages(path, args.repeats, model)
+            report["fixtures"][name] = {"duration_s": duration, "stages": stages}
+            print(f"\n{name} ({duration:.1f}s of audio)")
+            print(f"{'stage':>14} {'latency s':>10} {'RTF':>9} {'alloc MB':>9} {'peak RSS MB':>12}")
+            for stage, stats in stages.items():
+                print(f"{stage:>14} {stats['latency_s']:>10.4f} {stats['rtf']:>9.5f} "
+                      f"{stats['alloc_peak_mb']:>9.1f} {stats['peak_rss_mb']:>12.1f}")
+    finally:
+        shutil.rmtree(fixture_dir, ignore_errors=True)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\nResults written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed by more than {args.max_regression:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
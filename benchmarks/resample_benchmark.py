@@ -0,0 +1,63 @@
+"""
+Compares the FFT resampler with the streaming polyphase resampler.
+
+Usage:
+    python -m benchmarks.resample_benchmark --minutes 1 5 20
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from scipy import signal
+from resampler import resample_stream
+
+
+def fft_resample(audio_np, orig_sample_rate, target_sample_rate):
+    new_length = int(len(audio_np) * target_sample_rate / orig_sample_rate)
+    return signal.resample(audio_np, new_length)
+
+
+def measure(func, *args):
+    """
+    Runs a function once and measures it.
+
+    Returns:
+        tuple: (result, seconds, peak bytes allocated during the call)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--rate", type=int, default=44100, help="Input sample rate")
+    parser.add_argument("--target", type=int, default=16000, help="Output sample rate")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'minutes':>8} {'method':>10} {'seconds':>9} {'peak MB':>9} {'x realtime':>11}")
+    for minutes in args.minutes:
+        # Band-limited test signal, so both methods should agree
+        t = np.arange(int(minutes * 60 * args.rate), dtype=np.float32) / args.rate
+        audio = np.zeros_like(t)
+        for freq in rng.uniform(100, 6000, 5):
+            audio += np.float32(0.1) * np.sin(np.float32(2 * np.pi * freq) * t)
+        del t
+        results = {}
+        for name, func in (("fft", fft_resample), ("polyphase", resample_stream)):
+            out, elapsed, peak = measure(func, audio, args.rate, args.target)
+            results[name] = out
+            print(f"{minutes:>8g} {name:>10} {elapsed:>9.3f} {peak / 1024 ** 2:>9.1f} {minutes * 60 / elapsed:>11.0f}")
+        n = min(len(results["fft"]), len(results["polyphase"]))
+        diff = np.abs(results["fft"][:n] - results["polyphase"][:n])
+        print(f"{'':>8} {'max diff':>10} {diff[1000:n - 1000].max():>9.2e}")
+
+
+if __name__ == "__main__":
+    main()
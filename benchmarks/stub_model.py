@@ -0,0 +1,120 @@
+"""
+Stand-in for a Whisper model, for benchmarks and offline runs without torch.
+"""
+import time
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+_WORDS = ("the quick brown fox jumps over the lazy dog while we record "
+          "another sentence for the benchmark").split()
+
+
+class StubModel:
+    """
+    Mimics the `transcribe()` interface of a loaded Whisper model.
+
+    Decoding cost is simulated as `seconds_per_audio_second` of busy CPU
+    work per second of input, so real-time factors behave like a real model
+    of that speed. Output is deterministic and derived from the audio
+    length: one word per `seconds_per_word` of input, silence included.
+    """
+
+    def __init__(self, seconds_per_audio_second=0.05, seconds_per_word=0.4, load_seconds=0.0):
+        self.seconds_per_audio_second = seconds_per_audio_second
+        self.seconds_per_word = seconds_per_word
+        self.calls = 0
+        if load_seconds:
+            time.sleep(load_seconds)
+
+    def parameters(self):
+        return []
+
+    def _busy(self, seconds):
+        end = time.perf_counter() + seconds
+        x = np.ones(1024, dtype=np.float32)
+        while time.perf_counter() < end:
+            x = np.sqrt(x * x + 1.0)
+
+    def transcribe(self, audio, language=None, word_timestamps=False, **options):
+        """
+        Returns a Whisper-style result for the audio.
+
+        Args:
+            audio (numpy.ndarray): float32 audio at 16kHz
+            language (str, optional): Language code reported back
+            word_timestamps (bool): Include per-word timings
+
+        Returns:
+            dict: {"text", "segments", "language"}
+        """
+        self.calls += 1
+        duration = len(audio) / SAMPLE_RATE
+        self._busy(duration * self.seconds_per_audio_second)
+        return self._result(duration, language, word_timestamps)
+
+    def decode_batch(self, audios, language=None):
+        """
+        Batched counterpart used by batching.decode_batch().
+
+        Costs the same CPU time as decoding the clips one by one, so it
+        exercises the scheduler without pretending to speed anything up.
+
+        Returns:
+            list: One result per clip
+        """
+        self.calls += 1
+        durations = [len(a) / SAMPLE_RATE for a in audios]
+        self._busy(sum(durations) * self.seconds_per_audio_second)
+        return [self._result(d, language) for d in durations]
+
+    def decode_mel(self, windows, language=None):
+        """
+        Counterpart of features.decode_windows() for 30 second log-mel windows.
+
+        Frames above the padding floor count as audio.
+
+        Returns:
+            list: One result per window
+        """
+        self.calls += 1
+        durations = [float((w.max(axis=0) > w.min()).sum()) / 100 for w in windows]
+        self._busy(sum(durations) * self.seconds_per_audio_second)
+        return [self._result(d, language) for d in durations]
+
+    def _result(self, duration, language=None, word_timestamps=False):
+        segments = []
+        n_words = int(duration / self.seconds_per_word)
+        for seg_start in range(0, n_words, 12):
+            ids = range(seg_start, min(seg_start + 12, n_words))
+            words = [
+                {"word": " " + _WORDS[i % len(_WORDS)],
+                 "start": i * self.seconds_per_word,
+                 "end": (i + 1) * self.seconds_per_word,
+                 "probability": 0.9}
+                for i in ids
+            ]
+            segment = {
+                "id": len(segments),
+                "seek": 0,
+                "start": words[0]["start"],
+                "end": words[-1]["end"],
+                "text": "".join(w["word"] for w in words),
+                "tokens": list(ids),
+                "avg_logprob": -0.2,
+                "no_speech_prob": 0.01,
+            }
+            if word_timestamps:
+                segment["words"] = words
+            segments.append(segment)
+
+        return {
+            "text": "".join(s["text"] for s in segments),
+            "segments": segments,
+            "language": language or "en",
+        }
+
+
+def load_stub_model(name, device="cpu", dtype="float32", threads=None):
+    """Loader for ModelRegistry that returns a StubModel for any name."""
+    return StubModel()
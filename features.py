@@ -0,0 +1,383 @@
+import hashlib
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from utils import console
+from metrics import metrics
+from audio_format import pcm_to_float32
+
+# Whisper's front end: 25 ms windows every 10 ms on 16kHz audio, 30 s windows
+SAMPLE_RATE = 16000
+N_FFT = 400
+HOP_LENGTH = 160
+N_FRAMES = 3000
+
+# log10 of the power floor, what fully silent frames come out as
+LOG_FLOOR = -10.0
+
+FEATURES_DIR = "./cache/features"
+
+_filters = {}
+
+
+def _hz_to_mel(hz):
+    # Slaney scale: linear below 1 kHz, logarithmic above
+    hz = np.asarray(hz, dtype=np.float64)
+    mel = hz / (200.0 / 3)
+    log_region = hz >= 1000.0
+    return np.where(log_region, 15.0 + np.log(np.maximum(hz, 1e-10) / 1000.0) / (np.log(6.4) / 27.0), mel)
+
+
+def _mel_to_hz(mel):
+    mel = np.asarray(mel, dtype=np.float64)
+    hz = mel * (200.0 / 3)
+    log_region = mel >= 15.0
+    return np.where(log_region, 1000.0 * np.exp((np.log(6.4) / 27.0) * (mel - 15.0)), hz)
+
+
+def mel_filters(n_mels=80, sample_rate=SAMPLE_RATE, n_fft=N_FFT):
+    """
+    Returns the Slaney-normalized mel filterbank Whisper was trained with.
+
+    Matches librosa.filters.mel(sr, n_fft, n_mels) with its defaults.
+
+    Args:
+        n_mels (int): Number of mel bands, 80 or 128 for Whisper models
+        sample_rate (int): Audio sample rate
+        n_fft (int): FFT size
+
+    Returns:
+        numpy.ndarray: float32 matrix of shape (n_mels, n_fft // 2 + 1)
+    """
+    key = (n_mels, sample_rate, n_fft)
+    if key not in _filters:
+        fft_freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+        mel_points = _mel_to_hz(np.linspace(_hz_to_mel(0.0), _hz_to_mel(sample_rate / 2), n_mels + 2))
+        widths = np.diff(mel_points)
+        ramps = mel_points[:, None] - fft_freqs[None, :]
+        lower = -ramps[:-2] / widths[:-1, None]
+        upper = ramps[2:] / widths[1:, None]
+        weights = np.maximum(0.0, np.minimum(lower, upper))
+        weights *= (2.0 / (mel_points[2:] - mel_points[:-2]))[:, None]
+        _filters[key] = weights.astype(np.float32)
+    return _filters[key]
+
+
+class LogMelExtractor:
+    """
+    Computes Whisper's log-mel frames chunk by chunk.
+
+    Gives the same frames as whisper.log_mel_spectrogram() over the whole
+    signal (centered STFT with reflect padding, last frame dropped), before
+    its clamp and scaling, which prepare_windows() applies per 30 second
+    window. Only the samples of one unfinished frame are kept between calls.
+    """
+
+    def __init__(self, n_mels=80, gain=1.0, block_frames=4096):
+        self.n_mels = n_mels
+        self.gain = gain
+        self.block_frames = block_frames
+        self._filters_t = mel_filters(n_mels).T.copy()
+        self._window = np.hanning(N_FFT + 1)[:-1].astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        """Forgets all carried state so the next chunk starts a new signal."""
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._started = False
+        self._samples = 0
+        self._frames = 0
+
+    def _frames_of(self, buffer, n):
+        out = np.empty((n, self.n_mels), dtype=np.float32)
+        windows = sliding_window_view(buffer, N_FFT)[::HOP_LENGTH][:n]
+        for start in range(0, n, self.block_frames):
+            block = windows[start:start + self.block_frames] * self._window
+            spectrum = np.fft.rfft(block, axis=1)
+            power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+            np.log10(np.maximum(power @ self._filters_t, 1e-10), out=out[start:start + len(block)])
+        return out
+
+    def _emit(self, limit=None):
+        n = max(0, (len(self._buffer) - N_FFT) // HOP_LENGTH + 1)
+        if limit is not None:
+            n = min(n, limit)
+        if n == 0:
+            return np.zeros((0, self.n_mels), dtype=np.float32)
+        frames = self._frames_of(self._buffer, n)
+        self._buffer = self._buffer[n * HOP_LENGTH:]
+        self._frames += n
+        return frames
+
+    def process(self, chunk):
+        """
+        Feeds float32 audio at 16kHz.
+
+        Returns:
+            numpy.ndarray: The log-mel frames completed by this chunk,
+                shape (frames, n_mels)
+        """
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if self.gain != 1.0:
+            chunk = chunk * np.float32(self.gain)
+        self._samples += len(chunk)
+        self._buffer = np.concatenate([self._buffer, chunk])
+        if not self._started:
+            # The reflected start needs the first half window of samples
+            if len(self._buffer) <= N_FFT // 2:
+                return np.zeros((0, self.n_mels), dtype=np.float32)
+            self._buffer = np.concatenate([self._buffer[N_FFT // 2:0:-1], self._buffer])
+            self._started = True
+        return self._emit()
+
+    def flush(self):
+        """
+        Pads the end of the signal and returns the remaining frames.
+
+        Returns:
+            numpy.ndarray: The last log-mel frames, shape (frames, n_mels)
+        """
+        total = self._samples // HOP_LENGTH
+        if not self._started:
+            if self._samples == 0:
+                return np.zeros((0, self.n_mels), dtype=np.float32)
+            # Too short to reflect, pad like numpy does for tiny inputs
+            self._buffer = np.pad(self._buffer, (N_FFT // 2, 0), mode="reflect")
+            self._started = True
+        tail = self._buffer[-(N_FFT // 2 + 1):-1][::-1]
+        self._buffer = np.concatenate([self._buffer, tail])
+        frames = self._emit(limit=total - self._frames)
+        self.reset()
+        return frames
+
+
+def log_mel(audio_np, n_mels=80, gain=1.0, chunk_size=1 << 20):
+    """
+    Computes unscaled log-mel frames of a whole signal, chunk by chunk.
+
+    Args:
+        audio_np (numpy.ndarray): float32 audio at 16kHz, may be a memory map
+        n_mels (int): Number of mel bands
+        gain (float): Factor applied to the samples first
+
+    Returns:
+        numpy.ndarray: float32 frames of shape (len(audio) // 160, n_mels)
+    """
+    extractor = LogMelExtractor(n_mels, gain)
+    parts = [extractor.process(audio_np[i:i + chunk_size]) for i in range(0, len(audio_np), chunk_size)]
+    parts.append(extractor.flush())
+    return np.concatenate(parts)
+
+
+def prepare_windows(frames, start=0, count=None):
+    """
+    Cuts features into the model's 30 second input windows.
+
+    Applies Whisper's dynamic range clamp (8 decades below the loudest
+    frame) and scaling for every window on its own, and pads the last
+    window with silence.
+
+    Args:
+        frames (numpy.ndarray): Unscaled log-mel frames, (frames, n_mels)
+        start (int): First window
+        count (int, optional): Number of windows, defaults to all remaining
+
+    Returns:
+        numpy.ndarray: float32 model input of shape (windows, n_mels, 3000)
+    """
+    total = -(-len(frames) // N_FRAMES)
+    stop = total if count is None else min(total, start + count)
+    n_mels = frames.shape[1]
+    windows = np.full((max(0, stop - start), n_mels, N_FRAMES), LOG_FLOOR, dtype=np.float32)
+    for i, w in enumerate(range(start, stop)):
+        window = np.asarray(frames[w * N_FRAMES:(w + 1) * N_FRAMES]).T
+        windows[i, :, :window.shape[1]] = window
+        np.maximum(windows[i], windows[i].max() - 8.0, out=windows[i])
+    windows += 4.0
+    windows /= 4.0
+    return windows
+
+
+def features_path(source, n_mels=80, normalize=True, directory=FEATURES_DIR):
+    """
+    Returns where the features of a recording are kept.
+
+    Recordings inside ./cache get theirs right next to them, other files
+    get a name derived from their path in ./cache/features.
+
+    Args:
+        source (str): Path of the audio file
+        n_mels (int): Number of mel bands
+        normalize (bool): Whether the features are of the peak-normalized audio
+
+    Returns:
+        str: Path of the .npy file
+    """
+    # Normalized and raw features differ, each gets its own file
+    suffix = f".mel{n_mels}.npy" if normalize else f".mel{n_mels}.raw.npy"
+    source = os.path.abspath(source)
+    if os.path.dirname(source) == os.path.abspath("./cache"):
+        return f"{os.path.splitext(source)[0]}{suffix}"
+    digest = hashlib.blake2b(source.encode(), digest_size=8).hexdigest()
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(directory, f"{name}_{digest}{suffix}")
+
+
+def compute_file_features(source, path=None, n_mels=80, normalize=True, chunk_seconds=60):
+    """
+    Computes the features of an audio file into a memory-mapped .npy file.
+
+    The file is read, converted, resampled and turned into frames one chunk
+    at a time, so memory stays bounded for long recordings. Peak
+    normalization, done on the resampled audio like preprocess_audio(),
+    only shifts log-mel values, so it is applied to the frames at the end.
+
+    Args:
+        source (str): Path of the audio file
+        path (str, optional): Output path, defaults to features_path()
+        n_mels (int): Number of mel bands
+        normalize (bool): Scale the audio to use the full range first
+        chunk_seconds (float): Audio read per step
+
+    Returns:
+        numpy.memmap: The frames, (frames, n_mels)
+    """
+    from batch import load_audio_file
+    from resampler import StreamingResampler
+
+    path = path or features_path(source, n_mels, normalize)
+    audio, sample_rate = load_audio_file(source)
+    resampler = StreamingResampler(sample_rate, SAMPLE_RATE) if sample_rate != SAMPLE_RATE else None
+    n_samples = len(audio) if resampler is None else -(-len(audio) * resampler.up // resampler.down)
+    extractor = LogMelExtractor(n_mels)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp.npy"
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(n_samples // HOP_LENGTH, n_mels))
+    written = 0
+    peak = 0.0
+
+    def write(samples, frames):
+        nonlocal written, peak
+        peak = max(peak, float(np.max(np.abs(samples), initial=0.0)))
+        out[written:written + len(frames)] = frames
+        written += len(frames)
+
+    with metrics.timer("features_seconds"):
+        for _, window in audio.windows(chunk_seconds):
+            piece = pcm_to_float32(window)
+            if resampler is not None:
+                piece = resampler.process(piece)
+            write(piece, extractor.process(piece))
+        if resampler is not None:
+            piece = resampler.flush()
+            write(piece, extractor.process(piece))
+        write(np.zeros(0, dtype=np.float32), extractor.flush())
+
+        if normalize and peak > 0:
+            # Scaling the samples by g adds log10(g ** 2) to every unfloored frame
+            shift = np.float32(-2.0 * np.log10(peak))
+            block = max(1, (1 << 22) // n_mels)
+            for i in range(0, written, block):
+                frames = out[i:i + block]
+                np.maximum(frames + shift, LOG_FLOOR, out=frames, where=frames > LOG_FLOOR)
+    out.flush()
+    del out
+    os.replace(tmp, path)
+    return np.load(path, mmap_mode="r")
+
+
+def load_features(source, n_mels=80, normalize=True):
+    """
+    Returns the features of an audio file, computing them on first use.
+
+    Features are recomputed when the recording is newer than them.
+
+    Args:
+        source (str): Path of the audio file
+        n_mels (int): Number of mel bands
+        normalize (bool): Scale the audio to use the full range first
+
+    Returns:
+        numpy.memmap: The frames, (frames, n_mels)
+    """
+    path = features_path(source, n_mels, normalize)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source):
+        metrics.inc("feature_cache_hits_total")
+        return np.load(path, mmap_mode="r")
+    metrics.inc("feature_cache_misses_total")
+    console.print(f"[blue]Computing features for {os.path.basename(source)}")
+    return compute_file_features(source, path, n_mels, normalize)
+
+
+def model_n_mels(model):
+    """Returns the number of mel bands a model expects."""
+    dims = getattr(model, "dims", None)
+    return getattr(dims, "n_mels", 80)
+
+
+def decode_windows(model, windows, language=None):
+    """
+    Decodes prepared 30 second windows in one batched call.
+
+    Args:
+        model: Loaded Whisper model, or any object with its own decode_mel()
+        windows (numpy.ndarray): Output of prepare_windows()
+        language (str, optional): Language code, detected per window if None
+
+    Returns:
+        list: transcribe()-style results, one per window
+    """
+    if hasattr(model, "decode_mel"):
+        return model.decode_mel(windows, language=language)
+
+    import torch
+    import whisper
+    from batching import decoding_language, result_from_decoding
+
+    options = whisper.DecodingOptions(language=decoding_language(model, language), fp16=False,
+                                      without_timestamps=True)
+    with torch.no_grad():
+        decodings = model.decode(torch.from_numpy(windows).to(model.device), options)
+    return [result_from_decoding(d, N_FRAMES * HOP_LENGTH) for d in decodings]
+
+
+def transcribe_features(frames, language_config, model=None, registry=None, batch_size=4):
+    """
+    Transcribes precomputed features, skipping the audio front end.
+
+    Windows are decoded back to back without Whisper's seek logic, so a
+    word cut by a window edge may be split or lost.
+
+    Args:
+        frames (numpy.ndarray): Unscaled log-mel frames, may be a memory map
+        language_config (dict): Configuration with language code and model
+        model: Already loaded Whisper model to use instead of the registry
+        registry (ModelRegistry, optional): Registry to fetch the model from
+        batch_size (int): Windows decoded per forward pass
+
+    Returns:
+        dict: Result with "text" and "segments"
+    """
+    from transcription import decode_options, get_model
+
+    stt = get_model(language_config, model, registry)
+    language = decode_options(language_config).get("language")
+    total = -(-len(frames) // N_FRAMES)
+    duration = len(frames) * HOP_LENGTH / SAMPLE_RATE
+
+    texts, segments = [], []
+    with metrics.timer("decode_seconds", model=language_config["model"], stage="features"):
+        for start in range(0, total, batch_size):
+            results = decode_windows(stt, prepare_windows(frames, start, batch_size), language)
+            for i, result in enumerate(results):
+                offset = (start + i) * N_FRAMES * HOP_LENGTH / SAMPLE_RATE
+                texts.append(result["text"].strip())
+                for segment in result["segments"]:
+                    segments.append({
+                        **segment,
+                        "id": len(segments),
+                        "start": segment["start"] + offset,
+                        "end": min(segment["end"] + offset, duration),
+                    })
+    return {"text": " ".join(t for t in texts if t), "segments": segments}
@@ -0,0 +1,185 @@
+import threading
+import numpy as np
+from utils import console
+from metrics import metrics
+from vad import detect_speech
+
+# Whisper's input rate, audio passed here is already resampled
+SAMPLE_RATE = 16000
+
+# Language code that asks for detection instead of a fixed language
+AUTO = "auto"
+
+LANGUAGE_NAMES = {"en": "English", "de": "German"}
+
+
+def language_probs(model, audio_np):
+    """
+    Returns the model's language probabilities for a clip.
+
+    Models (or wrappers around them) can provide their own
+    `language_probs(audio)`; Whisper models are asked through
+    `detect_language()` on the clip's first 30 seconds. Anything else is
+    transcribed and the reported language counts as certain.
+
+    Args:
+        model: Loaded model
+        audio_np (numpy.ndarray): float32 audio at 16kHz
+
+    Returns:
+        dict: Language code to probability, empty if nothing was detected
+    """
+    if hasattr(model, "language_probs"):
+        return model.language_probs(audio_np)
+    if hasattr(model, "detect_language") and hasattr(model, "dims"):
+        if not model.is_multilingual:
+            return {"en": 1.0}
+        import whisper
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio_np), n_mels=model.dims.n_mels)
+        _, probs = model.detect_language(mel.to(model.device))
+        return probs
+    language = model.transcribe(audio_np, fp16=False).get("language")
+    return {language: 1.0} if language else {}
+
+
+class _SourceLanguage:
+    __slots__ = ("code", "confidence", "settled", "probe", "probe_samples", "checked_samples", "lock")
+
+    def __init__(self):
+        # Serializes the calls for one source, detection runs under it
+        self.lock = threading.Lock()
+        self.code = None
+        self.confidence = 0.0
+        self.settled = False
+        self.probe = []
+        self.probe_samples = 0
+        self.checked_samples = 0
+
+
+class LanguageIdentifier:
+    """
+    Detects the spoken language once per source and remembers it.
+
+    Speech of a source is collected until `probe_seconds` are available,
+    then the language is detected on it. A detection with at least
+    `min_confidence` is kept for the rest of the session. Below that the
+    best guess is used while more speech is collected, and detection runs
+    again every `probe_seconds` of new speech until it is confident or
+    `max_probe_seconds` (one Whisper window) have been heard.
+
+    Until a source has a language, resolve() leaves the language to the
+    model, which then detects it on every call as before. Callers with
+    many short-lived sources, like files, should forget() each one when
+    it is done.
+
+    Args:
+        probe_seconds (float): Speech needed before the first detection, and between re-checks
+        max_probe_seconds (float): Speech after which the best guess is kept
+        min_confidence (float): Probability at which a detection is kept
+    """
+
+    def __init__(self, probe_seconds=3.0, max_probe_seconds=30.0, min_confidence=0.8):
+        self.probe_samples = int(probe_seconds * SAMPLE_RATE)
+        self.max_probe_samples = int(max_probe_seconds * SAMPLE_RATE)
+        self.min_confidence = min_confidence
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def language(self, source):
+        """
+        Returns the language detected for a source so far.
+
+        Args:
+            source: Source key, e.g. a speaker label or file path
+
+        Returns:
+            str: Language code, or None if the source has none yet
+        """
+        state = self._sources.get(source)
+        return state.code if state else None
+
+    def forget(self, source):
+        """Drops the language of a source, the next speech is detected again."""
+        with self._lock:
+            self._sources.pop(source, None)
+
+    def resolve(self, language_config, audio_np, model, source):
+        """
+        Returns the language config to decode a source's audio with.
+
+        Args:
+            language_config (dict): Configuration with language code and model
+            audio_np (numpy.ndarray): New float32 audio of the source at 16kHz
+            model: Loaded model used for detection
+            source: Source key, e.g. a speaker label or file path
+
+        Returns:
+            dict: The config with the source's language as code, or the
+            config unchanged while the language is still unknown
+        """
+        if language_config.get("code") != AUTO:
+            return language_config
+        with self._lock:
+            state = self._sources.setdefault(source, _SourceLanguage())
+        # Only this source waits for its detection, other sources go on
+        with state.lock:
+            if not state.settled:
+                self._collect(state, audio_np)
+                if state.probe_samples - state.checked_samples >= self.probe_samples:
+                    self._detect(state, model, source)
+            code = state.code
+        if code is None:
+            return language_config
+        return {**language_config, "code": code}
+
+    def _collect(self, state, audio_np):
+        room = self.max_probe_samples - state.probe_samples
+        if room <= 0 or not len(audio_np):
+            return
+        # Silence and noise say nothing about the language, keep only speech
+        for segment in detect_speech(audio_np, SAMPLE_RATE):
+            # A copy, a view would keep the caller's whole recording alive
+            speech = audio_np[segment.start:segment.end][:room].copy()
+            state.probe.append(speech)
+            state.probe_samples += len(speech)
+            room -= len(speech)
+            if room <= 0:
+                break
+
+    def _detect(self, state, model, source):
+        probe = np.concatenate(state.probe)
+        state.checked_samples = len(probe)
+        with metrics.timer("language_detection_seconds"):
+            probs = language_probs(model, probe)
+        metrics.inc("language_detections_total")
+        if not probs:
+            return
+        code, confidence = max(probs.items(), key=lambda item: item[1])
+        state.code, state.confidence = code, confidence
+        state.settled = confidence >= self.min_confidence or state.probe_samples >= self.max_probe_samples
+        seconds = len(probe) / SAMPLE_RATE
+        name = LANGUAGE_NAMES.get(code, code)
+        label = f" for {source}" if source is not None else ""
+        if state.settled:
+            state.probe = []
+            console.print(f"[green]Detected language{label}: {name} ({confidence:.0%} after {seconds:.0f}s of speech)")
+        else:
+            console.print(f"[yellow]Language{label} probably {name} ({confidence:.0%}), checking again")
+
+
+_default_identifier = None
+_default_lock = threading.Lock()
+
+
+def get_language_identifier():
+    """
+    Returns the process-wide language identifier, creating it on first use.
+
+    Returns:
+        LanguageIdentifier: The shared identifier
+    """
+    global _default_identifier
+    with _default_lock:
+        if _default_identifier is None:
+            _default_identifier = LanguageIdentifier()
+        return _default_identifier
@@ -0,0 +1,303 @@
+import re
+import threading
+from queue import Empty
+import numpy as np
+from utils import console
+from metrics import metrics
+from transcription import TARGET_SAMPLE_RATE, TranscriptSegment, decode_options, get_model
+from resampler import StreamingResampler
+from audio_format import pcm_to_float32
+from warmup import wait_for_warmup
+from language_id import get_language_identifier
+from vad import detect_speech
+from pipeline import BoundedQueue
+
+# Audio judged by VAD at once, shorter client frames are collected first
+VAD_BLOCK_SAMPLES = TARGET_SAMPLE_RATE // 2
+
+
+def _normalize_word(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def extract_words(result, offset=0.0):
+    """
+    Flattens a Whisper result into timed words.
+
+    Uses the word timestamps when the model produced them and otherwise
+    spreads each segment's words evenly over the segment.
+
+    Args:
+        result (dict): Result of the model's transcribe()
+        offset (float): Seconds added to every timestamp
+
+    Returns:
+        list: (word, start, end) tuples
+    """
+    words = []
+    for segment in result.get("segments", []):
+        if segment.get("words"):
+            for w in segment["words"]:
+                words.append((w["word"], w["start"] + offset, w["end"] + offset))
+            continue
+        tokens = segment.get("text", "").split()
+        if not tokens:
+            continue
+        step = (segment["end"] - segment["start"]) / len(tokens)
+        for i, token in enumerate(tokens):
+            start = segment["start"] + i * step + offset
+            words.append((" " + token, start, start + step))
+    return words
+
+
+def agreed_prefix(previous, current):
+    """
+    Returns how many leading words two consecutive hypotheses agree on.
+
+    Args:
+        previous (list): (word, start, end) tuples of the last window
+        current (list): (word, start, end) tuples of the current window
+
+    Returns:
+        int: Length of the common prefix
+    """
+    n = 0
+    for a, b in zip(previous, current):
+        if _normalize_word(a[0]) != _normalize_word(b[0]):
+            break
+        n += 1
+    return n
+
+
+class LiveTranscriber:
+    """
+    Transcribes the recording stream while it is still being captured.
+
+    A preprocessing thread reads ('audio_chunk', ...) items from the data
+    queue, resamples them and runs VAD on each chunk. Once silence has
+    lasted `max_silence_seconds`, further silent chunks are replaced by
+    ('gap', seconds) items. Everything goes to `decode_queue`, a
+    BoundedQueue that the decoding thread empties, so a slow model never
+    holds up capture and its backlog stays bounded.
+
+    The decoding thread repeatedly decodes a sliding window over the
+    uncommitted audio and commits the words that two consecutive windows
+    agree on. Committed audio is dropped from the window, so after
+    recording stops only the last window still has to be decoded. Every
+    batch of committed words is also passed to `on_segment` as a
+    TranscriptSegment with word timings. A ('gap', seconds) item, for
+    skipped silence or audio dropped by a queue, settles the window and
+    moves the timeline past the missing audio.
+
+    With the "auto" language and a `source`, the language is detected once
+    on the source's first speech and fixed for every later window.
+    """
+
+    def __init__(self, data_queue, language_config, model=None, registry=None,
+                 window_seconds=20.0, step_seconds=2.0, on_partial=None, on_commit=None, on_segment=None,
+                 source=None, max_silence_seconds=2.0, decode_queue=None):
+        self.data_queue = data_queue
+        self.language_config = language_config
+        self.model = model
+        self.registry = registry
+        self.window_seconds = window_seconds
+        self.step_seconds = step_seconds
+        self.on_partial = on_partial or self._print_partial
+        self.on_commit = on_commit or self._print_commit
+        self.on_segment = on_segment
+        self.source = source
+        self.max_silence_samples = int(max_silence_seconds * TARGET_SAMPLE_RATE)
+        self.file_path = None
+        self.committed = []
+        self._resampler = None
+        self._silence = 0
+        self._unchecked = []
+        # Resampled audio waiting for the model
+        self.decode_queue = decode_queue if decode_queue is not None else BoundedQueue("decode:live")
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._offset = 0.0
+        self._pending = 0
+        self._gap = 0.0
+        self._hypothesis = []
+        self._threads = []
+
+    @property
+    def text(self):
+        """Returns the committed text so far."""
+        return "".join(w[0] for w in self.committed).strip()
+
+    def start(self):
+        """Starts the preprocessing and decoding threads."""
+        self._threads = [threading.Thread(target=self._preprocess, daemon=True),
+                         threading.Thread(target=self._run, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def join(self):
+        """
+        Waits for the stream to end and returns the final text.
+
+        Returns:
+            str: The full transcription
+        """
+        for thread in self._threads:
+            thread.join()
+        return self.text
+
+    def _print_partial(self, text):
+        console.print(f"[bright_black]... {text}")
+
+    def _print_commit(self, text):
+        console.print(f"[green]> [white]{text}")
+
+    def _preprocess(self):
+        while True:
+            item = self.data_queue.get()
+            if not isinstance(item, tuple):
+                continue
+            if item[0] == 'sample_rate':
+                self._resampler = None
+                if item[1] != TARGET_SAMPLE_RATE:
+                    self._resampler = StreamingResampler(item[1], TARGET_SAMPLE_RATE)
+            elif item[0] == 'audio_chunk':
+                chunk = pcm_to_float32(item[1])
+                if self._resampler:
+                    chunk = self._resampler.process(chunk)
+                self._forward(chunk)
+            elif item[0] == 'stream_end':
+                if self._resampler:
+                    self._forward(self._resampler.flush())
+                self._forward(np.zeros(0, dtype=np.float32), final=True)
+                self.decode_queue.put(item)
+                return
+            else:
+                # Keeps the audio before a gap in front of it
+                self._forward(np.zeros(0, dtype=np.float32), final=True)
+                self.decode_queue.put(item)
+
+    def _forward(self, chunk, final=False):
+        if len(chunk):
+            self._unchecked.append(chunk)
+        unchecked = sum(len(c) for c in self._unchecked)
+        if not unchecked or (unchecked < VAD_BLOCK_SAMPLES and not final):
+            return
+        chunk = np.concatenate(self._unchecked) if len(self._unchecked) > 1 else self._unchecked[0]
+        self._unchecked = []
+        if detect_speech(chunk, TARGET_SAMPLE_RATE):
+            self._silence = 0
+        else:
+            self._silence += len(chunk)
+            if self._silence > self.max_silence_samples:
+                # Nothing to decode, only the timeline moves on
+                self.decode_queue.put(('gap', len(chunk) / TARGET_SAMPLE_RATE))
+                return
+        self.decode_queue.put(('audio_chunk', chunk))
+
+    def _run(self):
+        wait_for_warmup(self.language_config["model"])
+        stt = get_model(self.language_config, self.model, self.registry)
+        finished = False
+        while not finished:
+            item = self.decode_queue.get()
+            while True:
+                finished = self._handle(item) or finished
+                if finished or self._gap:
+                    break
+                try:
+                    item = self.decode_queue.get_nowait()
+                except Empty:
+                    break
+            if self._gap:
+                self._skip_gap(stt)
+            if finished:
+                break
+            if self._pending >= self.step_seconds * TARGET_SAMPLE_RATE:
+                self._decode(stt)
+        self._decode(stt, final=True)
+
+    def _handle(self, item):
+        if item[0] == 'audio_chunk':
+            self._append(item[1])
+        elif item[0] == 'file_path':
+            self.file_path = item[1]
+        elif item[0] == 'gap':
+            self._gap += item[1]
+        elif item[0] == 'stream_end':
+            return True
+        return False
+
+    def _skip_gap(self, stt):
+        # Audio was skipped or dropped: settle the window before the gap and
+        # continue after it, so the word timings stay in recording time
+        self._decode(stt, final=True)
+        self._offset += len(self._buffer) / TARGET_SAMPLE_RATE + self._gap
+        self._buffer = self._buffer[:0]
+        self._hypothesis = []
+        self._gap = 0.0
+
+    def _append(self, chunk):
+        self._buffer = np.concatenate([self._buffer, chunk])
+        self._pending += len(chunk)
+
+    def _decode(self, stt, final=False):
+        pending, self._pending = self._pending, 0
+        if len(self._buffer) < TARGET_SAMPLE_RATE // 10:
+            if final:
+                self._commit(self._hypothesis)
+            return
+
+        committed_end = self.committed[-1][2] if self.committed else 0.0
+        prompt = "".join(w[0] for w in self.committed[-30:]).strip() or None
+        language_config = self.language_config
+        if self.source is not None:
+            # Only the new audio, the window overlaps what was already seen
+            language_config = get_language_identifier().resolve(
+                language_config, self._buffer[len(self._buffer) - pending:], stt, self.source)
+        options = decode_options(language_config)
+        with metrics.timer("decode_seconds", model=self.language_config["model"], stage="live"):
+            result = stt.transcribe(
+                self._buffer,
+                word_timestamps=True,
+                condition_on_previous_text=False,
+                initial_prompt=prompt,
+                **options
+            )
+        metrics.set_gauge("live_window_seconds", len(self._buffer) / TARGET_SAMPLE_RATE)
+        words = [w for w in extract_words(result, self._offset) if w[1] >= committed_end - 0.05]
+
+        if final:
+            self._commit(words)
+            return
+
+        n = agreed_prefix(self._hypothesis, words)
+        self._commit(words[:n])
+        self._hypothesis = words[n:]
+        if self._hypothesis:
+            self.on_partial("".join(w[0] for w in self._hypothesis).strip())
+        self._trim()
+
+    def _commit(self, words):
+        if not words:
+            return
+        self.committed.extend(words)
+        text = "".join(w[0] for w in words).strip()
+        self.on_commit(text)
+        if self.on_segment and text:
+            self.on_segment(TranscriptSegment(words[0][1], words[-1][2], text, words=tuple(words)))
+
+    def _trim(self):
+        duration = len(self._buffer) / TARGET_SAMPLE_RATE
+        committed_end = self.committed[-1][2] if self.committed else self._offset
+        if committed_end > self._offset + 1.0:
+            cut = committed_end
+        elif duration > self.window_seconds:
+            # Nothing agreed on within a full window, keep the best guess
+            cut = self._offset + duration - self.window_seconds / 2
+            self._commit([w for w in self._hypothesis if w[2] <= cut])
+            self._hypothesis = [w for w in self._hypothesis if w[2] > cut]
+        else:
+            return
+        samples = int((cut - self._offset) * TARGET_SAMPLE_RATE)
+        self._buffer = self._buffer[samples:]
+        self._offset += samples / TARGET_SAMPLE_RATE
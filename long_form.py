@@ -0,0 +1,291 @@
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from utils import console
+from vad import SpeechSegment, detect_speech, merge_segments, frame_features
+from live_transcription import _normalize_word
+
+_worker_model = None
+
+
+def _split_long(segment, energy_db, frame_len, max_samples, overlap_samples, search_samples):
+    """
+    Splits a segment that is longer than the model window.
+
+    Each cut is placed at the quietest frame near the end of the window, and
+    consecutive pieces overlap a little so no word is lost at the cut.
+    """
+    pieces = []
+    start = segment.start
+    while segment.end - start > max_samples:
+        window_end = start + max_samples
+        first_frame = (window_end - search_samples) // frame_len
+        last_frame = window_end // frame_len
+        if last_frame > first_frame:
+            cut = (first_frame + int(np.argmin(energy_db[first_frame:last_frame]))) * frame_len
+        else:
+            cut = window_end
+        cut = max(cut, start + max_samples // 2)
+        pieces.append(SpeechSegment(start, cut, segment.sample_rate))
+        start = max(cut - overlap_samples, start + 1)
+    pieces.append(SpeechSegment(start, segment.end, segment.sample_rate))
+    return pieces
+
+
+def plan_segments(audio_np, sample_rate, max_seconds=30.0, overlap_seconds=1.0, frame_ms=30):
+    """
+    Splits a recording into bounded segments at speech boundaries.
+
+    Silence between segments is skipped. Speech that runs longer than
+    `max_seconds` is cut at its quietest point near the limit, with
+    `overlap_seconds` of overlap between the pieces.
+
+    Args:
+        audio_np (numpy.ndarray): The recording, may be a memory map
+        sample_rate (int): The sample rate of the audio data
+        max_seconds (float): Longest segment handed to a worker
+        overlap_seconds (float): Overlap between pieces of a forced split
+        frame_ms (int): VAD frame length
+
+    Returns:
+        list: SpeechSegment entries in order
+    """
+    segments = merge_segments(detect_speech(audio_np, sample_rate, frame_ms=frame_ms), max_duration=max_seconds)
+    if not any(s.duration > max_seconds for s in segments):
+        return segments
+
+    energy_db, _ = frame_features(audio_np, sample_rate, frame_ms)
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    planned = []
+    for segment in segments:
+        if segment.duration <= max_seconds:
+            planned.append(segment)
+            continue
+        planned.extend(_split_long(
+            segment, energy_db, frame_len,
+            max_samples=int(max_seconds * sample_rate),
+            overlap_samples=int(overlap_seconds * sample_rate),
+            search_samples=int(min(5.0, max_seconds / 4) * sample_rate),
+        ))
+    return planned
+
+
+def stitch_texts(pieces, max_overlap_words=20):
+    """
+    Joins segment texts in order, dropping words repeated across overlaps.
+
+    Args:
+        pieces (list): (text, overlaps_previous) tuples in order
+        max_overlap_words (int): Longest repeated run that is looked for
+
+    Returns:
+        str: The joined text
+    """
+    out = []
+    for text, overlaps_previous in pieces:
+        words = text.split()
+        if overlaps_previous and out and words:
+            tail = [_normalize_word(w) for w in out[-max_overlap_words:]]
+            head = [_normalize_word(w) for w in words[:max_overlap_words]]
+            for k in range(min(len(tail), len(head)), 0, -1):
+                if tail[-k:] == head[:k]:
+                    words = words[k:]
+                    break
+        out.extend(words)
+    return " ".join(out)
+
+
+def _init_worker(model_name, threads, backend):
+    global _worker_model
+    from model_registry import ModelRegistry
+
+    _worker_model = ModelRegistry(max_models=1, backend=backend, threads=threads).get(model_name)
+
+
+def _decode_segment(audio_np, sample_rate, language_config, source=None):
+    from transcription import transcribe
+
+    return transcribe(audio_np, sample_rate, language_config, model=_worker_model, source=source)
+
+
+def transcribe_long(audio_np, sample_rate, language_config, workers=None, threads=None,
+                    max_seconds=30.0, overlap_seconds=1.0, batch_size=1, batch_wait=0.05, backend=None, source=None,
+                    registry=None):
+    """
+    Transcribes a long recording by decoding bounded segments in parallel.
+
+    Every worker process holds its own model instance and uses `threads`
+    inference threads. Workers are spawned, not forked, so they do not
+    inherit the torch thread pools of this process. Segments are sliced and
+    sent to the workers lazily, so only a few segments are in flight at once. With a memory-mapped input
+    peak memory depends on the segment size, not the recording length.
+
+    With `batch_size` above 1 the segments are instead decoded in this
+    process by one model behind a BatchScheduler, `batch_size` segments per
+    forward pass.
+
+    Args:
+        audio_np (numpy.ndarray): The recording, may be a memory map or an
+            AudioSource
+        sample_rate (int): The sample rate of the audio data
+        language_config (dict): Configuration with language code and model
+        workers (int): Worker processes, defaults to a quarter of the CPUs
+        threads (int): Inference threads per worker, defaults to an even share
+        max_seconds (float): Longest segment handed to a worker
+        overlap_seconds (float): Overlap between pieces of a forced split
+        batch_size (int): Segments decoded per batched forward pass
+        batch_wait (float): Longest a segment waits for its batch to fill
+        backend (str, optional): Inference backend, defaults to the shared registry's
+        source (optional): Source key for language detection, e.g. the file
+            path. With the "auto" language every process detects it once
+            instead of once per segment
+        registry (ModelRegistry, optional): Registry the batched path takes
+            its model from, defaults to the shared one. Worker processes
+            always load their own
+
+    Returns:
+        str: The transcribed text
+    """
+    if batch_size > 1:
+        return _transcribe_long_batched(audio_np, sample_rate, language_config, batch_size,
+                                        batch_wait, max_seconds, overlap_seconds, backend, source, registry)
+
+    from model_registry import get_registry
+
+    backend = backend or (registry or get_registry()).backend
+
+    cpus = os.cpu_count() or 1
+    workers = workers or max(1, cpus // 4)
+    threads = threads or max(1, cpus // workers)
+
+    segments = plan_segments(audio_np, sample_rate, max_seconds, overlap_seconds)
+    if not segments:
+        return ""
+    console.print(f"[blue]Long-form: {len(segments)} segment(s) on {workers} worker(s) x {threads} thread(s)")
+
+    texts = []
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker,
+                             initargs=(language_config["model"], threads, backend)) as pool:
+        previous_end = None
+        for segment in segments:
+            overlaps = previous_end is not None and segment.start < previous_end
+            previous_end = segment.end
+            while len(pending) >= workers * 2:
+                future, flag = pending.popleft()
+                texts.append((future.result(), flag))
+            chunk = np.asarray(audio_np[segment.start:segment.end])
+            pending.append((pool.submit(_decode_segment, chunk, sample_rate, language_config, source), overlaps))
+        while pending:
+            future, flag = pending.popleft()
+            texts.append((future.result(), flag))
+
+    return stitch_texts(texts)
+
+
+def _decode_in_batches(audio_np, segments, decode, batch_size):
+    """
+    Decodes segments on `batch_size` threads, so a BatchScheduler can fill its batches.
+
+    Segments are sliced lazily, at most two batches are in flight at once.
+
+    Args:
+        audio_np (numpy.ndarray): The recording, may be a memory map or an AudioSource
+        segments (list): SpeechSegment entries in order
+        decode (callable): decode(samples, segment), called on a worker thread
+        batch_size (int): Worker threads
+
+    Returns:
+        list: The results of decode() in segment order
+    """
+    results = []
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=batch_size) as pool:
+        for segment in segments:
+            while len(pending) >= batch_size * 2:
+                results.append(pending.popleft().result())
+            chunk = np.asarray(audio_np[segment.start:segment.end])
+            pending.append(pool.submit(decode, chunk, segment))
+        while pending:
+            results.append(pending.popleft().result())
+    return results
+
+
+def _transcribe_long_batched(audio_np, sample_rate, language_config, batch_size, batch_wait,
+                             max_seconds, overlap_seconds, backend=None, source=None, registry=None):
+    from batching import BatchScheduler
+    from model_registry import get_registry
+    from transcription import transcribe
+
+    segments = plan_segments(audio_np, sample_rate, max_seconds, overlap_seconds)
+    if not segments:
+        return ""
+    console.print(f"[blue]Long-form: {len(segments)} segment(s) in batches of {batch_size}")
+
+    model_name = language_config["model"]
+    scheduler = BatchScheduler((registry or get_registry()).get(model_name, backend=backend), batch_size,
+                               batch_wait, name=model_name)
+    try:
+        texts = _decode_in_batches(
+            audio_np, segments,
+            lambda chunk, segment: transcribe(chunk, sample_rate, language_config, model=scheduler, source=source),
+            batch_size)
+    finally:
+        scheduler.close()
+
+    overlaps = [i > 0 and segment.start < segments[i - 1].end for i, segment in enumerate(segments)]
+    return stitch_texts(list(zip(texts, overlaps)))
+
+
+def transcribe_long_segments(audio_np, sample_rate, language_config, model=None, registry=None, batch_size=8,
+                             batch_wait=0.05, max_seconds=30.0, offset=0.0, speaker=None, source=None):
+    """
+    Transcribes a long recording in this process and keeps the segment timings.
+
+    The recording is split like in transcribe_long(), but without overlap
+    between the pieces of a forced split, so the segments need no
+    stitching. They are decoded by the already loaded model behind a
+    BatchScheduler, `batch_size` per forward pass, so no model is loaded
+    again.
+
+    Args:
+        audio_np (numpy.ndarray): The recording, may be a memory map or an
+            AudioSource
+        sample_rate (int): The sample rate of the audio data
+        language_config (dict): Configuration with language code and model
+        model: Loaded model, defaults to the registry's
+        registry (ModelRegistry, optional): Registry to fetch the model from
+        batch_size (int): Segments decoded per batched forward pass
+        batch_wait (float): Longest a segment waits for its batch to fill
+        max_seconds (float): Longest segment
+        offset (float): Seconds added to every timestamp, e.g. where the
+            audio starts in the recording
+        speaker (str, optional): Label for every segment
+        source (optional): Source key for language detection, see run_model()
+
+    Returns:
+        list: TranscriptSegment entries in order
+    """
+    from batching import BatchScheduler
+    from transcription import get_model, transcribe_detailed
+
+    segments = plan_segments(audio_np, sample_rate, max_seconds, overlap_seconds=0.0)
+    if not segments:
+        return []
+    console.print(f"[blue]Long-form: {len(segments)} segment(s) in batches of {batch_size}")
+
+    model_name = language_config["model"]
+    scheduler = BatchScheduler(get_model(language_config, model, registry), batch_size, batch_wait, name=model_name)
+    try:
+        decoded = _decode_in_batches(
+            audio_np, segments,
+            lambda chunk, segment: transcribe_detailed(chunk, sample_rate, language_config, scheduler,
+                                                       offset=offset + segment.start_time, speaker=speaker,
+                                                       source=source),
+            batch_size)
+    finally:
+        scheduler.close()
+    return [piece for pieces in decoded for piece in pieces]
@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+import time
+
+# Upper bounds for histogram buckets, in the unit of the observed value
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _NullTimer:
+    """Timer handed out while metrics are off, does nothing."""
+    elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, name, labels):
+        self._metrics = metrics
+        self._name = name
+        self._labels = labels
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        self._metrics.observe(self._name, self.elapsed, **self._labels)
+        return False
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _label_text(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Metrics:
+    """
+    Timers, counters, gauges and histograms for the pipeline stages.
+
+    While disabled every call returns immediately, so the instrumentation
+    can stay in the hot path. Values can be exported as JSON lines or in
+    the Prometheus text format.
+    """
+
+    def __init__(self, enabled=False, prefix="transcribe_"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def timer(self, name, **labels):
+        """
+        Returns a context manager that records its duration in seconds.
+
+        Args:
+            name (str): Histogram name, e.g. 'resample_seconds'
+            **labels: Label values
+
+        Returns:
+            Timer with an `elapsed` attribute after it exits
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def inc(self, name, value=1, **labels):
+        """Adds to a counter."""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        """Sets a gauge to the current value."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        """Records a value in a histogram."""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        """Drops all recorded values."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """
+        Returns the current values.
+
+        Returns:
+            dict: counters, gauges and histograms keyed by name and labels
+        """
+        def flat(key):
+            name, labels = key
+            return self.prefix + name + _label_text(labels)
+
+        with self._lock:
+            return {
+                "time": time.time(),
+                "counters": {flat(k): v for k, v in self._counters.items()},
+                "gauges": {flat(k): v for k, v in self._gauges.items()},
+                "histograms": {
+                    flat(k): {"count": h.count, "sum": h.sum, "mean": h.sum / h.count if h.count else 0.0}
+                    for k, h in self._histograms.items()
+                },
+            }
+
+    def write_jsonl(self, path):
+        """Appends one snapshot as a JSON line."""
+        with open(path, "a") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+
+    def prometheus_text(self):
+        """
+        Renders all values in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text
+        """
+        lines = []
+        with self._lock:
+            for kind, values in (("counter", self._counters), ("gauge", self._gauges)):
+                typed = set()
+                for (name, labels), value in sorted(values.items()):
+                    full = self.prefix + name
+                    if full not in typed:
+                        lines.append(f"# TYPE {full} {kind}")
+                        typed.add(full)
+                    lines.append(f"{full}{_label_text(labels)} {value}")
+            typed = set()
+            for (name, labels), h in sorted(self._histograms.items(), key=lambda item: item[0]):
+                full = self.prefix + name
+                if full not in typed:
+                    lines.append(f"# TYPE {full} histogram")
+                    typed.add(full)
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f"{full}_bucket{_label_text(labels, ('le', bound))} {cumulative}")
+                lines.append(f"{full}_bucket{_label_text(labels, ('le', '+Inf'))} {h.count}")
+                lines.append(f"{full}_sum{_label_text(labels)} {h.sum}")
+                lines.append(f"{full}_count{_label_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes the Prometheus text file, replacing it atomically."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def export(self):
+        """
+        Writes metrics.jsonl and metrics.prom to the configured directory.
+
+        Does nothing unless TRANSCRIBE_METRICS_DIR is set.
+        """
+        directory = os.environ.get("TRANSCRIBE_METRICS_DIR")
+        if not self.enabled or not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self.write_jsonl(os.path.join(directory, "metrics.jsonl"))
+        self.write_prometheus(os.path.join(directory, "metrics.prom"))
+
+
+# Switched on by pointing TRANSCRIBE_METRICS_DIR at an output directory
+metrics = Metrics(enabled=bool(os.environ.get("TRANSCRIBE_METRICS_DIR")))
@@ -0,0 +1,157 @@
+import threading
+from collections import OrderedDict
+from utils import console
+from metrics import metrics
+from backends import DEFAULT_BACKEND, get_loader
+
+# Rough fp32 footprint of the openai-whisper checkpoints, used when a loaded
+# model cannot report its own parameter size.
+MODEL_SIZE_ESTIMATES = {
+    "tiny": 150 * 1024 ** 2,
+    "tiny.en": 150 * 1024 ** 2,
+    "base": 290 * 1024 ** 2,
+    "base.en": 290 * 1024 ** 2,
+    "small": 970 * 1024 ** 2,
+    "small.en": 970 * 1024 ** 2,
+    "medium": 3 * 1024 ** 3,
+    "medium.en": 3 * 1024 ** 3,
+    "large": 6 * 1024 ** 3,
+}
+
+
+def estimate_model_bytes(model, name=None):
+    """
+    Estimates the memory used by a loaded model.
+
+    Args:
+        model: The loaded model
+        name (str, optional): Model name, used for the fallback estimate
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    try:
+        return sum(p.numel() * p.element_size() for p in model.parameters())
+    except Exception:
+        return MODEL_SIZE_ESTIMATES.get(name, 0)
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models keyed by (name, device, dtype, backend).
+
+    Models are kept warm until either more than `max_models` are loaded or
+    their combined size exceeds `memory_budget` bytes, at which point the
+    least recently used ones are evicted.
+
+    `loader` loads models for the registry's own `backend`; other backends
+    requested through get() use their loaders from backends.BACKENDS.
+    """
+
+    def __init__(self, max_models=2, memory_budget=None, loader=None, backend=None, threads=None):
+        self.max_models = max_models
+        self.memory_budget = memory_budget
+        self.backend = backend or DEFAULT_BACKEND
+        self.threads = threads
+        self.loader = loader or get_loader(self.backend, threads)
+        self._models = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+        self._loading = {}
+
+    def get(self, name, device="cpu", dtype="float32", backend=None):
+        """
+        Returns a loaded model, loading it on first use.
+
+        Args:
+            name (str): Model name
+            device (str): Torch device
+            dtype (str): Model weight dtype
+            backend (str, optional): Inference backend, defaults to the registry's
+
+        Returns:
+            The loaded model
+        """
+        backend = backend or self.backend
+        key = (name, device, dtype, backend)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            # Only one thread loads a given model, the others wait for it
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key]
+
+            loader = self.loader if backend == self.backend else get_loader(backend, self.threads)
+            console.print(f"[yellow]Loading model '{name}' ({backend}, {device}, {dtype})...")
+            with metrics.timer("model_load_seconds", model=name, backend=backend):
+                model = loader(name, device=device, dtype=dtype)
+            size = estimate_model_bytes(model, name)
+
+            with self._lock:
+                self._models[key] = model
+                self._sizes[key] = size
+                self._loading.pop(key, None)
+                self._evict(keep=key)
+                metrics.set_gauge("loaded_models", len(self._models))
+            console.print(f"[green]Model '{name}' loaded ({size / 1024 ** 2:.0f} MB)")
+            return model
+
+    def _evict(self, keep=None):
+        while len(self._models) > 1:
+            over_count = self.max_models is not None and len(self._models) > self.max_models
+            over_budget = self.memory_budget is not None and self.total_bytes() > self.memory_budget
+            if not (over_count or over_budget):
+                break
+            key = next(iter(self._models))
+            if key == keep:
+                break
+            self._models.pop(key)
+            self._sizes.pop(key, None)
+            console.print(f"[blue]Evicted model '{key[0]}' ({key[3]}, {key[1]}, {key[2]}) from registry")
+
+    def total_bytes(self):
+        """Returns the combined estimated size of all loaded models."""
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def loaded(self):
+        """Returns the keys of the loaded models, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+    def evict(self, name, device="cpu", dtype="float32", backend=None):
+        """Drops a model from the registry."""
+        key = (name, device, dtype, backend or self.backend)
+        with self._lock:
+            self._models.pop(key, None)
+            self._sizes.pop(key, None)
+
+    def clear(self):
+        """Drops all loaded models."""
+        with self._lock:
+            self._models.clear()
+            self._sizes.clear()
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Returns the process-wide model registry, creating it on first use.
+
+    Returns:
+        ModelRegistry: The shared registry
+    """
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = ModelRegistry()
+        return _default_registry
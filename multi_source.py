@@ -0,0 +1,122 @@
+from utils import console
+from metrics import metrics
+from model_registry import get_registry
+from batching import BatchScheduler
+from warmup import SpeculativeTranscriber
+from pipeline import BoundedQueue
+
+# Neighbouring segments of one speaker closer than this are shown as one turn
+TURN_GAP_SECONDS = 1.5
+
+
+def merge_transcripts(segments, turn_gap=TURN_GAP_SECONDS):
+    """
+    Interleaves the segments of several speakers into turns.
+
+    Args:
+        segments (list): TranscriptSegment entries of all sources
+        turn_gap (float): Longest pause within one turn
+
+    Returns:
+        list: (start, end, speaker, text) turns in time order
+    """
+    turns = []
+    for segment in sorted(segments, key=lambda s: (s.start, s.end)):
+        if turns and turns[-1][2] == segment.speaker and segment.start - turns[-1][1] <= turn_gap:
+            start, _, speaker, text = turns[-1]
+            turns[-1] = (start, max(segment.end, turns[-1][1]), speaker, f"{text} {segment.text}")
+        else:
+            turns.append((segment.start, segment.end, segment.speaker, segment.text))
+    return turns
+
+
+def format_transcript(turns):
+    """
+    Renders merged turns as "[mm:ss] Speaker: text" lines.
+
+    Args:
+        turns (list): Output of merge_transcripts()
+
+    Returns:
+        str: The labelled transcript
+    """
+    lines = []
+    for start, _, speaker, text in turns:
+        minutes, seconds = divmod(int(start), 60)
+        lines.append(f"[{minutes:02d}:{seconds:02d}] {speaker}: {text}")
+    return "\n".join(lines)
+
+
+class MultiSourceTranscriber:
+    """
+    Transcribes several time-aligned sources of one recording, one lane per source.
+
+    Every lane is a SpeculativeTranscriber on the source's queue with its
+    own VAD, so silent sources cost a VAD pass and nothing else. The lanes
+    share one model behind a BatchScheduler: speech from different sources
+    that is ready at the same time is decoded in a single forward pass, and
+    the model is never used by two lanes at once.
+
+    Args:
+        labels (list): Speaker label of every source, e.g. ["You", "Remote"]
+        language_config (dict): Configuration with language code and model
+        registry (ModelRegistry, optional): Registry to fetch the model from
+        batch_wait (float): Longest a segment waits for other lanes' segments
+        on_segment (callable, optional): Called with every decoded segment,
+            from the lane threads
+        model: Shared model for the lanes instead of a batched registry
+            model, e.g. an AdaptiveModel
+    """
+
+    def __init__(self, labels, language_config, registry=None, batch_wait=0.05, on_segment=None, model=None):
+        self.language_config = language_config
+        self.registry = registry or get_registry()
+        self.model = model
+        self.queues = {label: BoundedQueue(f"capture:{label}") for label in labels}
+        self._scheduler = None
+        self._batch_wait = batch_wait
+        self.on_segment = on_segment
+        self.lanes = {}
+
+    def start(self):
+        """Loads the model and starts one lane per source."""
+        model = self.model
+        if model is None:
+            model_name = self.language_config["model"]
+            self._scheduler = model = BatchScheduler(self.registry.get(model_name), max_batch_size=len(self.queues),
+                                                     max_wait=self._batch_wait, name=model_name)
+        for label, data_queue in self.queues.items():
+            self.lanes[label] = SpeculativeTranscriber(data_queue, self.language_config, model=model,
+                                                       registry=self.registry, speaker=label,
+                                                       on_segment=self.on_segment).start()
+        return self
+
+    @property
+    def file_paths(self):
+        """Returns the recordings of the sources that captured any audio."""
+        return [lane.file_path for lane in self.lanes.values() if lane.file_path]
+
+    @property
+    def segments(self):
+        """Returns the decoded segments of all lanes, in time order."""
+        segments = [s for lane in self.lanes.values() for s in lane.segments]
+        return sorted(segments, key=lambda s: (s.start, s.end))
+
+    def join(self):
+        """
+        Waits for every lane to finish its stream.
+
+        Returns:
+            str: The merged, speaker-labelled transcript
+        """
+        for lane in self.lanes.values():
+            lane.join()
+        if self._scheduler:
+            self._scheduler.close()
+            self._scheduler = None
+        for label, lane in self.lanes.items():
+            metrics.inc("multi_source_segments_total", len(lane.segments), speaker=label)
+        turns = merge_transcripts(self.segments)
+        if turns:
+            console.print(f"[blue]Merged {len(turns)} turn(s) from {len(self.lanes)} source(s)")
+        return format_transcript(turns)
@@ -0,0 +1,268 @@
+import os
+import tempfile
+import threading
+import weakref
+from collections import deque
+from queue import Empty, Full
+import numpy as np
+from utils import console
+from metrics import metrics
+
+# What a full queue does with the next audio item
+POLICIES = ("block", "drop_oldest", "drop_newest", "spill")
+
+# Defaults for the queues between the stages of a recording
+DEFAULT_POLICY = os.environ.get("TRANSCRIBE_QUEUE_POLICY", "spill")
+DEFAULT_MAX_SECONDS = float(os.environ.get("TRANSCRIBE_QUEUE_SECONDS", "120"))
+SPILL_DIR = "./cache/spill"
+
+# Item kinds that carry samples at index 1, everything else is a control item
+AUDIO_KINDS = ("audio_chunk", "speech")
+
+_queues = weakref.WeakSet()
+
+
+class _Spilled:
+    """Placeholder for samples written to the spill file."""
+    __slots__ = ("offset", "dtype", "length")
+
+    def __init__(self, offset, dtype, length):
+        self.offset = offset
+        self.dtype = dtype
+        self.length = length
+
+
+class BoundedQueue:
+    """
+    A FIFO between two pipeline stages that holds at most `max_seconds` of audio.
+
+    Drop-in for the queue.Queue used by the capture and transcription
+    threads. Items are the tuples of the queue protocol: ('audio_chunk',
+    samples) and ('speech', samples, ...) hold audio and count against the
+    bound, control items like ('sample_rate', 16000) or ('stream_end',
+    None) are tiny and always accepted. Once the queue is full the
+    `policy` decides what happens to the next audio item:
+
+    - block: put() waits until the consumer made room
+    - drop_oldest: the oldest audio item is discarded
+    - drop_newest: the new audio item is discarded
+    - spill: the samples go to a temporary file in `spill_dir` and are
+      read back in order once the consumer catches up
+
+    Dropped audio leaves a ('gap', seconds) item in its place, so the
+    consumer can keep its timestamps right. Occupancy is reported as
+    metrics labelled with `name`.
+
+    Args:
+        name (str): Stage name for metrics and messages
+        max_seconds (float): Audio held in memory
+        policy (str): One of POLICIES
+        sample_rate (int): Sample rate of the audio items, updated by
+            ('sample_rate', ...) items passing through
+        spill_dir (str): Directory for the spill file
+    """
+
+    def __init__(self, name, max_seconds=DEFAULT_MAX_SECONDS, policy=DEFAULT_POLICY, sample_rate=16000,
+                 spill_dir=SPILL_DIR):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}', use one of {', '.join(POLICIES)}")
+        self.name = name
+        self.max_seconds = max_seconds
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.spill_dir = spill_dir
+        self.dropped_seconds = 0.0
+        self._items = deque()
+        self._samples = 0
+        self._spilled = deque()
+        self._spilled_samples = 0
+        self._spill_file = None
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._behind = False
+        _queues.add(self)
+
+    @property
+    def seconds(self):
+        """Returns the seconds of audio waiting, in memory and spilled."""
+        return (self._samples + self._spilled_samples) / self.sample_rate
+
+    def qsize(self):
+        return len(self._items) + len(self._spilled)
+
+    def empty(self):
+        return not self.qsize()
+
+    def occupancy(self):
+        """
+        Returns the current fill level.
+
+        Returns:
+            dict: name, policy, items, seconds in memory and spilled, fill
+            ratio of the memory bound and seconds dropped so far
+        """
+        with self._lock:
+            return self._occupancy()
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Adds an item, applying the policy when the audio bound is reached.
+
+        Raises:
+            queue.Full: With the block policy, if no room was made in time
+        """
+        with self._lock:
+            if item[0] == "sample_rate":
+                self.sample_rate = item[1]
+            samples = self._length(item)
+            if samples and self._full(samples):
+                if self.policy == "block":
+                    if not self._not_full.wait_for(lambda: not self._full(samples), timeout if block else 0):
+                        raise Full
+                elif self.policy == "drop_newest":
+                    self._drop(samples)
+                    self._append(("gap", samples / self.sample_rate))
+                    self._report()
+                    return
+                elif self.policy == "drop_oldest":
+                    while self._samples and self._full(samples):
+                        self._drop_oldest()
+            if self._spilled or (samples and self.policy == "spill" and self._full(samples)):
+                self._spill(item, samples)
+            else:
+                self._append(item)
+                self._samples += samples
+            self._not_empty.notify()
+            self._report()
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def get(self, block=True, timeout=None):
+        """
+        Removes and returns the oldest item.
+
+        Raises:
+            queue.Empty: If no item arrived in time
+        """
+        with self._lock:
+            if not self._not_empty.wait_for(lambda: self._items or self._spilled,
+                                            timeout if block else 0):
+                raise Empty
+            if not self._items:
+                self._unspill()
+            item = self._items.popleft()
+            self._samples -= self._length(item)
+            # Refill memory from the spill file in order
+            while self._spilled and not self._full(self._spilled_length(self._spilled[0])):
+                self._unspill()
+            self._not_full.notify_all()
+            self._report()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def _length(self, item):
+        if item[0] in AUDIO_KINDS:
+            return len(item[1])
+        return 0
+
+    def _spilled_length(self, item):
+        return item[1].length if item[0] in AUDIO_KINDS else 0
+
+    def _full(self, samples):
+        return self._samples + samples > self.max_seconds * self.sample_rate and self._samples > 0
+
+    def _append(self, item):
+        # Consecutive gaps are merged, so dropping never grows the queue
+        if item[0] == "gap" and self._items and self._items[-1][0] == "gap":
+            self._items[-1] = ("gap", self._items[-1][1] + item[1])
+        else:
+            self._items.append(item)
+
+    def _drop(self, samples):
+        seconds = samples / self.sample_rate
+        self.dropped_seconds += seconds
+        metrics.inc("pipeline_dropped_seconds_total", seconds, stage=self.name, policy=self.policy)
+        if not self._behind:
+            self._behind = True
+            console.print(f"[yellow]{self.name} queue is full, dropping audio ({self.policy})")
+
+    def _drop_oldest(self):
+        for i, item in enumerate(self._items):
+            samples = self._length(item)
+            if samples:
+                del self._items[i]
+                self._samples -= samples
+                self._drop(samples)
+                gap = ("gap", samples / self.sample_rate)
+                if i and self._items[i - 1][0] == "gap":
+                    self._items[i - 1] = ("gap", self._items[i - 1][1] + gap[1])
+                else:
+                    self._items.insert(i, gap)
+                return
+
+    def _spill(self, item, samples):
+        if not samples:
+            self._spilled.append(item)
+            return
+        if self._spill_file is None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._spill_file = tempfile.TemporaryFile(dir=self.spill_dir, prefix=f"{self.name}_", suffix=".pcm")
+            console.print(f"[yellow]{self.name} queue is full, spilling audio to disk")
+        data = np.ascontiguousarray(item[1])
+        self._spill_file.seek(0, os.SEEK_END)
+        offset = self._spill_file.tell()
+        self._spill_file.write(data.tobytes())
+        self._spilled.append((item[0], _Spilled(offset, data.dtype, len(data))) + tuple(item[2:]))
+        self._spilled_samples += samples
+        metrics.inc("pipeline_spilled_seconds_total", samples / self.sample_rate, stage=self.name)
+
+    def _unspill(self):
+        item = self._spilled.popleft()
+        if item[0] in AUDIO_KINDS:
+            spilled = item[1]
+            self._spill_file.seek(spilled.offset)
+            data = np.frombuffer(self._spill_file.read(spilled.length * spilled.dtype.itemsize), dtype=spilled.dtype)
+            item = (item[0], data) + tuple(item[2:])
+            self._spilled_samples -= spilled.length
+            self._samples += spilled.length
+        self._items.append(item)
+        if not self._spilled and self._spill_file is not None:
+            # Caught up, the file is deleted on close
+            self._spill_file.close()
+            self._spill_file = None
+            console.print(f"[green]{self.name} queue caught up with the spilled audio")
+
+    def _occupancy(self):
+        limit = self.max_seconds * self.sample_rate
+        return {
+            "name": self.name,
+            "policy": self.policy,
+            "items": len(self._items) + len(self._spilled),
+            "seconds": round(self._samples / self.sample_rate, 2),
+            "spilled_seconds": round(self._spilled_samples / self.sample_rate, 2),
+            "fill": round(self._samples / limit, 3) if limit else 0.0,
+            "dropped_seconds": round(self.dropped_seconds, 2),
+        }
+
+    def _report(self):
+        if not self._spilled and self._samples * 2 < self.max_seconds * self.sample_rate:
+            self._behind = False
+        if not metrics.enabled:
+            return
+        metrics.set_gauge("pipeline_queue_items", len(self._items) + len(self._spilled), stage=self.name)
+        metrics.set_gauge("pipeline_queue_seconds", self._samples / self.sample_rate, stage=self.name)
+        metrics.set_gauge("pipeline_spilled_seconds", self._spilled_samples / self.sample_rate, stage=self.name)
+
+
+def pipeline_occupancy():
+    """
+    Returns the fill level of every live pipeline queue.
+
+    Returns:
+        list: BoundedQueue.occupancy() of each queue
+    """
+    return [q.occupancy() for q in list(_queues)]
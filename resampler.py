@@ -0,0 +1,152 @@
+from math import gcd
+import numpy as np
+
+
+def design_filter(up, down, half_width=10, beta=5.0):
+    """
+    Designs the low-pass filter used by scipy.signal.resample_poly.
+
+    Args:
+        up (int): Upsampling factor
+        down (int): Downsampling factor
+        half_width (int): Filter half-length in units of max(up, down)
+        beta (float): Kaiser window shape parameter
+
+    Returns:
+        numpy.ndarray: Filter taps, scaled by `up`
+    """
+    from scipy import signal
+
+    max_rate = max(up, down)
+    half_len = half_width * max_rate
+    taps = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', beta))
+    return taps * up
+
+
+class StreamingResampler:
+    """
+    Rational polyphase resampler that works chunk by chunk.
+
+    Produces the same output as scipy.signal.resample_poly over the whole
+    signal, but only keeps the last few input samples between calls, so
+    time and memory grow linearly with the chunk size instead of with the
+    recording length.
+    """
+
+    def __init__(self, orig_sample_rate, target_sample_rate, dtype=np.float32, half_width=10):
+        divisor = gcd(int(orig_sample_rate), int(target_sample_rate))
+        self.up = int(target_sample_rate) // divisor
+        self.down = int(orig_sample_rate) // divisor
+        self.dtype = dtype
+        if self.up == self.down:
+            # Same rate: chunks pass through, firwin cannot design a cutoff of 1.0
+            self.delay = self.phase_len = 0
+            self._taps = None
+            self.reset()
+            return
+
+        # scipy.signal takes about a second to import, only pay for it when resampling
+        from scipy.signal import upfirdn
+
+        self._upfirdn = upfirdn
+        taps = design_filter(self.up, self.down, half_width)
+        self.delay = (len(taps) - 1) // 2
+        # Input samples that contribute to a single output sample
+        self.phase_len = -(-len(taps) // self.up)
+        self._taps = taps.astype(dtype)
+        self._inv_up = pow(self.up, -1, self.down) if self.down > 1 else 0
+
+        self.reset()
+
+    def reset(self):
+        """Forgets all carried state so the next chunk starts a new signal."""
+        self._history = np.zeros(self.phase_len, dtype=self.dtype)
+        self._consumed = 0
+        self._produced = 0
+
+    def _output_until(self, available):
+        # Output n needs input up to index (n * down + delay) // up
+        return max(self._produced, (available * self.up - self.delay + self.down - 1) // self.down)
+
+    def _run(self, chunk, n_outputs):
+        buffer = np.concatenate([self._history, chunk])
+        buffer_start = self._consumed - len(self._history)
+
+        # Pad the front so that the outputs we need fall on upfirdn's
+        # decimation grid. The padding only feeds outputs that are skipped.
+        pad = ((buffer_start * self.up - self.delay) * self._inv_up) % self.down
+        grid_start = self._produced * self.down + self.delay - (buffer_start - pad) * self.up
+        first = grid_start // self.down
+        if pad:
+            buffer_padded = np.concatenate([np.zeros(pad, dtype=self.dtype), buffer])
+        else:
+            buffer_padded = buffer
+        out = self._upfirdn(self._taps, buffer_padded, self.up, self.down)[first:first + n_outputs]
+
+        self._consumed += len(chunk)
+        self._produced += n_outputs
+        self._history = buffer[-self.phase_len:]
+        return out.astype(self.dtype, copy=False)
+
+    def process(self, chunk):
+        """
+        Resamples the next chunk of the signal.
+
+        Args:
+            chunk (numpy.ndarray): Next mono samples, int16 or float
+
+        Returns:
+            numpy.ndarray: The output samples that are now fully determined
+        """
+        if self.up == self.down:
+            return np.asarray(chunk, dtype=self.dtype)
+        chunk = np.asarray(chunk, dtype=self.dtype)
+        available = self._consumed + len(chunk)
+        return self._run(chunk, self._output_until(available) - self._produced)
+
+    def flush(self):
+        """
+        Returns the remaining output at the end of the signal.
+
+        Returns:
+            numpy.ndarray: The last output samples
+        """
+        if self.up == self.down:
+            return np.zeros(0, dtype=self.dtype)
+        total = -(-self._consumed * self.up // self.down)
+        remaining = total - self._produced
+        if remaining <= 0:
+            return np.zeros(0, dtype=self.dtype)
+        # Enough trailing zeros to determine every remaining output
+        tail = np.zeros(self.delay // self.up + self.phase_len + 1, dtype=self.dtype)
+        consumed = self._consumed
+        out = self._run(tail, remaining)
+        self._consumed = consumed
+        return out
+
+
+def resample_stream(audio_np, orig_sample_rate, target_sample_rate, chunk_size=1 << 18, dtype=np.float32):
+    """
+    Resamples a whole signal through the streaming resampler.
+
+    Args:
+        audio_np (numpy.ndarray): Mono audio
+        orig_sample_rate (int): The sample rate of the audio data
+        target_sample_rate (int): The sample rate to convert to
+        chunk_size (int): Input samples processed per step
+        dtype: Output dtype
+
+    Returns:
+        numpy.ndarray: The resampled audio
+    """
+    resampler = StreamingResampler(orig_sample_rate, target_sample_rate, dtype=dtype)
+    total = -(-len(audio_np) * resampler.up // resampler.down)
+    out = np.empty(total, dtype=dtype)
+    written = 0
+    for first in range(0, len(audio_np), chunk_size):
+        block = resampler.process(audio_np[first:first + chunk_size])
+        out[written:written + len(block)] = block
+        written += len(block)
+    block = resampler.flush()
+    out[written:written + len(block)] = block
+    return out[:written + len(block)]
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from utils import console
+
+# Segment fields worth keeping, the rest (tokens, probabilities) is bulky
+SEGMENT_FIELDS = ("id", "start", "end", "text", "words")
+
+
+def cache_key(audio_np, model_name, language=None, options=None):
+    """
+    Builds the cache key for one transcription.
+
+    Args:
+        audio_np (numpy.ndarray): The exact audio handed to the model
+        model_name (str): Model name
+        language (str, optional): Language code
+        options (dict, optional): Decode options
+
+    Returns:
+        str: Hex digest identifying the audio and decode settings
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps(
+        {"model": model_name, "language": language, "options": options or {},
+         "dtype": str(audio_np.dtype), "samples": len(audio_np)},
+        sort_keys=True, default=str
+    ).encode())
+    digest.update(memoryview(audio_np.reshape(-1)).cast("B") if audio_np.flags.c_contiguous else audio_np.tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk transcription cache keyed by audio content and decode settings.
+
+    Each entry is a small JSON file with the text and segments. Reads touch
+    the file, and once the directory grows beyond `max_bytes` the least
+    recently used entries are deleted.
+    """
+
+    def __init__(self, directory="./cache/results", max_bytes=64 * 1024 ** 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # key -> [size, last use], loaded once instead of listing the directory per call
+        self._index = {}
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                self._index[entry.name[:-5]] = [stat.st_size, stat.st_mtime]
+        self._total = sum(size for size, _ in self._index.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """
+        Returns a cached result.
+
+        Args:
+            key (str): Key from cache_key()
+
+        Returns:
+            dict: {"text": ..., "segments": [...]} or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            if key in self._index:
+                self._index[key][1] = now
+        return result
+
+    def put(self, key, result):
+        """
+        Stores a result and evicts old entries if the cache is too big.
+
+        Args:
+            key (str): Key from cache_key()
+            result (dict): Model result with "text" and optional "segments"
+        """
+        entry = {
+            "text": result.get("text", ""),
+            "segments": [
+                {k: segment[k] for k in SEGMENT_FIELDS if k in segment}
+                for segment in result.get("segments", [])
+            ],
+            "language": result.get("language"),
+        }
+        data = json.dumps(entry, default=float)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            old = self._index.get(key)
+            if old:
+                self._total -= old[0]
+            self._index[key] = [len(data), time.time()]
+            self._total += len(data)
+            self._evict()
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            del self._index[key]
+            self._total -= size
+
+    def total_bytes(self):
+        """Returns the size of all cached entries."""
+        with self._lock:
+            return self._total
+
+    def __len__(self):
+        with self._lock:
+            return len(self._index)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_result_cache():
+    """
+    Returns the shared result cache under ./cache, creating it on first use.
+
+    Returns:
+        ResultCache: The shared cache
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = ResultCache()
+            except OSError as e:
+                console.print(f"[red]Result cache unavailable: {e}")
+                return None
+        return _default_cache
@@ -0,0 +1,437 @@
+"""
+Local transcription daemon with an HTTP and WebSocket API.
+
+Usage:
+    python service.py --port 8765 --preload base.en
+    curl --data-binary @recording.wav -H "Content-Type: audio/wav" \
+        "http://127.0.0.1:8765/v1/transcriptions?language=en&wait=1"
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from aiohttp import web, WSMsgType
+from utils import console
+from model_registry import ModelRegistry, get_registry
+from backends import BACKENDS
+from transcription import DEFAULT_MODELS, transcribe
+from archive import get_archive
+from batching import BatchScheduler
+from language_id import get_language_identifier
+from pipeline import DEFAULT_POLICY, BoundedQueue, pipeline_occupancy
+from audio_source import _mix_down
+
+# Finished jobs kept around for GET /v1/transcriptions/{id}
+MAX_FINISHED_JOBS = 1000
+
+
+class Job:
+    """A queued transcription request."""
+
+    def __init__(self, audio, sample_rate, language_config, priority=10, save=True):
+        self.id = uuid.uuid4().hex
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.duration = len(audio) / sample_rate
+        self.language_config = language_config
+        self.priority = priority
+        self.save = save
+        self.status = "queued"
+        self.text = None
+        self.error = None
+        self.transcript_id = None
+        self.created = time.time()
+        self.finished = None
+        self.done = asyncio.Event()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "model": self.language_config["model"],
+            "language": self.language_config["code"],
+            "duration": self.duration,
+            "text": self.text,
+            "error": self.error,
+            "transcript_id": self.transcript_id,
+        }
+
+
+class TranscriptionService:
+    """
+    Bounded priority job queue in front of the shared model registry.
+
+    Jobs with a lower priority number run first. When the queue is full,
+    submissions are refused instead of piling up, and queued jobs can be
+    cancelled before a worker picks them up. Jobs running at the same time
+    on the same model are decoded together by a BatchScheduler.
+    """
+
+    def __init__(self, registry=None, workers=1, queue_size=16, batch_size=1, batch_wait=0.05):
+        self.registry = registry or get_registry()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.queue = asyncio.PriorityQueue(maxsize=queue_size)
+        self.jobs = OrderedDict()
+        self._seq = itertools.count()
+        self._executor = ThreadPoolExecutor(max_workers=workers + 2, thread_name_prefix="transcribe")
+        self._schedulers = {}
+        self._schedulers_lock = threading.Lock()
+        self._tasks = []
+
+    def model(self, name):
+        """
+        Returns the batch scheduler in front of the shared model for a name.
+
+        With a batch size of 1 the scheduler only serializes access and every
+        clip goes through the model's full transcribe().
+        """
+        model = self.registry.get(name)
+        stale = None
+        with self._schedulers_lock:
+            scheduler = self._schedulers.get(name)
+            if scheduler is None or scheduler.model is not model:
+                # First use, or the registry reloaded the model after evicting it
+                stale = scheduler
+                scheduler = BatchScheduler(model, self.batch_size, self.batch_wait, name=name)
+                self._schedulers[name] = scheduler
+        if stale is not None:
+            # Serves its queued clips first; jobs still holding it fall back to direct decoding
+            stale.close()
+        return scheduler
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for scheduler in self._schedulers.values():
+            scheduler.close()
+
+    def submit(self, job):
+        """
+        Queues a job.
+
+        Raises:
+            asyncio.QueueFull: If the queue is at capacity
+        """
+        self.queue.put_nowait((job.priority, next(self._seq), job))
+        self.jobs[job.id] = job
+        self._trim_jobs()
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job. Running jobs finish but their result is dropped.
+
+        Returns:
+            Job: The job, or None if unknown
+        """
+        job = self.jobs.get(job_id)
+        if job and job.status in ("queued", "running"):
+            job.status = "cancelled"
+            job.audio = None
+            job.finished = time.time()
+            job.done.set()
+        return job
+
+    def _trim_jobs(self):
+        finished = [j for j in self.jobs.values() if j.finished]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
+
+    def _run(self, job):
+        model = self.model(job.language_config["model"])
+        text = transcribe(job.audio, job.sample_rate, job.language_config, model=model)
+        transcript_id = None
+        if job.save and text:
+            transcript_id = get_archive().add_transcript(
+                text, language=job.language_config["code"], model=job.language_config["model"])
+        return text, transcript_id
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job = await self.queue.get()
+            try:
+                if job.status == "cancelled":
+                    continue
+                job.status = "running"
+                try:
+                    text, transcript_id = await loop.run_in_executor(self._executor, self._run, job)
+                except Exception as e:
+                    if job.status != "cancelled":
+                        job.status = "failed"
+                        job.error = str(e)
+                else:
+                    if job.status != "cancelled":
+                        job.status = "done"
+                        job.text = text
+                        job.transcript_id = transcript_id
+                job.audio = None
+                job.finished = job.finished or time.time()
+                job.done.set()
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "workers": self.workers,
+            "models": [key[0] for key in self.registry.loaded()],
+            "backend": self.registry.backend,
+            "pipeline": pipeline_occupancy(),
+        }
+
+
+def language_config_from(query):
+    """Builds a language config from request parameters."""
+    code = query.get("language", "en")
+    if code not in DEFAULT_MODELS:
+        raise web.HTTPBadRequest(text=f"Unsupported language '{code}'")
+    return {"code": code, "model": query.get("model") or DEFAULT_MODELS[code]}
+
+
+def parse_sample_rate(value):
+    """
+    Parses a client-supplied sample rate.
+
+    Raises:
+        web.HTTPBadRequest: If it is not a positive integer
+    """
+    try:
+        sample_rate = int(value)
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(text="sample_rate must be an integer")
+    if sample_rate <= 0:
+        raise web.HTTPBadRequest(text="sample_rate must be positive")
+    return sample_rate
+
+
+def decode_upload(body, content_type, query):
+    """
+    Turns an uploaded body into samples.
+
+    WAV uploads carry their own format. Anything else is read as raw
+    16-bit little-endian mono PCM at the `sample_rate` query parameter.
+
+    Returns:
+        tuple: (samples, sample_rate)
+    """
+    if content_type in ("audio/wav", "audio/x-wav", "audio/wave") or body[:4] == b"RIFF":
+        from scipy.io import wavfile
+        try:
+            sample_rate, audio = wavfile.read(io.BytesIO(body))
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=f"Invalid WAV: {e}")
+        if audio.ndim > 1:
+            # Like the capture path, every channel counts
+            audio = _mix_down(audio)
+        return audio, sample_rate
+    sample_rate = parse_sample_rate(query.get("sample_rate", 16000))
+    return np.frombuffer(body[:len(body) - len(body) % 2], dtype="<i2"), sample_rate
+
+
+async def submit_transcription(request):
+    service = request.app["service"]
+    body = await request.read()
+    if not body:
+        raise web.HTTPBadRequest(text="Empty upload")
+    audio, sample_rate = decode_upload(body, request.content_type, request.query)
+    try:
+        priority = int(request.query.get("priority", 10))
+    except ValueError:
+        raise web.HTTPBadRequest(text="priority must be an integer")
+    job = Job(
+        audio,
+        sample_rate,
+        language_config_from(request.query),
+        priority=priority,
+        save=request.query.get("save", "1") != "0",
+    )
+    try:
+        service.submit(job)
+    except asyncio.QueueFull:
+        raise web.HTTPTooManyRequests(text="Transcription queue is full", headers={"Retry-After": "1"})
+
+    if request.query.get("wait") in ("1", "true"):
+        try:
+            await job.done.wait()
+        except asyncio.CancelledError:
+            # The client went away while waiting
+            service.cancel(job.id)
+            raise
+        return web.json_response(job.to_dict())
+    return web.json_response(job.to_dict(), status=202)
+
+
+async def get_transcription(request):
+    job = request.app["service"].jobs.get(request.match_info["job_id"])
+    if job is None:
+        raise web.HTTPNotFound(text="Unknown job")
+    return web.json_response(job.to_dict())
+
+
+async def cancel_transcription(request):
+    job = request.app["service"].cancel(request.match_info["job_id"])
+    if job is None:
+        raise web.HTTPNotFound(text="Unknown job")
+    return web.json_response(job.to_dict())
+
+
+async def health(request):
+    return web.json_response(request.app["service"].stats())
+
+
+async def stream_transcription(request):
+    """
+    WebSocket endpoint for incremental transcription.
+
+    The client sends a JSON config ({"language": "en", "sample_rate": 16000}),
+    then binary frames of 16-bit little-endian mono PCM, then {"type": "end"}.
+    The server answers with {"type": "partial" | "commit" | "final", "text": ...}.
+    Malformed messages get {"type": "error", "text": ...} and the stream
+    stays open.
+    """
+    from live_transcription import LiveTranscriber
+
+    service = request.app["service"]
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    loop = asyncio.get_running_loop()
+
+    def send(kind):
+        def callback(text):
+            if not ws.closed:
+                asyncio.run_coroutine_threadsafe(ws.send_json({"type": kind, "text": text}), loop)
+        return callback
+
+    # put() runs on the event loop, which must never wait for the decoder
+    data_queue = BoundedQueue("capture:ws", policy="spill" if DEFAULT_POLICY == "block" else DEFAULT_POLICY)
+    live = None
+    try:
+        async for msg in ws:
+            if msg.type == WSMsgType.TEXT:
+                try:
+                    message = json.loads(msg.data)
+                    if not isinstance(message, dict):
+                        raise ValueError("Messages must be JSON objects")
+                    if message.get("type") == "end":
+                        break
+                    if live is None:
+                        language_config = language_config_from(message)
+                        sample_rate = parse_sample_rate(message.get("sample_rate", 16000))
+                except (ValueError, KeyError, TypeError, web.HTTPBadRequest) as e:
+                    # A bad message is answered, the stream stays open
+                    error = e.text if isinstance(e, web.HTTPBadRequest) else f"Invalid message: {e}"
+                    await ws.send_json({"type": "error", "text": error})
+                    continue
+                if live is None:
+                    model = await loop.run_in_executor(None, service.model, language_config["model"])
+                    data_queue.put(('sample_rate', sample_rate))
+                    live = LiveTranscriber(data_queue, language_config, model=model, source=id(ws),
+                                           on_partial=send("partial"), on_commit=send("commit")).start()
+            elif msg.type == WSMsgType.BINARY:
+                if live is None:
+                    await ws.send_json({"type": "error", "text": "Send the JSON config first"})
+                    continue
+                data_queue.put(('audio_chunk', np.frombuffer(msg.data[:len(msg.data) - len(msg.data) % 2], dtype="<i2")))
+            elif msg.type == WSMsgType.ERROR:
+                break
+    finally:
+        if live is not None:
+            data_queue.put(('stream_end', None))
+            text = await loop.run_in_executor(None, live.join)
+            get_language_identifier().forget(id(ws))
+            if not ws.closed:
+                await ws.send_json({"type": "final", "text": text})
+    await ws.close()
+    return ws
+
+
+def create_app(registry=None, workers=1, queue_size=16, preload=(), batch_size=1, batch_wait=0.05):
+    """
+    Builds the aiohttp application.
+
+    Args:
+        registry (ModelRegistry, optional): Registry to fetch models from
+        workers (int): Jobs decoded concurrently
+        queue_size (int): Jobs allowed to wait before uploads are refused
+        preload (tuple): Model names loaded at startup
+        batch_size (int): Most clips decoded in one batched forward pass
+        batch_wait (float): Longest a clip waits for a batch to fill, in seconds
+
+    Returns:
+        aiohttp.web.Application
+    """
+    app = web.Application(client_max_size=512 * 1024 ** 2)
+
+    async def on_startup(app):
+        service = TranscriptionService(registry, workers, queue_size, batch_size, batch_wait)
+        app["service"] = service
+        await service.start()
+        loop = asyncio.get_running_loop()
+        for name in preload:
+            await loop.run_in_executor(None, service.model, name)
+
+    async def on_cleanup(app):
+        await app["service"].stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post("/v1/transcriptions", submit_transcription)
+    app.router.add_get("/v1/transcriptions/{job_id}", get_transcription)
+    app.router.add_delete("/v1/transcriptions/{job_id}", cancel_transcription)
+    app.router.add_get("/v1/stream", stream_transcription)
+    app.router.add_get("/v1/health", health)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local transcription service.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind, loopback by default")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="Jobs decoded concurrently")
+    parser.add_argument("--queue-size", type=int, default=16, help="Jobs waiting before uploads get HTTP 429")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Clips of up to 30s from concurrent jobs decoded in one pass")
+    parser.add_argument("--batch-wait-ms", type=float, default=50,
+                        help="Longest a clip waits for its batch to fill")
+    parser.add_argument("--preload", nargs="*", default=[], help="Models to load at startup")
+    parser.add_argument("--backend", default=None, choices=sorted(BACKENDS),
+                        help="Inference backend, defaults to $TRANSCRIBE_BACKEND or whisper")
+    parser.add_argument("--threads", type=int, default=None, help="Inference threads per model")
+    parser.add_argument("--stub-model", action="store_true", help="Use the benchmark stub instead of Whisper")
+    args = parser.parse_args()
+
+    if args.stub_model:
+        from benchmarks.stub_model import load_stub_model
+        registry = ModelRegistry(loader=load_stub_model)
+    else:
+        registry = ModelRegistry(backend=args.backend, threads=args.threads)
+
+    console.print(f"[cyan]Transcription service listening on http://{args.host}:{args.port}")
+    web.run_app(
+        create_app(registry, args.workers, args.queue_size, tuple(args.preload),
+                   max(1, args.batch_size), args.batch_wait_ms / 1000),
+        host=args.host,
+        port=args.port,
+        print=None,
+    )
+
+
+if __name__ == "__main__":
+    main()
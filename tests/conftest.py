@@ -0,0 +1,30 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _isolated_cache(tmp_path_factory):
+    # The modules write to ./cache, keep that out of the checkout
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("workdir"))
+    yield
+    os.chdir(previous)
+
+
+def tone(seconds, sample_rate=16000, frequency=220.0, amplitude=0.3):
+    """A steady sine tone, loud enough to count as speech."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def silence(seconds, sample_rate=16000, level=1e-4, seed=0):
+    """Faint white noise."""
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, level, int(seconds * sample_rate)).astype(np.float32)
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import tone, silence
+from features import (HOP_LENGTH, LOG_FLOOR, N_FFT, N_FRAMES, LogMelExtractor, features_path, log_mel,
+                      mel_filters, prepare_windows)
+
+
+def reference_log_mel(audio_np, n_mels=80):
+    # whisper.log_mel_spectrogram() without the clamp and scaling
+    padded = np.pad(audio_np.astype(np.float64), N_FFT // 2, mode="reflect")
+    window = np.hanning(N_FFT + 1)[:-1]
+    starts = range(0, len(padded) - N_FFT + 1, HOP_LENGTH)
+    frames = np.stack([padded[s:s + N_FFT] * window for s in starts])
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    mel = power[:-1] @ mel_filters(n_mels).T.astype(np.float64)
+    return np.log10(np.maximum(mel, 1e-10))
+
+
+def speech_like(seconds):
+    audio = np.concatenate([tone(seconds / 2, frequency=300.0), silence(seconds / 4), tone(seconds / 4, frequency=1200.0)])
+    return audio + np.random.default_rng(1).normal(0, 0.01, len(audio)).astype(np.float32)
+
+
+def test_mel_filters_shape_and_coverage():
+    filters = mel_filters(80)
+    assert filters.shape == (80, N_FFT // 2 + 1)
+    assert filters.dtype == np.float32
+    assert (filters >= 0).all()
+    assert (filters.sum(axis=1) > 0).all()
+    assert mel_filters(128).shape == (128, N_FFT // 2 + 1)
+
+
+@pytest.mark.parametrize("n_mels", [80, 128])
+def test_log_mel_matches_the_reference(n_mels):
+    audio = speech_like(2.0)
+    frames = log_mel(audio, n_mels)
+    expected = reference_log_mel(audio, n_mels)
+    assert frames.shape == expected.shape == (len(audio) // HOP_LENGTH, n_mels)
+    np.testing.assert_allclose(frames, expected, atol=2e-3)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 160, 199, 4001])
+def test_chunking_does_not_change_the_frames(chunk_size):
+    audio = speech_like(1.0)[:15999]
+    whole = log_mel(audio, chunk_size=len(audio))
+    chunked = log_mel(audio, chunk_size=chunk_size)
+    assert whole.shape == (len(audio) // HOP_LENGTH, 80)
+    np.testing.assert_allclose(chunked, whole, atol=1e-5)
+
+
+def test_extractor_streams_frames_as_they_complete():
+    audio = speech_like(1.0)
+    extractor = LogMelExtractor()
+    counts = [len(extractor.process(audio[i:i + 1600])) for i in range(0, len(audio), 1600)]
+    tail = extractor.flush()
+    assert all(count > 0 for count in counts[1:])
+    assert sum(counts) + len(tail) == len(audio) // HOP_LENGTH
+    # Flushing resets, the next signal starts fresh
+    np.testing.assert_allclose(np.concatenate([extractor.process(audio), extractor.flush()]), log_mel(audio), atol=1e-5)
+
+
+def test_gain_scales_the_power():
+    audio = speech_like(1.0)
+    np.testing.assert_allclose(log_mel(audio, gain=2.0), log_mel(audio * 2.0), atol=1e-4)
+
+
+def test_short_and_empty_input():
+    assert log_mel(np.zeros(0, dtype=np.float32)).shape == (0, 80)
+    assert log_mel(tone(0.005)).shape == (0, 80)
+    assert log_mel(tone(0.02)).shape == (2, 80)
+
+
+def test_prepare_windows_pads_clamps_and_scales():
+    frames = np.full((N_FRAMES + 100, 80), -2.0, dtype=np.float32)
+    frames[0, 0] = 2.0
+    frames[1, 0] = -20.0
+    windows = prepare_windows(frames)
+    assert windows.shape == (2, 80, N_FRAMES)
+    assert windows.dtype == np.float32
+    first = windows[0] * 4.0 - 4.0
+    assert first[0, 0] == pytest.approx(2.0)
+    # Clamped to 8 decades below the loudest frame of the window
+    assert first[0, 1] == pytest.approx(-6.0)
+    assert first[1, 1] == pytest.approx(-2.0)
+    second = windows[1] * 4.0 - 4.0
+    assert np.allclose(second[:, :100], -2.0)
+    # The padding is silence, clamped against this window's own peak
+    assert np.allclose(second[:, 100:], LOG_FLOOR)
+    np.testing.assert_allclose(prepare_windows(frames, start=1), windows[1:])
+    assert prepare_windows(frames, start=0, count=1).shape == (1, 80, N_FRAMES)
+
+
+def test_features_path_keeps_normalized_and_raw_apart(tmp_path):
+    source = str(tmp_path / "talk.wav")
+    normalized = features_path(source, directory=str(tmp_path / "features"))
+    raw = features_path(source, normalize=False, directory=str(tmp_path / "features"))
+    assert normalized != raw
+    assert normalized.endswith(".mel80.npy") and raw.endswith(".mel80.raw.npy")
+    assert os.path.basename(normalized).startswith("talk_")
+    assert features_path(source, n_mels=128, directory=str(tmp_path)).endswith(".mel128.npy")
+    # Recordings in ./cache keep theirs alongside
+    assert features_path("./cache/recording.wav") == os.path.abspath("./cache/recording.mel80.npy")
@@ -0,0 +1,68 @@
+import numpy as np
+
+from conftest import tone, silence
+from long_form import plan_segments, stitch_texts
+
+
+def test_stitch_drops_words_repeated_across_an_overlap():
+    pieces = [("Hello there, my friend", False), ("my friend. How are you", True)]
+    assert stitch_texts(pieces) == "Hello there, my friend How are you"
+
+
+def test_stitch_matches_regardless_of_case_and_punctuation():
+    pieces = [("we went to the Park.", False), ("The park was closed", True)]
+    assert stitch_texts(pieces) == "we went to the Park. was closed"
+
+
+def test_stitch_keeps_repeats_between_separate_segments():
+    pieces = [("my friend", False), ("my friend is here", False)]
+    assert stitch_texts(pieces) == "my friend my friend is here"
+
+
+def test_stitch_without_a_common_run_keeps_everything():
+    pieces = [("one two three", False), ("four five", True), ("", True), ("six", True)]
+    assert stitch_texts(pieces) == "one two three four five six"
+
+
+def test_stitch_limits_the_overlap_searched():
+    pieces = [("a b c d", False), ("a b c d e", True)]
+    assert stitch_texts(pieces, max_overlap_words=2) == "a b c d a b c d e"
+    assert stitch_texts(pieces) == "a b c d e"
+
+
+def test_plan_skips_silence_between_speech():
+    sr = 16000
+    audio = np.concatenate([silence(2), tone(3), silence(4), tone(2), silence(2)])
+    segments = plan_segments(audio, sr)
+    assert len(segments) == 2
+    first, second = segments
+    assert 1.5 <= first.start_time <= 2.1 and 4.9 <= first.end_time <= 5.5
+    assert 8.5 <= second.start_time <= 9.1 and 10.9 <= second.end_time <= 11.5
+
+
+def test_plan_cuts_long_speech_with_overlap():
+    sr = 16000
+    # 70 s of speech with short dips the cuts can snap to
+    speech = np.concatenate([np.concatenate([tone(6.8), silence(0.2)]) for _ in range(10)])
+    audio = np.concatenate([silence(1), speech, silence(1)])
+    segments = plan_segments(audio, sr, max_seconds=30.0, overlap_seconds=1.0)
+    assert len(segments) >= 3
+    assert all(s.duration <= 30.0 for s in segments)
+    for previous, current in zip(segments, segments[1:]):
+        assert current.start < previous.end
+        assert (previous.end - current.start) / sr <= 1.0 + 1e-6
+    assert segments[0].start_time <= 1.1
+    assert segments[-1].end_time >= 70.5
+
+
+def test_plan_without_overlap_leaves_no_gap_or_repeat():
+    sr = 16000
+    audio = tone(75)
+    segments = plan_segments(audio, sr, max_seconds=30.0, overlap_seconds=0.0)
+    assert all(s.duration <= 30.0 for s in segments)
+    for previous, current in zip(segments, segments[1:]):
+        assert current.start == previous.end
+
+
+def test_plan_of_silence_is_empty():
+    assert plan_segments(silence(5), 16000) == []
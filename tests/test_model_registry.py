@@ -0,0 +1,116 @@
+import threading
+import time
+
+import model_registry
+from model_registry import MODEL_SIZE_ESTIMATES, ModelRegistry, estimate_model_bytes
+
+
+class FakeParameter:
+    def __init__(self, count, itemsize=4):
+        self.count = count
+        self.itemsize = itemsize
+
+    def numel(self):
+        return self.count
+
+    def element_size(self):
+        return self.itemsize
+
+
+class FakeModel:
+    def __init__(self, name, size=None):
+        self.name = name
+        self.size = size
+
+    def parameters(self):
+        if self.size is None:
+            raise AttributeError("no parameters")
+        return [FakeParameter(self.size // 4)]
+
+
+class CountingLoader:
+    def __init__(self, sizes=None, delay=0.0):
+        self.sizes = sizes or {}
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, name, device="cpu", dtype="float32"):
+        self.calls.append(name)
+        time.sleep(self.delay)
+        return FakeModel(name, self.sizes.get(name, 0))
+
+
+def names(registry):
+    return [key[0] for key in registry.loaded()]
+
+
+def test_estimate_uses_parameters_then_the_table():
+    assert estimate_model_bytes(FakeModel("x", 4000)) == 4000
+    assert estimate_model_bytes(FakeModel("base"), "base") == MODEL_SIZE_ESTIMATES["base"]
+    assert estimate_model_bytes(FakeModel("custom"), "custom") == 0
+
+
+def test_models_are_loaded_once_and_reused():
+    loader = CountingLoader()
+    registry = ModelRegistry(loader=loader, backend="whisper")
+    first = registry.get("tiny")
+    assert registry.get("tiny") is first
+    assert loader.calls == ["tiny"]
+    assert registry.get("tiny", dtype="float16") is not first
+    assert loader.calls == ["tiny", "tiny"]
+
+
+def test_least_recently_used_model_is_evicted():
+    loader = CountingLoader()
+    registry = ModelRegistry(max_models=2, loader=loader, backend="whisper")
+    registry.get("tiny")
+    registry.get("base")
+    registry.get("tiny")
+    registry.get("small")
+    assert names(registry) == ["tiny", "small"]
+    registry.get("base")
+    assert loader.calls == ["tiny", "base", "small", "base"]
+    assert names(registry) == ["small", "base"]
+
+
+def test_memory_budget_evicts_but_keeps_the_new_model():
+    loader = CountingLoader({"tiny": 100, "base": 300, "large": 1000})
+    registry = ModelRegistry(max_models=None, memory_budget=500, loader=loader, backend="whisper")
+    registry.get("tiny")
+    registry.get("base")
+    assert registry.total_bytes() == 400
+    registry.get("large")
+    # Over budget on its own, but the model just asked for stays loaded
+    assert names(registry) == ["large"]
+    assert registry.total_bytes() == 1000
+    registry.get("tiny")
+    assert names(registry) == ["tiny"]
+
+
+def test_backend_is_part_of_the_key(monkeypatch):
+    other = CountingLoader()
+    monkeypatch.setattr(model_registry, "get_loader", lambda backend, threads=None: other)
+    loader = CountingLoader()
+    registry = ModelRegistry(max_models=3, loader=loader, backend="whisper")
+    default = registry.get("tiny")
+    converted = registry.get("tiny", backend="faster-whisper")
+    assert default is not converted
+    assert loader.calls == ["tiny"] and other.calls == ["tiny"]
+    assert [key[3] for key in registry.loaded()] == ["whisper", "faster-whisper"]
+    registry.evict("tiny", backend="faster-whisper")
+    assert [key[3] for key in registry.loaded()] == ["whisper"]
+    registry.clear()
+    assert registry.loaded() == [] and registry.total_bytes() == 0
+
+
+def test_concurrent_requests_load_once():
+    loader = CountingLoader(delay=0.1)
+    registry = ModelRegistry(loader=loader, backend="whisper")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("tiny"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loader.calls == ["tiny"]
+    assert len(results) == 4 and all(model is results[0] for model in results)
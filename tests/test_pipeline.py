@@ -0,0 +1,109 @@
+import threading
+import time
+from queue import Empty, Full
+
+import numpy as np
+import pytest
+
+from pipeline import BoundedQueue
+
+
+def chunk(value, samples=1000):
+    return ("audio_chunk", np.full(samples, value, dtype=np.float32))
+
+
+def drain(queue):
+    items = []
+    while True:
+        try:
+            items.append(queue.get_nowait())
+        except Empty:
+            return items
+
+
+def values(items):
+    return [item[1][0] if item[0] == "audio_chunk" else item for item in items]
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        BoundedQueue("test", policy="lossy")
+
+
+def test_fifo_within_the_bound():
+    queue = BoundedQueue("test", max_seconds=1.0, policy="block", sample_rate=1000)
+    queue.put(("sample_rate", 1000))
+    queue.put(chunk(1, 500))
+    queue.put(("file_path", "x.wav"))
+    assert queue.seconds == 0.5
+    assert values(drain(queue)) == [("sample_rate", 1000), 1.0, ("file_path", "x.wav")]
+    assert queue.seconds == 0
+
+
+def test_block_waits_for_the_consumer():
+    queue = BoundedQueue("test", max_seconds=2.0, policy="block", sample_rate=1000)
+    queue.put(chunk(1))
+    queue.put(chunk(2))
+    with pytest.raises(Full):
+        queue.put(chunk(3), timeout=0.05)
+    # Control items never wait
+    queue.put(("stream_end", None), timeout=0)
+
+    threading.Timer(0.1, queue.get).start()
+    start = time.perf_counter()
+    queue.put(chunk(3))
+    assert time.perf_counter() - start >= 0.05
+    assert values(drain(queue)) == [2.0, ("stream_end", None), 3.0]
+
+
+def test_drop_newest_leaves_a_gap():
+    queue = BoundedQueue("test", max_seconds=2.0, policy="drop_newest", sample_rate=1000)
+    for value in range(1, 5):
+        queue.put(chunk(value))
+    assert values(drain(queue)) == [1.0, 2.0, ("gap", 2.0)]
+    assert queue.dropped_seconds == 2.0
+
+
+def test_drop_oldest_keeps_the_latest_audio():
+    queue = BoundedQueue("test", max_seconds=2.0, policy="drop_oldest", sample_rate=1000)
+    queue.put(("sample_rate", 1000))
+    for value in range(1, 5):
+        queue.put(chunk(value))
+    assert values(drain(queue)) == [("sample_rate", 1000), ("gap", 2.0), 3.0, 4.0]
+
+
+def test_spill_keeps_everything_in_order(tmp_path):
+    queue = BoundedQueue("test", max_seconds=2.0, policy="spill", sample_rate=1000, spill_dir=str(tmp_path))
+    for value in range(1, 7):
+        queue.put(chunk(value))
+        if value == 4:
+            queue.put(("gap", 0.5))
+    queue.put(("stream_end", None))
+    occupancy = queue.occupancy()
+    assert occupancy["seconds"] == 2.0
+    assert occupancy["spilled_seconds"] == 4.0
+    assert queue._spill_file is not None
+
+    items = drain(queue)
+    assert values(items) == [1.0, 2.0, 3.0, 4.0, ("gap", 0.5), 5.0, 6.0, ("stream_end", None)]
+    assert all(len(item[1]) == 1000 for item in items if item[0] == "audio_chunk")
+    assert queue.dropped_seconds == 0
+    # Caught up, the spill file is closed
+    assert queue._spill_file is None
+
+
+def test_speech_items_keep_their_extra_fields_when_spilled(tmp_path):
+    queue = BoundedQueue("test", max_seconds=1.0, policy="spill", sample_rate=1000, spill_dir=str(tmp_path))
+    queue.put(("speech", np.ones(1000, dtype=np.float32), 1.5))
+    queue.put(("speech", np.full(1000, 2, dtype=np.float32), 3.0))
+    first, second = drain(queue)
+    assert first[2] == 1.5
+    assert second[2] == 3.0 and second[1][0] == 2.0
+
+
+def test_sample_rate_items_change_the_bound():
+    queue = BoundedQueue("test", max_seconds=1.0, policy="drop_newest", sample_rate=16000)
+    queue.put(("sample_rate", 1000))
+    queue.put(chunk(1))
+    queue.put(chunk(2))
+    assert values(drain(queue)) == [("sample_rate", 1000), 1.0, ("gap", 1.0)]
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from scipy.signal import resample_poly
+
+from resampler import StreamingResampler, resample_stream
+
+
+def signal(n, seed=0):
+    return np.random.default_rng(seed).uniform(-1, 1, n)
+
+
+@pytest.mark.parametrize("orig, target", [(48000, 16000), (44100, 16000), (8000, 16000), (22050, 16000)])
+def test_matches_resample_poly_over_the_whole_signal(orig, target):
+    audio = signal(orig)
+    expected = resample_poly(audio, target, orig)
+    out = resample_stream(audio, orig, target, chunk_size=4096, dtype=np.float64)
+    assert len(out) == len(expected)
+    np.testing.assert_allclose(out, expected, atol=1e-9)
+
+
+def test_chunk_boundaries_do_not_change_the_output():
+    audio = signal(44100 * 2, seed=1).astype(np.float32)
+    whole = resample_stream(audio, 44100, 16000, chunk_size=len(audio))
+    rng = np.random.default_rng(2)
+    resampler = StreamingResampler(44100, 16000)
+    parts, first = [], 0
+    while first < len(audio):
+        size = int(rng.integers(1, 5000))
+        parts.append(resampler.process(audio[first:first + size]))
+        first += size
+    parts.append(resampler.flush())
+    np.testing.assert_allclose(np.concatenate(parts), whole, atol=1e-6)
+
+
+def test_int16_input_is_resampled_as_numbers():
+    audio = (signal(48000, seed=3) * 1000).astype(np.int16)
+    out = resample_stream(audio, 48000, 16000, dtype=np.float64)
+    np.testing.assert_allclose(out, resample_poly(audio.astype(np.float64), 1, 3), atol=1e-6)
+
+
+def test_equal_rates_pass_chunks_through():
+    resampler = StreamingResampler(16000, 16000)
+    chunk = signal(1000).astype(np.float32)
+    np.testing.assert_array_equal(resampler.process(chunk), chunk)
+    assert len(resampler.flush()) == 0
+
+
+def test_reset_starts_a_new_signal():
+    audio = signal(48000, seed=4).astype(np.float32)
+    resampler = StreamingResampler(48000, 16000)
+    first = np.concatenate([resampler.process(audio), resampler.flush()])
+    resampler.process(signal(1234, seed=5))
+    resampler.reset()
+    second = np.concatenate([resampler.process(audio), resampler.flush()])
+    np.testing.assert_array_equal(first, second)
@@ -0,0 +1,108 @@
+import itertools
+import os
+
+import numpy as np
+import pytest
+
+import result_cache
+from batching import BatchScheduler
+from benchmarks.stub_model import StubModel
+from conftest import tone
+from model_registry import ModelRegistry
+from result_cache import ResultCache, cache_key
+from transcription import run_model
+
+RESULT = {
+    "text": " hello world",
+    "language": "en",
+    "segments": [{"id": 0, "start": 0.0, "end": 1.0, "text": " hello world", "tokens": [1, 2, 3],
+                  "avg_logprob": -0.2, "words": [{"word": " hello", "start": 0.0, "end": 0.5}]}],
+}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Strictly increasing times, entries written in a row differ in age
+    ticks = itertools.count(1000.0)
+    monkeypatch.setattr(result_cache.time, "time", lambda: next(ticks))
+
+
+def test_equal_inputs_share_a_key():
+    audio = tone(1.0)
+    options = {"fp16": False, "language": "en"}
+    assert cache_key(audio, "tiny", "en", options) == cache_key(audio.copy(), "tiny", "en", dict(reversed(options.items())))
+    # A strided view hashes like its contiguous copy
+    doubled = np.repeat(audio, 2)
+    assert cache_key(doubled[::2], "tiny") == cache_key(audio, "tiny")
+
+
+@pytest.mark.parametrize("change", [
+    lambda audio: (np.concatenate([audio[:-1], audio[-1:] + 1e-3]), "tiny", "en", {}),
+    lambda audio: (audio[:-1], "tiny", "en", {}),
+    lambda audio: (audio.astype(np.float64), "tiny", "en", {}),
+    lambda audio: (audio, "base", "en", {}),
+    lambda audio: (audio, "tiny@faster-whisper", "en", {}),
+    lambda audio: (audio, "tiny", "de", {}),
+    lambda audio: (audio, "tiny", "en", {"decode": "batched"}),
+    lambda audio: (audio, "tiny", "en", {"word_timestamps": True}),
+])
+def test_any_difference_changes_the_key(change):
+    audio = tone(1.0)
+    assert cache_key(*change(audio)) != cache_key(audio, "tiny", "en", {})
+
+
+def test_roundtrip_keeps_only_the_segment_fields(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    assert cache.get("missing") is None
+    cache.put("k", RESULT)
+    cached = cache.get("k")
+    assert cached["text"] == " hello world" and cached["language"] == "en"
+    assert cached["segments"] == [{"id": 0, "start": 0.0, "end": 1.0, "text": " hello world",
+                                   "words": [{"word": " hello", "start": 0.0, "end": 0.5}]}]
+    assert len(cache) == 1
+    assert cache.total_bytes() == os.path.getsize(tmp_path / "k.json")
+    # Overwriting does not count the entry twice
+    cache.put("k", RESULT)
+    assert len(cache) == 1 and cache.total_bytes() == os.path.getsize(tmp_path / "k.json")
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    probe = ResultCache(str(tmp_path / "probe"))
+    probe.put("k", RESULT)
+    entry_size = probe.total_bytes()
+
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=3 * entry_size)
+    for key in ("a", "b", "c"):
+        cache.put(key, RESULT)
+    cache.get("a")
+    cache.put("d", RESULT)
+    assert sorted(p.stem for p in (tmp_path / "cache").iterdir()) == ["a", "c", "d"]
+    assert cache.get("b") is None
+    assert len(cache) == 3 and cache.total_bytes() == 3 * entry_size
+
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    ResultCache(str(tmp_path)).put("k", RESULT)
+    reopened = ResultCache(str(tmp_path))
+    assert len(reopened) == 1
+    assert reopened.total_bytes() == os.path.getsize(tmp_path / "k.json")
+    assert reopened.get("k")["text"] == " hello world"
+
+
+def test_batched_and_full_decodes_are_cached_apart(tmp_path):
+    stub = StubModel(seconds_per_audio_second=0.0)
+    registry = ModelRegistry(loader=lambda name, **kwargs: stub, backend="whisper")
+    cache = ResultCache(str(tmp_path))
+    config = {"code": "en", "model": "tiny"}
+    audio = tone(2.0)
+    scheduler = BatchScheduler(stub, max_batch_size=4, max_wait=0.01)
+    calls = []
+    try:
+        for model in (scheduler, scheduler, None, None):
+            run_model(audio, config, model=model, registry=registry, cache=cache)
+            calls.append(stub.calls)
+    finally:
+        scheduler.close()
+    # The full decode is not answered with the batched result, each is reused
+    assert calls == [1, 1, 2, 2]
+    assert len(cache) == 2
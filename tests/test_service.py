@@ -0,0 +1,167 @@
+import asyncio
+import io
+
+import numpy as np
+from aiohttp.test_utils import TestClient, TestServer
+from scipy.io import wavfile
+
+from benchmarks.stub_model import StubModel
+from conftest import tone
+from model_registry import ModelRegistry
+from service import create_app, decode_upload
+
+
+def stub_registry(seconds_per_audio_second=0.0):
+    def load(name, device="cpu", dtype="float32", threads=None):
+        model = StubModel(seconds_per_audio_second=seconds_per_audio_second)
+        model.cacheable = False
+        return model
+    return ModelRegistry(loader=load)
+
+
+def pcm(audio):
+    return (audio * 32767).astype("<i2").tobytes()
+
+
+def run(test, **app_options):
+    async def main():
+        app = create_app(**app_options)
+        async with TestClient(TestServer(app)) as client:
+            await test(client)
+    asyncio.run(main())
+
+
+def test_raw_pcm_upload_is_transcribed():
+    async def test(client):
+        response = await client.post("/v1/transcriptions?wait=1&save=0&sample_rate=16000", data=pcm(tone(4)),
+                                     headers={"Content-Type": "application/octet-stream"})
+        assert response.status == 200
+        job = await response.json()
+        assert job["status"] == "done"
+        assert job["duration"] == 4.0
+        assert job["text"].split()[:2] == ["the", "quick"]
+    run(test, registry=stub_registry())
+
+
+def test_multi_channel_wav_is_mixed_down():
+    left = (tone(2) * 32767).astype(np.int16)
+    stereo = np.stack([left, np.zeros_like(left)], axis=1)
+    buffer = io.BytesIO()
+    wavfile.write(buffer, 16000, stereo)
+
+    audio, sample_rate = decode_upload(buffer.getvalue(), "audio/wav", {})
+    assert sample_rate == 16000
+    assert audio.dtype == np.int16
+    np.testing.assert_allclose(audio, left / 2, atol=1)
+
+    async def test(client):
+        response = await client.post("/v1/transcriptions?wait=1&save=0", data=buffer.getvalue(),
+                                     headers={"Content-Type": "audio/wav"})
+        assert response.status == 200
+        assert (await response.json())["duration"] == 2.0
+    run(test, registry=stub_registry())
+
+
+def test_bad_requests_are_rejected_with_400():
+    async def test(client):
+        cases = [
+            ("/v1/transcriptions", b""),
+            ("/v1/transcriptions?priority=high", pcm(tone(1))),
+            ("/v1/transcriptions?sample_rate=abc", pcm(tone(1))),
+            ("/v1/transcriptions?sample_rate=0", pcm(tone(1))),
+            ("/v1/transcriptions?sample_rate=-16000", pcm(tone(1))),
+            ("/v1/transcriptions?language=xx", pcm(tone(1))),
+        ]
+        for url, body in cases:
+            response = await client.post(url, data=body, headers={"Content-Type": "application/octet-stream"})
+            assert response.status == 400, url
+        response = await client.post("/v1/transcriptions", data=b"RIFF not really a wav",
+                                     headers={"Content-Type": "audio/wav"})
+        assert response.status == 400
+    run(test, registry=stub_registry())
+
+
+def test_full_queue_answers_429():
+    async def test(client):
+        statuses = []
+        for _ in range(4):
+            response = await client.post("/v1/transcriptions?save=0", data=pcm(tone(5)),
+                                         headers={"Content-Type": "application/octet-stream"})
+            statuses.append(response.status)
+        # One job running and one waiting at most, the rest is refused
+        assert statuses[0] == 202
+        assert statuses[-1] == 429
+        assert response.headers["Retry-After"] == "1"
+    run(test, registry=stub_registry(seconds_per_audio_second=0.2), queue_size=1)
+
+
+def test_queued_job_can_be_cancelled():
+    async def test(client):
+        jobs = []
+        for _ in range(2):
+            response = await client.post("/v1/transcriptions?save=0", data=pcm(tone(5)),
+                                         headers={"Content-Type": "application/octet-stream"})
+            jobs.append(await response.json())
+        response = await client.delete(f"/v1/transcriptions/{jobs[1]['id']}")
+        assert response.status == 200
+        assert (await response.json())["status"] == "cancelled"
+
+        for _ in range(100):
+            first = await (await client.get(f"/v1/transcriptions/{jobs[0]['id']}")).json()
+            if first["status"] == "done":
+                break
+            await asyncio.sleep(0.05)
+        assert first["status"] == "done"
+        second = await (await client.get(f"/v1/transcriptions/{jobs[1]['id']}")).json()
+        assert second["status"] == "cancelled"
+        assert second["text"] is None
+
+        assert (await client.delete("/v1/transcriptions/unknown")).status == 404
+        assert (await client.get("/v1/transcriptions/unknown")).status == 404
+    run(test, registry=stub_registry(seconds_per_audio_second=0.1))
+
+
+async def receive_until_final(ws):
+    messages = []
+    async for msg in ws:
+        message = msg.json()
+        messages.append(message)
+        if message["type"] == "final":
+            break
+    return messages
+
+
+def test_websocket_streams_partial_commit_and_final():
+    async def test(client):
+        async with client.ws_connect("/v1/stream") as ws:
+            await ws.send_json({"language": "en", "sample_rate": 16000})
+            audio = pcm(tone(12))
+            for i in range(0, len(audio), 6400):
+                await ws.send_bytes(audio[i:i + 6400])
+            await ws.send_json({"type": "end"})
+            messages = await receive_until_final(ws)
+        kinds = [m["type"] for m in messages]
+        assert "partial" in kinds
+        assert "commit" in kinds
+        assert kinds[-1] == "final"
+        committed = " ".join(m["text"] for m in messages if m["type"] == "commit")
+        assert messages[-1]["text"] == committed
+    run(test, registry=stub_registry())
+
+
+def test_websocket_answers_bad_messages_and_stays_open():
+    async def test(client):
+        async with client.ws_connect("/v1/stream") as ws:
+            await ws.send_bytes(pcm(tone(0.5)))
+            assert (await ws.receive_json())["type"] == "error"
+            for bad in ("not json", "[1, 2]", '{"sample_rate": 0}', '{"sample_rate": "fast"}',
+                        '{"language": "xx"}', '{"language": ["en"]}'):
+                await ws.send_str(bad)
+                assert (await ws.receive_json())["type"] == "error", bad
+            await ws.send_json({"language": "en", "sample_rate": 16000})
+            await ws.send_bytes(pcm(tone(3)))
+            await ws.send_json({"type": "end"})
+            messages = await receive_until_final(ws)
+        assert messages[-1]["type"] == "final"
+        assert messages[-1]["text"]
+    run(test, registry=stub_registry())
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+import transcript_writers
+from transcript_writers import JsonlWriter, SrtWriter, TranscriptStream, VttWriter, format_timestamp
+from transcription import TranscriptSegment
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("seconds, marker, expected", [
+    (0, ",", "00:00:00,000"),
+    (1.2344, ",", "00:00:01,234"),
+    (61.0006, ".", "00:01:01.001"),
+    (3723.5, ".", "01:02:03.500"),
+    (-0.2, ",", "00:00:00,000"),
+])
+def test_format_timestamp(seconds, marker, expected):
+    assert format_timestamp(seconds, marker) == expected
+
+
+def test_srt_numbering_continues_after_reopen(tmp_path):
+    path = str(tmp_path / "talk.srt")
+    writer = SrtWriter(path)
+    writer.write(TranscriptSegment(0.0, 1.5, "Hello"))
+    writer.write(TranscriptSegment(1.5, 3.0, "there", speaker="Alice"))
+    writer.close()
+    writer = SrtWriter(path)
+    writer.write(TranscriptSegment(4.0, 5.0, "again"))
+    writer.close()
+    assert read(path) == (
+        "1\n00:00:00,000 --> 00:00:01,500\nHello\n\n"
+        "2\n00:00:01,500 --> 00:00:03,000\nAlice: there\n\n"
+        "3\n00:00:04,000 --> 00:00:05,000\nagain\n\n"
+    )
+
+
+def test_vtt_header_is_written_once(tmp_path):
+    path = str(tmp_path / "talk.vtt")
+    writer = VttWriter(path)
+    writer.write(TranscriptSegment(0.0, 1.0, "Hello", speaker="Bob"))
+    writer.close()
+    writer = VttWriter(path)
+    writer.write(TranscriptSegment(1.0, 2.25, "world"))
+    writer.close()
+    assert read(path) == (
+        "WEBVTT\n\n"
+        "00:00:00.000 --> 00:00:01.000\n<v Bob>Hello\n\n"
+        "00:00:01.000 --> 00:00:02.250\nworld\n\n"
+    )
+
+
+def test_jsonl_keeps_words_revisions_and_extra_fields(tmp_path):
+    path = str(tmp_path / "talk.jsonl")
+    writer = JsonlWriter(path)
+    writer.write(TranscriptSegment(0.0, 1.0, "Hi you", words=(("Hi", 0.0, 0.4), ("you", 0.5, 1.0))), recording=1)
+    writer.write(TranscriptSegment(0.0, 1.0, "Hi, you", revision=1), recording=1)
+    writer.close()
+    first, second = [json.loads(line) for line in read(path).splitlines()]
+    assert first == {"start": 0.0, "end": 1.0, "text": "Hi you", "recording": 1,
+                     "words": [{"word": "Hi", "start": 0.0, "end": 0.4}, {"word": "you", "start": 0.5, "end": 1.0}]}
+    assert second["revision"] == 1 and "words" not in second
+
+
+def test_stream_puts_recordings_on_one_timeline(tmp_path, monkeypatch):
+    clock = iter([100.0, 100.0, 110.0])
+    monkeypatch.setattr(transcript_writers.time, "monotonic", lambda: next(clock))
+    stream = TranscriptStream(str(tmp_path / "session"))
+    first = stream.begin_recording()
+    first(TranscriptSegment(1.0, 2.0, "one", words=(("one", 1.0, 2.0),)))
+    second = stream.begin_recording()
+    second(TranscriptSegment(0.5, 1.0, "two"))
+    # A late revision of the first recording keeps its offset
+    first(TranscriptSegment(1.0, 2.0, "One.", revision=1))
+    stream.close()
+
+    assert set(stream.paths) == {"srt", "vtt", "jsonl"}
+    srt = read(stream.paths["srt"])
+    assert "00:00:01,000 --> 00:00:02,000\none" in srt
+    assert "00:00:10,500 --> 00:00:11,000\ntwo" in srt
+    assert "One." not in srt and "One." not in read(stream.paths["vtt"])
+
+    entries = [json.loads(line) for line in read(stream.paths["jsonl"]).splitlines()]
+    assert [(e["text"], e["start"], e["recording"]) for e in entries] == [
+        ("one", 1.0, 1), ("two", 10.5, 2), ("One.", 1.0, 1)]
+    assert entries[0]["words"] == [{"word": "one", "start": 1.0, "end": 2.0}]
+
+
+def test_stream_writes_only_the_requested_formats(tmp_path):
+    stream = TranscriptStream(str(tmp_path / "session"), formats=("srt",))
+    stream.write(TranscriptSegment(0.0, 1.0, "only"))
+    stream.close()
+    assert list(stream.paths) == ["srt"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["session.srt"]
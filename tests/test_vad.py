@@ -0,0 +1,56 @@
+import numpy as np
+
+from conftest import silence, tone
+from vad import SpeechSegment, detect_speech, frame_features, merge_segments
+
+SR = 16000
+
+
+def test_finds_speech_between_silences():
+    audio = np.concatenate([silence(2), tone(3), silence(3), tone(2), silence(1)])
+    segments = detect_speech(audio, SR)
+    assert len(segments) == 2
+    (a, b) = segments
+    # Padding before, hangover after, both well under half a second
+    assert abs(a.start_time - 2.0) < 0.2 and abs(a.end_time - 5.0) < 0.5
+    assert abs(b.start_time - 8.0) < 0.2 and abs(b.end_time - 10.0) < 0.5
+
+
+def test_silence_and_empty_audio_have_no_speech():
+    assert detect_speech(silence(5), SR) == []
+    assert detect_speech(np.zeros(0, dtype=np.float32), SR) == []
+
+
+def test_continuous_speech_is_not_its_own_noise_floor():
+    # No quiet frames at all, the adaptive threshold must not reject it
+    segments = detect_speech(tone(6), SR)
+    assert len(segments) == 1
+    assert segments[0].duration > 5.9
+
+
+def test_short_clicks_are_dropped():
+    audio = np.concatenate([silence(1), tone(0.06), silence(1)])
+    assert detect_speech(audio, SR) == []
+
+
+def test_int16_and_float_input_agree():
+    audio = np.concatenate([silence(1), tone(2), silence(1)])
+    pcm = (audio * 32767).astype(np.int16)
+    assert detect_speech(audio, SR) == detect_speech(pcm, SR)
+
+
+def test_frame_features():
+    audio = np.concatenate([np.zeros(480, dtype=np.float32), np.full(480, 0.5, dtype=np.float32)])
+    energy_db, zcr = frame_features(audio, SR, frame_ms=30)
+    assert len(energy_db) == 2
+    assert energy_db[0] < -90
+    assert abs(energy_db[1] - 20 * np.log10(0.5)) < 0.01
+    assert zcr[1] == 0
+    alternating = np.tile(np.array([0.1, -0.1], dtype=np.float32), 240)
+    assert frame_features(alternating, SR)[1][0] > 0.99
+
+
+def test_merge_segments_bridges_short_gaps_up_to_a_limit():
+    segments = [SpeechSegment(0, 16000, SR), SpeechSegment(20000, 32000, SR), SpeechSegment(64000, 80000, SR)]
+    assert merge_segments(segments, max_gap=0.5) == [SpeechSegment(0, 32000, SR), SpeechSegment(64000, 80000, SR)]
+    assert merge_segments(segments, max_gap=0.5, max_duration=1.5) == segments
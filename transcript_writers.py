@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from functools import partial
+
+# Formats a TranscriptStream can write, see WRITERS
+DEFAULT_FORMATS = ("srt", "vtt", "jsonl")
+
+
+def format_timestamp(seconds, decimal_marker=","):
+    """
+    Formats seconds as HH:MM:SS,mmm (SRT) or HH:MM:SS.mmm (VTT).
+
+    Args:
+        seconds (float): Time in seconds
+        decimal_marker (str): Separator before the milliseconds
+
+    Returns:
+        str: The timestamp
+    """
+    millis = max(0, int(round(seconds * 1000)))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{decimal_marker}{millis:03d}"
+
+
+class SegmentWriter:
+    """
+    Appends transcript segments to a file, one flush per segment.
+
+    The file is only ever appended to, so it can be followed with
+    `tail -f` while the session runs, and everything written before a crash
+    stays on disk. Nothing is kept in memory besides the open file.
+
+    Args:
+        path (str): Output file, appended to if it exists
+    """
+
+    # Whether revised segments (TranscriptSegment.revision) can be written,
+    # append-only subtitles cannot replace cues that were already written
+    revisions = False
+
+    def __init__(self, path):
+        self.path = path
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", encoding="utf-8")
+        if new:
+            self._write_header()
+
+    def _write_header(self):
+        pass
+
+    def _format(self, segment, **extra):
+        raise NotImplementedError
+
+    def write(self, segment, **extra):
+        """
+        Appends one segment and flushes it.
+
+        Args:
+            segment (TranscriptSegment): The segment, in session time
+            **extra: Additional fields for formats that can hold them
+        """
+        self._file.write(self._format(segment, **extra))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _cue_text(segment):
+    return f"{segment.speaker}: {segment.text}" if segment.speaker else segment.text
+
+
+class SrtWriter(SegmentWriter):
+    """SubRip subtitles, numbering continues after the cues already in the file."""
+
+    def __init__(self, path):
+        self._index = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._index = sum(1 for line in f if " --> " in line)
+        super().__init__(path)
+
+    def _format(self, segment, **extra):
+        self._index += 1
+        return (f"{self._index}\n{format_timestamp(segment.start)} --> {format_timestamp(segment.end)}\n"
+                f"{_cue_text(segment)}\n\n")
+
+
+class VttWriter(SegmentWriter):
+    """WebVTT subtitles, speakers become voice tags."""
+
+    def _write_header(self):
+        self._file.write("WEBVTT\n\n")
+
+    def _format(self, segment, **extra):
+        text = f"<v {segment.speaker}>{segment.text}" if segment.speaker else segment.text
+        return f"{format_timestamp(segment.start, '.')} --> {format_timestamp(segment.end, '.')}\n{text}\n\n"
+
+
+class JsonlWriter(SegmentWriter):
+    """One JSON object per segment, with word timings when available."""
+
+    revisions = True
+
+    def _format(self, segment, **extra):
+        return json.dumps({**segment.to_dict(), **extra}, ensure_ascii=False) + "\n"
+
+
+WRITERS = {"srt": SrtWriter, "vtt": VttWriter, "jsonl": JsonlWriter}
+
+
+class TranscriptStream:
+    """
+    Streams the segments of a whole session to one writer per format.
+
+    Segment times are relative to their recording; begin_recording() marks
+    where the next recording starts, so the files use one timeline for the
+    session. write() is safe to call from several transcription threads.
+    Revised segments only go to the formats that can express them.
+
+    Args:
+        base_path (str): Path without extension, e.g. ./cache/session_20240101_120000
+        formats (tuple): Keys of WRITERS
+    """
+
+    def __init__(self, base_path, formats=DEFAULT_FORMATS):
+        self.paths = {fmt: f"{base_path}.{fmt}" for fmt in formats}
+        self._writers = [WRITERS[fmt](path) for fmt, path in self.paths.items()]
+        self._lock = threading.Lock()
+        self._session_start = time.monotonic()
+        self._offset = 0.0
+        self.recording = 0
+
+    def begin_recording(self):
+        """
+        Starts a new recording at the current point of the session timeline.
+
+        Returns:
+            callable: Writes segments of this recording, like write(). It
+            keeps the recording's offset, so revisions that arrive after the
+            next recording started still land at the right time
+        """
+        with self._lock:
+            self._offset = time.monotonic() - self._session_start
+            self.recording += 1
+            return partial(self._write, self._offset, self.recording)
+
+    def write(self, segment):
+        """
+        Writes one segment of the current recording to every format.
+
+        Args:
+            segment (TranscriptSegment): Segment timed from the recording start
+        """
+        with self._lock:
+            offset, recording = self._offset, self.recording
+        self._write(offset, recording, segment)
+
+    def _write(self, offset, recording, segment):
+        with self._lock:
+            shifted = segment._replace(
+                start=segment.start + offset,
+                end=segment.end + offset,
+                words=tuple((w, s + offset, e + offset) for w, s, e in segment.words) if segment.words else None,
+            )
+            for writer in self._writers:
+                if segment.revision and not writer.revisions:
+                    continue
+                writer.write(shifted, recording=recording, time=datetime.now().isoformat(timespec="seconds"))
+
+    def close(self):
+        with self._lock:
+            for writer in self._writers:
+                writer.close()
@@ -1,10 +1,249 @@
 import numpy as np
-import whisper
-from scipy import signal
 from datetime import datetime
+from typing import NamedTuple, Optional
 from utils import console
+from model_registry import get_registry
+from resampler import resample_stream
+from audio_format import pcm_to_float32, normalize_peak
+from result_cache import cache_key, get_result_cache
+from language_id import AUTO, get_language_identifier
+from metrics import metrics
 
-def transcribe(audio_np: np.ndarray, orig_sample_rate: int = 16000, language_config=None) -> str:
+# Whisper expects 16kHz audio
+TARGET_SAMPLE_RATE = 16000
+
+# Model used for a language when none is given
+DEFAULT_MODELS = {"en": "base.en", "de": "small", AUTO: "small"}
+
+
+class TranscriptSegment(NamedTuple):
+    """Transcribed text with its time span in seconds since the recording started."""
+    start: float
+    end: float
+    text: str
+    speaker: Optional[str] = None
+    # (word, start, end) tuples, when the model produced word timestamps
+    words: Optional[tuple] = None
+    # Above 0 for a better decode replacing earlier segments of the same span
+    revision: int = 0
+
+    def to_dict(self):
+        entry = {"start": round(self.start, 3), "end": round(self.end, 3), "text": self.text}
+        if self.speaker is not None:
+            entry["speaker"] = self.speaker
+        if self.revision:
+            entry["revision"] = self.revision
+        if self.words:
+            entry["words"] = [{"word": w, "start": round(s, 3), "end": round(e, 3)} for w, s, e in self.words]
+        return entry
+
+
+def segments_from_result(result, offset=0.0, speaker=None):
+    """
+    Converts the segments of a model result into TranscriptSegments.
+
+    Args:
+        result (dict): Result of the model's transcribe()
+        offset (float): Seconds added to every timestamp
+        speaker (str, optional): Label for every segment
+
+    Returns:
+        list: TranscriptSegment entries with non-empty text
+    """
+    segments = []
+    for segment in result.get("segments", []):
+        text = segment.get("text", "").strip()
+        if not text:
+            continue
+        words = None
+        if segment.get("words"):
+            words = tuple((w["word"], w["start"] + offset, w["end"] + offset) for w in segment["words"])
+        segments.append(TranscriptSegment(segment["start"] + offset, segment["end"] + offset, text, speaker, words))
+    if not segments and result.get("text", "").strip():
+        # Results without segment timings cover the whole input
+        duration = result.get("duration", 0.0)
+        segments.append(TranscriptSegment(offset, offset + duration, result["text"].strip(), speaker))
+    return segments
+
+
+def resample_audio(audio_np, orig_sample_rate, target_sample_rate=TARGET_SAMPLE_RATE):
+    """
+    Resamples audio to the target sample rate.
+
+    Args:
+        audio_np (numpy.ndarray): The audio data
+        orig_sample_rate (int): The sample rate of the audio data
+        target_sample_rate (int): The sample rate to convert to
+
+    Returns:
+        numpy.ndarray: The resampled audio
+    """
+    if orig_sample_rate == target_sample_rate:
+        return audio_np
+    # Chunked polyphase filtering, memory stays bounded for long recordings
+    with metrics.timer("resample_seconds", stage="offline"):
+        return resample_stream(audio_np, orig_sample_rate, target_sample_rate)
+
+
+def preprocess_audio(audio_np: np.ndarray, orig_sample_rate: int = 16000, normalize=True) -> np.ndarray:
+    """
+    Converts audio into the format Whisper expects.
+
+    Args:
+        audio_np (numpy.ndarray): int16 PCM or float audio in [-1, 1]; float
+            audio with a larger peak is taken as int16-scaled
+        orig_sample_rate (int): The sample rate of the audio data
+        normalize (bool): Scale the audio to use the full range
+
+    Returns:
+        numpy.ndarray: float32 audio at 16kHz in range [-1, 1]
+    """
+    # Whisper expects float32 in range [-1, 1]
+    audio = pcm_to_float32(audio_np)
+    # Float samples on the int16 scale, peak normalization below makes this moot
+    if not normalize and audio_np.dtype.kind == "f" and len(audio):
+        if max(float(audio.max()), -float(audio.min())) > 1.0:
+            audio = audio * np.float32(1.0 / 32768.0)
+
+    # Resample if necessary
+    if orig_sample_rate != TARGET_SAMPLE_RATE:
+        console.print(f"[blue]Resampling audio from {orig_sample_rate}Hz to {TARGET_SAMPLE_RATE}Hz for transcription")
+        audio = resample_audio(audio, orig_sample_rate)
+    
+    # Apply some pre-processing to improve speech recognition
+    # Normalize audio levels to use full range, which improves Whisper's performance
+    if normalize:
+        # Scale in place unless the buffer is still the caller's
+        with metrics.timer("normalize_seconds"):
+            audio = normalize_peak(audio, in_place=audio is not audio_np)
+    return audio
+
+
+def decode_options(language_config):
+    """
+    Builds the keyword arguments passed to the model's transcribe().
+
+    Args:
+        language_config (dict): Configuration with language code and model
+
+    Returns:
+        dict: Decode options
+    """
+    options = {"fp16": False}
+    # A fixed language skips the model's own detection pass on every call
+    if language_config["code"] != AUTO:
+        options["language"] = language_config["code"]
+    return options
+
+
+def get_model(language_config, model=None, registry=None):
+    """
+    Returns the model to transcribe with.
+
+    Args:
+        language_config (dict): Configuration with language code and model
+        model: Already loaded model, returned as is
+        registry (ModelRegistry, optional): Registry to fetch the model from
+
+    Returns:
+        The loaded model
+    """
+    # Reuse a warm model instead of loading it from disk on every call
+    if model is not None:
+        return model
+    return (registry or get_registry()).get(language_config["model"])
+
+
+def run_model(audio_np, language_config, model=None, registry=None, cache=None, source=None, **options):
+    """
+    Runs the model on preprocessed audio, answering from the result cache when possible.
+
+    Args:
+        audio_np (numpy.ndarray): float32 audio at 16kHz
+        language_config (dict): Configuration with language code and model
+        model: Already loaded Whisper model to use instead of the registry
+        registry (ModelRegistry, optional): Registry to fetch the model from
+        cache (ResultCache, optional): Result cache, defaults to the shared
+            cache in ./cache. Pass False to bypass it
+        source (optional): Where the audio comes from, e.g. a speaker label.
+            With the "auto" language its language is detected once and reused
+        **options: Extra decode options for the model's transcribe()
+
+    Returns:
+        dict: Model result with "text" and "segments"
+    """
+    if source is not None and language_config["code"] == AUTO:
+        language_config = get_language_identifier().resolve(
+            language_config, audio_np, get_model(language_config, model, registry), source)
+    options = {**decode_options(language_config), **options}
+    if model is not None and not getattr(model, "cacheable", True):
+        cache = False
+    if cache is None:
+        cache = get_result_cache()
+    elif cache is False:
+        cache = None
+
+    key = None
+    if cache is not None:
+        # Backends differ slightly in their output, the reference one keeps the plain name.
+        # A passed model knows its backend, the registry's default may be another one
+        backend = getattr(model, "backend", None) if model is not None else None
+        backend = backend or (registry or get_registry()).backend
+        cache_model = language_config["model"] if backend == "whisper" else f"{language_config['model']}@{backend}"
+        # Batched greedy decodes are coarser than full ones, never serve one for the other
+        mode = model.decode_mode(audio_np, options) if hasattr(model, "decode_mode") else "full"
+        key = cache_key(audio_np, cache_model, language_config.get("code"), {**options, "decode": mode})
+        result = cache.get(key)
+        if result is not None:
+            metrics.inc("result_cache_hits_total")
+            console.print("[blue]Transcription served from cache")
+            return result
+        metrics.inc("result_cache_misses_total")
+
+    stt = get_model(language_config, model, registry)
+    model_name = language_config["model"]
+    with metrics.timer("decode_seconds", model=model_name) as timer:
+        result = stt.transcribe(audio_np, **options)
+    if metrics.enabled and len(audio_np):
+        audio_seconds = len(audio_np) / TARGET_SAMPLE_RATE
+        metrics.inc("decoded_audio_seconds_total", audio_seconds, model=model_name)
+        metrics.observe("realtime_factor", timer.elapsed / audio_seconds, model=model_name)
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+
+def transcribe_detailed(audio_np: np.ndarray, orig_sample_rate: int = 16000, language_config=None, model=None,
+                        registry=None, cache=None, offset=0.0, speaker=None, source=None, **options) -> list:
+    """
+    Transcribes audio and keeps the model's segment timings.
+
+    Args:
+        audio_np (numpy.ndarray): The audio data to be transcribed
+        orig_sample_rate (int): The sample rate of the audio data
+        language_config (dict): Configuration with language code and model
+        model: Already loaded Whisper model to use instead of the registry
+        registry (ModelRegistry, optional): Registry to fetch the model from
+        cache (ResultCache, optional): Result cache, False to bypass it
+        offset (float): Seconds added to every timestamp, e.g. where the
+            audio starts in the recording
+        speaker (str, optional): Label for every segment
+        source (optional): Source key for language detection, see run_model()
+        **options: Extra decode options, e.g. word_timestamps=True
+
+    Returns:
+        list: TranscriptSegment entries
+    """
+    if language_config is None:
+        language_config = {"code": "en", "model": "base.en"}
+    audio_np = preprocess_audio(audio_np, orig_sample_rate)
+    result = run_model(audio_np, language_config, model, registry, cache, source, **options)
+    result = {**result, "duration": len(audio_np) / TARGET_SAMPLE_RATE}
+    return segments_from_result(result, offset, speaker)
+
+
+def transcribe(audio_np: np.ndarray, orig_sample_rate: int = 16000, language_config=None, model=None, registry=None, cache=None,
+               source=None) -> str:
     """
     Transcribes the given audio data using the Whisper speech recognition model.
 
@@ -12,6 +251,12 @@ def transcribe(audio_np: np.ndarray, orig_sample_rate: int = 16000, language_con
         audio_np (numpy.ndarray): The audio data to be transcribed.
         orig_sample_rate (int): The sample rate of the audio data.
         language_config (dict): Configuration with language code and model
+        model: Already loaded Whisper model to use instead of the registry
+        registry (ModelRegistry, optional): Registry to fetch the model from,
+            defaults to the process-wide registry
+        cache (ResultCache, optional): Result cache, defaults to the shared
+            cache in ./cache. Pass False to bypass it
+        source (optional): Source key for language detection, see run_model()
 
     Returns:
         str: The transcribed text.
@@ -20,58 +265,31 @@ def transcribe(audio_np: np.ndarray, orig_sample_rate: int = 16000, language_con
     if language_config is None:
         language_config = {"code": "en", "model": "base.en"}
     
-    # Whisper expects 16kHz audio
-    target_sample_rate = 16000
-    
-    # Resample if necessary
-    if orig_sample_rate != target_sample_rate:
-        console.print(f"[blue]Resampling audio from {orig_sample_rate}Hz to {target_sample_rate}Hz for transcription")
-        # Calculate resampled length
-        new_length = int(len(audio_np) * target_sample_rate / orig_sample_rate)
-        audio_np = signal.resample(audio_np, new_length)
-    
-    # Make sure audio is in correct shape and format
-    # Whisper expects float32 in range [-1, 1]
-    if audio_np.dtype != np.float32:
-        audio_np = audio_np.astype(np.float32)
-        
-    if np.max(np.abs(audio_np)) > 1.0:
-        audio_np = audio_np / 32768.0
-    
-    # Apply some pre-processing to improve speech recognition
-    # Normalize audio levels
-    max_val = np.max(np.abs(audio_np))
-    if max_val > 0:
-        # Normalize to use full range, which improves Whisper's performance
-        audio_np = audio_np / max_val
+    audio_np = preprocess_audio(audio_np, orig_sample_rate)
     
-    console.print(f"[blue]Audio for transcription - samples: {len(audio_np)}, mean abs: {np.abs(audio_np).mean():.4f}")
+    console.print(f"[blue]Audio for transcription - samples: {len(audio_np)}")
     
-    # Use the global stt model which should be loaded by the caller
-    stt = whisper.load_model(language_config["model"])
-    
-    if language_config["code"] == "de":
-        result = stt.transcribe(audio_np, language="de", fp16=False)
-    else:
-        result = stt.transcribe(audio_np, fp16=False) 
-        
+    result = run_model(audio_np, language_config, model, registry, cache, source)
     text = result["text"].strip()
     return text
 
 
-def save_transcription(text, source_file=None):
+def save_transcription(text, source_file=None, filename=None):
     """
     Save the transcription to a text file
     
     Args:
         text (str): The transcribed text to save
         source_file (str, optional): Path to the source audio file
+        filename (str, optional): Where to save, defaults to a timestamped
+            file in ./cache
         
     Returns:
         str: Path to the saved transcription file
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"./cache/transcription_{timestamp}.txt"
+    if filename is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"./cache/transcription_{timestamp}.txt"
     
     with open(filename, 'w') as f:
         if source_file:
@@ -0,0 +1,157 @@
+from typing import NamedTuple
+import numpy as np
+
+
+class SpeechSegment(NamedTuple):
+    """A stretch of speech, in samples of the original recording."""
+    start: int
+    end: int
+    sample_rate: int
+
+    @property
+    def start_time(self):
+        return self.start / self.sample_rate
+
+    @property
+    def end_time(self):
+        return self.end / self.sample_rate
+
+    @property
+    def duration(self):
+        return (self.end - self.start) / self.sample_rate
+
+
+def frame_features(audio_np, sample_rate, frame_ms=30, block_frames=8192):
+    """
+    Computes per-frame energy and zero-crossing rate.
+
+    Frames do not overlap and are processed in blocks, so the only full-size
+    allocations are the two per-frame feature arrays.
+
+    Args:
+        audio_np (numpy.ndarray): Mono audio, int16 or float in [-1, 1]
+        sample_rate (int): Sample rate of the audio
+        frame_ms (int): Frame length in milliseconds
+        block_frames (int): Frames converted to float at a time
+
+    Returns:
+        tuple: (energy_db, zcr) float32 arrays, one value per frame
+    """
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    n_frames = len(audio_np) // frame_len
+    energy_db = np.empty(n_frames, dtype=np.float32)
+    zcr = np.empty(n_frames, dtype=np.float32)
+    scale = 1.0 / 32768.0 if audio_np.dtype == np.int16 else 1.0
+
+    for first in range(0, n_frames, block_frames):
+        last = min(first + block_frames, n_frames)
+        block = np.asarray(audio_np[first * frame_len:last * frame_len], dtype=np.float32)
+        frames = block.reshape(last - first, frame_len)
+        if scale != 1.0:
+            frames = frames * scale
+        power = np.einsum('ij,ij->i', frames, frames) / frame_len
+        energy_db[first:last] = 10.0 * np.log10(power + 1e-10)
+        signs = np.signbit(frames)
+        zcr[first:last] = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_len
+
+    return energy_db, zcr
+
+
+def _extend(mask, frames):
+    """Extends every True run of the mask forward by the given number of frames."""
+    if frames <= 0 or not mask.any():
+        return mask
+    idx = np.arange(len(mask))
+    last_true = np.maximum.accumulate(np.where(mask, idx, -frames - 1))
+    return idx - last_true <= frames
+
+
+def detect_speech(audio_np, sample_rate, frame_ms=30, energy_threshold_db=None, noise_margin_db=12.0,
+                  min_energy_db=-50.0, speech_energy_db=-35.0, zcr_threshold=0.25, hangover_ms=300, pad_ms=100,
+                  min_speech_ms=150):
+    """
+    Finds the speech segments in a recording.
+
+    A frame counts as speech when its energy is above the threshold, or when
+    it is only slightly quieter but has the high zero-crossing rate of an
+    unvoiced consonant. Speech is held for `hangover_ms` after the last
+    active frame and padded by `pad_ms` before the first one.
+
+    The adaptive threshold sits `noise_margin_db` above the quietest tenth
+    of the frames. Audio without pauses, like continuous speech or a clip
+    cut from the middle of it, has no quiet frames, so its "noise floor" is
+    the speech itself. Frames louder than `speech_energy_db` therefore
+    always count as speech. Steady noise above that level counts as well.
+
+    Args:
+        audio_np (numpy.ndarray): Mono audio, int16 or float in [-1, 1]
+        sample_rate (int): Sample rate of the audio
+        frame_ms (int): Frame length in milliseconds
+        energy_threshold_db (float, optional): Fixed energy threshold in dBFS.
+            By default it adapts to the noise floor of the recording
+        noise_margin_db (float): Margin above the noise floor for the adaptive threshold
+        min_energy_db (float): Frames quieter than this are never speech
+        speech_energy_db (float): Highest the adaptive threshold goes, in dBFS
+        zcr_threshold (float): Zero-crossing rate above which quiet frames count as speech
+        hangover_ms (int): How long speech is held after the last active frame
+        pad_ms (int): How much audio is kept before the first active frame
+        min_speech_ms (int): Bursts with less active audio than this are dropped
+
+    Returns:
+        list: SpeechSegment entries in order
+    """
+    energy_db, zcr = frame_features(audio_np, sample_rate, frame_ms)
+    if len(energy_db) == 0:
+        return []
+
+    if energy_threshold_db is None:
+        noise_floor = np.percentile(energy_db, 10)
+        energy_threshold_db = max(min(noise_floor + noise_margin_db, speech_energy_db), min_energy_db)
+
+    voiced = energy_db > energy_threshold_db
+    unvoiced = (energy_db > max(energy_threshold_db - 10.0, min_energy_db)) & (zcr > zcr_threshold)
+    active = voiced | unvoiced
+
+    speech = _extend(active, int(hangover_ms / frame_ms))
+    speech |= _extend(active[::-1], int(pad_ms / frame_ms))[::-1]
+
+    edges = np.diff(speech.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    # Drop short clicks and bumps
+    active_count = np.concatenate([[0], np.cumsum(active)])
+    keep = (active_count[ends] - active_count[starts]) * frame_ms >= min_speech_ms
+
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    total = len(audio_np)
+    return [
+        SpeechSegment(int(s * frame_len), int(min(e * frame_len, total)), sample_rate)
+        for s, e in zip(starts[keep], ends[keep])
+    ]
+
+
+def merge_segments(segments, max_gap=0.5, max_duration=30.0):
+    """
+    Merges neighbouring segments so the model sees fewer, longer inputs.
+
+    Args:
+        segments (list): SpeechSegment entries in order
+        max_gap (float): Largest silence in seconds that is bridged
+        max_duration (float): Merged segments never grow beyond this length
+
+    Returns:
+        list: The merged SpeechSegment entries
+    """
+    merged = []
+    for segment in segments:
+        if merged:
+            last = merged[-1]
+            gap = (segment.start - last.end) / segment.sample_rate
+            length = (segment.end - last.start) / segment.sample_rate
+            if gap <= max_gap and length <= max_duration:
+                merged[-1] = last._replace(end=segment.end)
+                continue
+        merged.append(segment)
+    return merged
+
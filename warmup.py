@@ -0,0 +1,303 @@
+import threading
+from functools import partial
+from queue import Empty
+import numpy as np
+from utils import console
+from metrics import metrics
+from model_registry import get_registry
+from transcription import TARGET_SAMPLE_RATE, run_model, transcribe_detailed
+from resampler import StreamingResampler
+from audio_format import pcm_to_float32
+from vad import detect_speech, merge_segments, frame_features
+from pipeline import BoundedQueue
+
+# Length of the throwaway decode that initializes the model's kernels
+WARMUP_SECONDS = 1.0
+
+_warmups = {}
+_warmups_lock = threading.Lock()
+
+
+def warm_up(language_config, registry=None, seconds=WARMUP_SECONDS):
+    """
+    Loads the model and runs one short decode on synthetic audio.
+
+    The first decode of a fresh process pays for lazy initialization
+    (thread pools, kernel selection); doing it here takes that off the
+    first real transcription.
+
+    Args:
+        language_config (dict): Configuration with language code and model
+        registry (ModelRegistry, optional): Registry to fetch the model from
+        seconds (float): Length of the synthetic audio
+    """
+    model_name = language_config["model"]
+    with metrics.timer("warmup_seconds", model=model_name):
+        model = (registry or get_registry()).get(model_name)
+        noise = np.random.default_rng(0).normal(0, 1e-3, int(seconds * TARGET_SAMPLE_RATE)).astype(np.float32)
+        run_model(noise, language_config, model=model, cache=False)
+
+
+def start_warmup(language_config, registry=None):
+    """
+    Warms the model up on a background thread.
+
+    Returns:
+        threading.Thread: The warmup thread
+    """
+    def run():
+        try:
+            warm_up(language_config, registry)
+        except Exception as e:
+            console.print(f"[red]Model warmup failed: {e}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    with _warmups_lock:
+        _warmups[language_config["model"]] = thread
+    thread.start()
+    return thread
+
+
+def wait_for_warmup(model_name):
+    """
+    Blocks until a running warmup of the model has finished.
+
+    Whisper models must not run two decodes at once, so real decodes wait
+    for the throwaway one instead of overlapping it.
+    """
+    with _warmups_lock:
+        thread = _warmups.get(model_name)
+    if thread is not None and thread is not threading.current_thread():
+        thread.join()
+
+
+class SpeculativeTranscriber:
+    """
+    Decodes a recording window by window while it is still being captured.
+
+    A preprocessing thread reads ('audio_chunk', ...) items from the data
+    queue and resamples them. Every time `window_seconds` of audio have
+    arrived, the window is cut at its quietest frame near the end and its
+    speech segments go to `speech_queue`, a BoundedQueue that a decoding
+    thread empties. When the recording stops only the audio after the last
+    cut is left to decode, so the text is ready almost immediately. If the
+    model falls behind, the queue's policy decides whether speech waits on
+    disk or is dropped, so memory stays bounded either way.
+
+    Every decoded segment is kept in `segments` with its time in the
+    recording, shifted by the ('stream_offset', seconds) item if the capture
+    sent one, labelled with `speaker` and passed to `on_segment` as soon as
+    it is decoded.
+
+    With an AdaptiveModel as `model`, the backlog is reported to it and
+    speech that was decoded by a smaller model is queued for re-decoding;
+    the improved segments replace the earlier ones and are passed to
+    `on_segment` again with `revision` set.
+
+    With the "auto" language, the language is detected once for `source`
+    (the speaker label if not given) and fixed for every later decode.
+
+    If the model fell far behind, hand_off() stops decoding so the rest of
+    the recording can be decoded from its WAV file in parallel instead.
+    """
+
+    def __init__(self, data_queue, language_config, model=None, registry=None,
+                 window_seconds=30.0, search_seconds=5.0, speaker=None, on_segment=None, source=None,
+                 speech_queue=None):
+        self.data_queue = data_queue
+        self.language_config = language_config
+        self.model = model
+        self.registry = registry
+        self.window_samples = int(window_seconds * TARGET_SAMPLE_RATE)
+        # A cut in the first half would leave most of the window for the next one
+        self.search_samples = min(int(search_seconds * TARGET_SAMPLE_RATE), self.window_samples // 2)
+        self.speaker = speaker
+        self.source = source if source is not None else speaker
+        self.on_segment = on_segment
+        self.file_path = None
+        self.offset = 0.0
+        self.segments = []
+        self._position = 0
+        self._chunks = []
+        self._buffered = 0
+        self._resampler = None
+        self._threads = []
+        self._handed_off = False
+        self._undecoded_from = None
+        # Speech clips waiting for the model
+        self.speech_queue = speech_queue if speech_queue is not None else BoundedQueue(
+            f"decode:{speaker}" if speaker else "decode")
+
+    @property
+    def text(self):
+        """Returns the text of the windows decoded so far."""
+        return " ".join(s.text for s in self.segments)
+
+    @property
+    def backlog(self):
+        """Returns the seconds of audio not decoded yet, queued or buffered."""
+        queued = getattr(self.data_queue, "seconds", 0.0)
+        return queued + self._buffered / TARGET_SAMPLE_RATE + self.speech_queue.seconds
+
+    def start(self):
+        """Starts the preprocessing and decoding threads."""
+        self._threads = [threading.Thread(target=self._run, daemon=True),
+                         threading.Thread(target=self._decode_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def join(self):
+        """
+        Waits for the stream to end and the last window to be decoded.
+
+        Returns:
+            str: The full transcription
+        """
+        for thread in self._threads:
+            thread.join()
+        return self.text
+
+    def hand_off(self):
+        """
+        Stops decoding after the current clip and waits for the stream to end.
+
+        Speech still queued is skipped, `text` and `segments` keep what was
+        decoded until then.
+
+        Returns:
+            float: Seconds into the recording from which nothing was decoded,
+            None if everything was
+        """
+        self._handed_off = True
+        self.join()
+        return self._undecoded_from
+
+    def _run(self):
+        finished = False
+        while not finished:
+            item = self.data_queue.get()
+            while True:
+                finished = self._handle(item)
+                if finished:
+                    break
+                try:
+                    item = self.data_queue.get_nowait()
+                except Empty:
+                    break
+            while self._buffered >= self.window_samples:
+                self._segment(self._cut())
+            self._report_backlog()
+        self._segment(self._take(self._buffered))
+        self.speech_queue.put(('stream_end', None))
+
+    def _decode_loop(self):
+        wait_for_warmup(self.language_config["model"])
+        while True:
+            item = self.speech_queue.get()
+            if item[0] == 'stream_end':
+                break
+            if item[0] == 'speech':
+                if not self._handed_off:
+                    self._decode(item[1], item[2])
+                elif self._undecoded_from is None:
+                    self._undecoded_from = item[2] - self.offset
+            self._report_backlog()
+        if hasattr(self.model, "report_backlog"):
+            self.model.report_backlog(0.0, source=id(self))
+
+    def _report_backlog(self):
+        backlog = self._buffered / TARGET_SAMPLE_RATE + self.speech_queue.seconds
+        metrics.set_gauge("speculative_backlog_seconds", backlog)
+        if hasattr(self.model, "report_backlog"):
+            self.model.report_backlog(backlog, source=id(self))
+
+    def _handle(self, item):
+        if not isinstance(item, tuple):
+            return False
+        if item[0] == 'sample_rate':
+            self._resampler = None
+            if item[1] != TARGET_SAMPLE_RATE:
+                self._resampler = StreamingResampler(item[1], TARGET_SAMPLE_RATE)
+        elif item[0] == 'audio_chunk':
+            chunk = pcm_to_float32(item[1])
+            if self._resampler:
+                chunk = self._resampler.process(chunk)
+            self._append(chunk)
+        elif item[0] == 'file_path':
+            self.file_path = item[1]
+        elif item[0] == 'stream_offset':
+            self.offset = item[1]
+        elif item[0] == 'gap':
+            # Audio was dropped upstream, what came before it is cut off here
+            self._segment(self._take(self._buffered))
+            self._position += int(item[1] * TARGET_SAMPLE_RATE)
+        elif item[0] == 'stream_end':
+            if self._resampler:
+                self._append(self._resampler.flush())
+            return True
+        return False
+
+    def _append(self, chunk):
+        if len(chunk):
+            self._chunks.append(chunk)
+            self._buffered += len(chunk)
+
+    def _take(self, n):
+        if not self._chunks:
+            return np.zeros(0, dtype=np.float32)
+        audio = np.concatenate(self._chunks) if len(self._chunks) != 1 else self._chunks[0]
+        self._chunks = [audio[n:]] if n < len(audio) else []
+        self._buffered = len(audio) - n
+        return audio[:n]
+
+    def _cut(self):
+        window = self._take(self.window_samples)
+        # Cut in the quietest frame of the last few seconds, so no word is split
+        frame_len = int(0.03 * TARGET_SAMPLE_RATE)
+        energy_db, _ = frame_features(window[-self.search_samples:], TARGET_SAMPLE_RATE)
+        if len(energy_db):
+            cut = len(window) - self.search_samples + (int(np.argmin(energy_db)) + 1) * frame_len
+            if cut < len(window):
+                self._chunks.insert(0, window[cut:])
+                self._buffered += len(window) - cut
+                window = window[:cut]
+        return window
+
+    def _segment(self, audio):
+        start = self.offset + self._position / TARGET_SAMPLE_RATE
+        self._position += len(audio)
+        if len(audio) < TARGET_SAMPLE_RATE // 10:
+            return
+        segments = merge_segments(detect_speech(audio, TARGET_SAMPLE_RATE))
+        if not segments:
+            return
+        metrics.inc("speculative_windows_total")
+        # Only speech reaches the model, silent stretches cost a VAD pass.
+        # Clips are copied, a view would keep the whole window in memory
+        for segment in segments:
+            self.speech_queue.put(('speech', audio[segment.start:segment.end].copy(), start + segment.start_time))
+
+    def _decode(self, clip, offset):
+        decoded = transcribe_detailed(clip, TARGET_SAMPLE_RATE, self.language_config, self.model,
+                                      self.registry, offset=offset, speaker=self.speaker, source=self.source)
+        for piece in decoded:
+            self.segments.append(piece)
+            if self.on_segment:
+                self.on_segment(piece)
+        if decoded and getattr(self.model, "downgraded", None) and self.model.downgraded():
+            self.model.schedule_redecode(len(clip) / TARGET_SAMPLE_RATE, partial(self._redecode, clip, offset, decoded))
+
+    def _redecode(self, clip, offset, previous, model):
+        decoded = transcribe_detailed(clip, TARGET_SAMPLE_RATE, self.language_config, model, self.registry,
+                                      offset=offset, speaker=self.speaker, source=self.source)
+        revision = max(s.revision for s in previous) + 1
+        decoded = [s._replace(revision=revision) for s in decoded]
+        # Swap the segments in place, so the transcript keeps its order
+        first = next((i for i, s in enumerate(self.segments) if s is previous[0]), None)
+        if first is None:
+            return
+        self.segments[first:first + len(previous)] = decoded
+        for piece in decoded:
+            if self.on_segment:
+                self.on_segment(piece)